@@ -0,0 +1,253 @@
+"""
+Alinhamento em memória como matriz NumPy (uint8, uma linha por sequência).
+
+Carrega o FASTA em uma passada e calcula estatísticas por coluna de forma
+vetorizada (gaps, conservação, sítios constantes e parcimoniosamente
+informativos, sequências idênticas). É usado como verificação prévia: um
+alinhamento com linhas de tamanhos diferentes, caracteres inválidos ou nomes
+repetidos é rejeitado em milissegundos, antes de o FastTree/IQ-TREE rodar.
+"""
+import re
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from fasta_io import read_fasta, FastaFormatError
+
+# Caracteres aceitos (nucleotídeos IUPAC, gaps e indeterminações)
+VALID_CHARS = b"ACGTURYSWKMBDHVN-.?"
+GAP_CHARS = b"-."
+# Bases não ambíguas usadas nas contagens por coluna (U conta como T)
+BASES = b"ACGT"
+
+# Mínimo de sequências para inferir uma árvore
+MIN_SEQUENCES = 3
+
+_VALID = np.zeros(256, dtype=bool)
+_VALID[np.frombuffer(VALID_CHARS, dtype=np.uint8)] = True
+_GAP = np.zeros(256, dtype=bool)
+_GAP[np.frombuffer(GAP_CHARS, dtype=np.uint8)] = True
+# Código 0-3 para A/C/G/T(U); 4 para gaps e ambiguidades
+_BASE_INDEX = np.full(256, 4, dtype=np.uint8)
+for _index, _base in enumerate(BASES):
+    _BASE_INDEX[_base] = _index
+_BASE_INDEX[ord("U")] = 3
+
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+
+class AlignmentError(ValueError):
+    """Arquivo que não forma um alinhamento (ex.: linhas de tamanhos diferentes)."""
+
+
+class Alignment:
+    """
+    Alinhamento como matriz (n_sequências x comprimento) de bytes maiúsculos.
+
+    Args:
+        names: Nomes das sequências (headers sem '>')
+        matrix: Matriz uint8 com os caracteres ASCII
+    """
+
+    def __init__(self, names: List[str], matrix: np.ndarray):
+        self.names = names
+        self.matrix = matrix
+        self._base_codes = None
+        self._base_counts = None
+
+    @classmethod
+    def from_fasta(cls, path: Path) -> "Alignment":
+        """
+        Lê um FASTA alinhado.
+
+        Raises:
+            AlignmentError: arquivo vazio ou sequências com comprimentos diferentes
+        """
+        names = []
+        rows = []
+        length = None
+        for record in read_fasta(path):
+            sequence = record.sequence.upper()
+            if not sequence.isascii():
+                # Caracteres fora do ASCII viram um byte inválido (mesmo comprimento)
+                sequence = _NON_ASCII.sub("\0", sequence)
+            sequence = sequence.encode("ascii")
+            if length is None:
+                length = len(sequence)
+            elif len(sequence) != length:
+                raise AlignmentError(
+                    f"'{record.name}' tem {len(sequence)} posições, mas '{names[0]}' tem {length}: "
+                    "o arquivo não é um alinhamento"
+                )
+            names.append(record.name)
+            rows.append(sequence)
+
+        if not names:
+            raise AlignmentError("Nenhuma sequência encontrada")
+        matrix = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(names), length)
+        return cls(names, matrix)
+
+    @property
+    def n_sequences(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def length(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def base_codes(self) -> np.ndarray:
+        """Matriz com códigos 0-3 (A/C/G/T) e 4 (gap/ambíguo)."""
+        if self._base_codes is None:
+            self._base_codes = _BASE_INDEX[self.matrix]
+        return self._base_codes
+
+    # ------------------------------------------------------------------
+    # Estatísticas por coluna
+    # ------------------------------------------------------------------
+    def gap_mask(self) -> np.ndarray:
+        return _GAP[self.matrix]
+
+    def gap_fraction(self) -> np.ndarray:
+        """Fração de gaps em cada coluna."""
+        return self.gap_mask().mean(axis=0)
+
+    def base_counts(self) -> np.ndarray:
+        """Contagem de A/C/G/T em cada coluna (matriz 4 x comprimento)."""
+        if self._base_counts is None:
+            codes = self.base_codes
+            self._base_counts = np.stack([(codes == index).sum(axis=0) for index in range(len(BASES))])
+        return self._base_counts
+
+    def conservation(self) -> np.ndarray:
+        """Frequência da base mais comum entre as bases não ambíguas de cada coluna."""
+        counts = self.base_counts()
+        total = counts.sum(axis=0)
+        return np.divide(counts.max(axis=0), total, out=np.zeros(self.length), where=total > 0)
+
+    def constant_sites(self) -> np.ndarray:
+        """Colunas com no máximo uma base distinta (ignorando gaps e ambiguidades)."""
+        return (self.base_counts() > 0).sum(axis=0) <= 1
+
+    def parsimony_informative_sites(self) -> np.ndarray:
+        """Colunas com pelo menos duas bases que aparecem em duas ou mais sequências."""
+        return (self.base_counts() >= 2).sum(axis=0) >= 2
+
+    # ------------------------------------------------------------------
+    # Verificações por linha
+    # ------------------------------------------------------------------
+    def duplicate_groups(self) -> List[List[str]]:
+        """Grupos de sequências idênticas (mesma linha na matriz)."""
+        if self.length == 0:
+            return []
+        rows = np.ascontiguousarray(self.matrix).view(np.dtype((np.void, self.length))).ravel()
+        _, inverse, counts = np.unique(rows, return_inverse=True, return_counts=True)
+        groups = {}
+        for row, group in enumerate(inverse.ravel()):
+            if counts[group] > 1:
+                groups.setdefault(group, []).append(self.names[row])
+        return list(groups.values())
+
+    def duplicate_names(self) -> List[str]:
+        seen = set()
+        repeated = []
+        for name in self.names:
+            if name in seen and name not in repeated:
+                repeated.append(name)
+            seen.add(name)
+        return repeated
+
+    def invalid_characters(self) -> Optional[dict]:
+        """Primeiro caractere inválido encontrado (sequência, posição, caractere)."""
+        invalid = ~_VALID[self.matrix]
+        if not invalid.any():
+            return None
+        row, column = np.argwhere(invalid)[0]
+        return {
+            "sequence": self.names[row],
+            "position": int(column) + 1,
+            "character": chr(self.matrix[row, column]),
+            "count": int(invalid.sum()),
+        }
+
+    def empty_sequences(self) -> List[str]:
+        """Sequências sem nenhuma base não ambígua (só gaps/N)."""
+        empty = (self.base_codes == 4).all(axis=1)
+        return [self.names[row] for row in np.flatnonzero(empty)]
+
+    def write_fasta(self, path: Path, rows: Optional[np.ndarray] = None,
+                    columns: Optional[np.ndarray] = None) -> None:
+        """
+        Grava o alinhamento, opcionalmente só com as linhas/colunas das máscaras.
+
+        Cada linha é copiada individualmente, então a matriz inteira nunca é
+        duplicada.
+        """
+        row_index = np.flatnonzero(rows) if rows is not None else range(self.n_sequences)
+        column_index = np.flatnonzero(columns) if columns is not None else slice(None)
+        with open(path, "w", encoding="utf-8") as out:
+            for row in row_index:
+                out.write(f">{self.names[row]}\n")
+                out.write(self.matrix[row, column_index].tobytes().decode("ascii"))
+                out.write("\n")
+
+    # ------------------------------------------------------------------
+    # Resumo e verificação prévia
+    # ------------------------------------------------------------------
+    def stats(self, per_column: bool = False) -> dict:
+        """Resumo do alinhamento (e, opcionalmente, os vetores por coluna)."""
+        gap_fraction = self.gap_fraction()
+        conservation = self.conservation()
+        constant = self.constant_sites()
+        informative = self.parsimony_informative_sites()
+        summary = {
+            "sequences": self.n_sequences,
+            "length": self.length,
+            "gap_fraction": round(float(gap_fraction.mean()), 4) if self.length else 0.0,
+            "mean_conservation": round(float(conservation.mean()), 4) if self.length else 0.0,
+            "constant_sites": int(constant.sum()),
+            "variable_sites": int(self.length - constant.sum()),
+            "parsimony_informative_sites": int(informative.sum()),
+            "gappy_columns": int((gap_fraction > 0.5).sum()),
+            "duplicate_groups": self.duplicate_groups(),
+            "empty_sequences": self.empty_sequences(),
+        }
+        if per_column:
+            summary["columns"] = {
+                "gap_fraction": np.round(gap_fraction, 4).tolist(),
+                "conservation": np.round(conservation, 4).tolist(),
+                "parsimony_informative": informative.tolist(),
+            }
+        return summary
+
+    def preflight(self, min_sequences: int = MIN_SEQUENCES) -> List[str]:
+        """
+        Problemas que impedem a inferência da árvore.
+
+        Returns:
+            Lista de mensagens de erro (vazia se o alinhamento está apto)
+        """
+        errors = []
+        if self.n_sequences < min_sequences:
+            errors.append(f"São necessárias pelo menos {min_sequences} sequências (encontradas {self.n_sequences})")
+        if self.length == 0:
+            errors.append("Alinhamento sem posições")
+        invalid = self.invalid_characters()
+        if invalid:
+            errors.append(
+                f"Caractere inválido '{invalid['character']}' em '{invalid['sequence']}', "
+                f"posição {invalid['position']} ({invalid['count']} no total)"
+            )
+        repeated = self.duplicate_names()
+        if repeated:
+            errors.append(f"Nomes de sequência repetidos: {', '.join(repeated[:10])}")
+        return errors
+
+
+def preflight_check(path: Path, min_sequences: int = MIN_SEQUENCES) -> List[str]:
+    """Carrega o alinhamento e devolve os problemas encontrados (lista vazia = ok)."""
+    try:
+        return Alignment.from_fasta(path).preflight(min_sequences)
+    except (AlignmentError, FastaFormatError) as e:
+        return [str(e)]
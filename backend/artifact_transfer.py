@@ -0,0 +1,240 @@
+"""
+Entrega dos artefatos dos jobs (SVG, árvore, alinhamento) pela API.
+
+O SVG de uma árvore grande tem vários MB de texto muito repetitivo. Aqui cada
+artefato é servido como arquivo (sem passar por JSON), comprimido com gzip
+ou brotli conforme o Accept-Encoding, e com validadores para o navegador não
+baixar de novo o que já tem:
+
+- as versões comprimidas ficam ao lado do original (``.gz``/``.br``),
+  geradas uma vez por versão do artefato e refeitas quando ele muda
+  (ex.: re-renderizar);
+- ETag forte (hash do conteúdo, um por codificação) e If-None-Match -> 304;
+- Range de um intervalo (``bytes=a-b``, ``a-``, ``-n``), com If-Range.
+
+brotli é opcional: sem o módulo, só gzip é oferecido.
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Arquivos menores que isso não são comprimidos
+MIN_COMPRESS_SIZE = 1024
+# Tamanho dos blocos lidos ao comprimir e ao enviar
+TRANSFER_CHUNK_SIZE = 256 * 1024
+
+# Codificação -> sufixo da versão comprimida, em ordem de preferência
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+_RANGE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$")
+
+# Hash do conteúdo por (arquivo, mtime, tamanho): o arquivo só é lido de
+# novo quando muda
+_digests: Dict[Tuple[str, int, int], str] = {}
+MAX_DIGESTS = 1024
+
+
+def available_encodings() -> list:
+    return [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+
+
+def file_digest(path: Path) -> str:
+    """Hash SHA-256 (truncado) do conteúdo, lido em blocos e guardado em memória."""
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(TRANSFER_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()[:32]
+        if len(_digests) >= MAX_DIGESTS:
+            _digests.clear()
+        _digests[key] = digest
+    return digest
+
+
+def variant_path(path: Path, encoding: str) -> Path:
+    return path.with_name(path.name + ENCODINGS[encoding])
+
+
+def _is_fresh(path: Path, variant: Path) -> bool:
+    try:
+        return variant.stat().st_mtime_ns >= path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _compress(path: Path, variant: Path, encoding: str) -> None:
+    # Grava em arquivo temporário e renomeia: quem lê nunca vê um arquivo pela
+    # metade. O nome é único por chamada: duas threads do mesmo processo podem
+    # comprimir o mesmo artefato ao mesmo tempo
+    temp = variant.with_name(f".{variant.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(path, "rb") as source, open(temp, "wb") as out:
+            if encoding == "gzip":
+                # mtime=0: mesma entrada, mesmos bytes (ETag estável)
+                with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                    for chunk in iter(lambda: source.read(TRANSFER_CHUNK_SIZE), b""):
+                        gz.write(chunk)
+            else:
+                compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                for chunk in iter(lambda: source.read(TRANSFER_CHUNK_SIZE), b""):
+                    out.write(compressor.process(chunk))
+                out.write(compressor.finish())
+        os.replace(temp, variant)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def precompress(path: Path, encodings: Optional[list] = None) -> None:
+    """
+    Gera (ou atualiza) as versões comprimidas de um artefato. Chamado após a
+    renderização e, se ainda faltar alguma, na primeira requisição.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size < MIN_COMPRESS_SIZE:
+        return
+    for encoding in encodings or available_encodings():
+        variant = variant_path(path, encoding)
+        if not _is_fresh(path, variant):
+            _compress(path, variant, encoding)
+
+
+def accepted_encodings(header: str) -> set:
+    """Codificações aceitas pelo cliente (Accept-Encoding, ignorando q=0)."""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if not name or (quality and float(quality.group(1) or 0) == 0):
+            continue
+        if name == "*":
+            accepted.update(ENCODINGS)
+        else:
+            accepted.add(name)
+    return accepted
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match: '*' ou uma lista de ETags (comparação fraca, como manda o RFC)."""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(header: str, size: int):
+    """
+    Intervalo pedido em Range, como (início, fim inclusivo).
+
+    Returns:
+        None para servir o arquivo inteiro (sem Range, vários intervalos ou
+        unidade desconhecida); False se o intervalo não cabe no arquivo
+    """
+    match = _RANGE.match(header or "")
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if size == 0:
+        return False
+    if not first:
+        # Sufixo: os últimos n bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _iter_file(path: Path, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(TRANSFER_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _select(path: Path, accept_encoding: str) -> Tuple[Path, Optional[str], str]:
+    """Versão a enviar (arquivo, codificação, ETag); roda fora do event loop."""
+    digest = file_digest(path)
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in available_encodings():
+        if encoding in accepted and path.stat().st_size >= MIN_COMPRESS_SIZE:
+            variant = variant_path(path, encoding)
+            if not _is_fresh(path, variant):
+                precompress(path, [encoding])
+            return variant, encoding, f'"{digest}-{encoding}"'
+    return path, None, f'"{digest}"'
+
+
+async def artifact_response(request: Request, path: Path, media_type: str,
+                            filename: Optional[str] = None) -> Response:
+    """
+    Resposta para um artefato: 200 (inteiro), 206 (Range), 304 (ETag igual
+    ao do cliente) ou 416 (Range fora do arquivo).
+
+    Args:
+        filename: Se informado, vai como anexo (Content-Disposition) com esse nome
+    """
+    send_path, encoding, etag = await asyncio.to_thread(
+        _select, path, request.headers.get("accept-encoding", "")
+    )
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        # O mesmo URL muda ao re-renderizar: o navegador sempre revalida (304 barato)
+        "Cache-Control": "no-cache",
+        "Accept-Ranges": "bytes",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    size = send_path.stat().st_size
+    requested = None
+    if_range = request.headers.get("if-range")
+    if "range" in request.headers and (if_range is None or if_range.strip() == etag):
+        requested = parse_range(request.headers["range"], size)
+    if requested is False:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+
+    status_code = 200
+    start, end = 0, size - 1
+    if requested:
+        start, end = requested
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(send_path, start, end - start + 1), status_code=status_code,
+                             media_type=media_type, headers=headers)
@@ -0,0 +1,88 @@
+"""
+Benchmark da leitura de FASTA em streaming (fasta_io.py).
+
+Gera arquivos FASTA de tamanhos crescentes (sequências quebradas em linhas de
+60 colunas, CRLF em metade dos registros) e mede, cada um num processo
+separado, o tempo e o pico de memória (RSS) de:
+
+- read_fasta: iteração sobre todos os registros;
+- count_sequences: contagem sem montar as sequências.
+
+A memória deve ficar constante (limitada pelo maior registro) e o tempo
+crescer linearmente com o tamanho do arquivo.
+
+Uso (a partir de backend/):
+    python bench/bench_fasta_io.py [tamanhos em MB, padrão 100 200 400]
+"""
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fasta_io import count_sequences, read_fasta  # noqa: E402
+
+SEQUENCE_LENGTH = 5000
+LINE_WIDTH = 60
+
+
+def generate(path: Path, size_mb: int, seed: int = 1) -> None:
+    """Grava registros aleatórios até size_mb megabytes."""
+    rng = random.Random(seed)
+    # Um bloco de bases reaproveitado com deslocamentos: gerar não domina o tempo
+    pool = "".join(rng.choice("ACGT") for _ in range(SEQUENCE_LENGTH * 2))
+    target = size_mb * 1024 * 1024
+    written = 0
+    index = 0
+    with open(path, "w", newline="") as out:
+        while written < target:
+            start = rng.randrange(SEQUENCE_LENGTH)
+            sequence = pool[start:start + SEQUENCE_LENGTH]
+            newline = "\r\n" if index % 2 else "\n"
+            lines = [f">seq_{index} amostra {index}"]
+            lines += [sequence[i:i + LINE_WIDTH] for i in range(0, len(sequence), LINE_WIDTH)]
+            chunk = newline.join(lines) + newline
+            out.write(chunk)
+            written += len(chunk)
+            index += 1
+
+
+def measure(operation: str, path: Path) -> None:
+    """Executado no processo filho: imprime segundos, registros e pico de RSS (MB)."""
+    start = time.perf_counter()
+    if operation == "read":
+        records = sum(1 for _ in read_fasta(path))
+    else:
+        records = count_sequences(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.3f} {records} {peak / 1024:.1f}")
+
+
+def main(sizes) -> None:
+    with tempfile.TemporaryDirectory() as work:
+        print(f"{'MB':>6} {'operação':>10} {'registros':>10} {'s':>8} {'MB/s':>8} {'pico RSS':>9}")
+        for size_mb in sizes:
+            path = Path(work) / f"bench_{size_mb}.fasta"
+            generate(path, size_mb)
+            actual_mb = path.stat().st_size / (1024 * 1024)
+            for operation in ("read", "count"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", operation, str(path)],
+                    capture_output=True, text=True, check=True,
+                ).stdout.split()
+                elapsed, records, peak = float(output[0]), int(output[1]), output[2]
+                print(f"{actual_mb:6.0f} {operation:>10} {records:10d} {elapsed:8.2f} "
+                      f"{actual_mb / elapsed:8.1f} {peak:>8}M")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], Path(sys.argv[3]))
+    else:
+        main([int(arg) for arg in sys.argv[1:]] or [100, 200, 400])
@@ -0,0 +1,105 @@
+"""
+Benchmark do MAFFT --add --keeplength em blocos paralelos (modo 2,
+run_mafft_add_chunks) contra um único processo.
+
+Gera N sequências novas a partir da referência (sequências sem gaps com
+mutações pontuais, 20% em complemento reverso) e alinha:
+
+- num único ``mafft --add --keeplength --adjustdirection`` com todas as threads;
+- em blocos de MAFFT_ADD_CHUNK_SIZE sequências, um processo MAFFT por bloco,
+  até ``threads`` processos ao mesmo tempo, com as threads repartidas entre
+  eles (como faz o backend).
+
+As linhas de cada sequência (e a marca _R_ das invertidas) são comparadas
+entre os dois caminhos. Precisa do ``mafft`` no PATH.
+
+O ganho dos blocos com o MAFFT real ainda não foi medido: o benchmark só foi
+rodado com um ``mafft`` falso cujo tempo crescia como n^1.5, o que mostra que
+o código funciona, não que o MAFFT se comporte assim. Rode com o MAFFT
+instalado antes de mexer em MAFFT_ADD_CHUNK_SIZE.
+
+Uso (a partir de backend/):
+    python bench/bench_mafft_chunks.py [N, padrão 2000] [threads, padrão: núcleos]
+"""
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fasta_io import FastaRecord, read_fasta, write_fasta  # noqa: E402
+from kmer_index import reverse_complement, ungapped  # noqa: E402
+from placement_cache import read_added_placements  # noqa: E402
+
+REFERENCE = Path(__file__).resolve().parents[1] / "default_alignment.fasta"
+MAFFT_ADD_CHUNK_SIZE = int(os.getenv("MAFFT_ADD_CHUNK_SIZE", "200"))
+
+
+def new_sequences(reference: Path, n: int, seed: int = 1):
+    rng = random.Random(seed)
+    templates = [ungapped(record.sequence).upper() for record in read_fasta(reference)]
+    records = []
+    for index in range(n):
+        sequence = list(rng.choice(templates))
+        for position in rng.sample(range(len(sequence)), k=len(sequence) // 50):
+            sequence[position] = rng.choice("ACGT")
+        sequence = "".join(sequence)
+        if index % 5 == 0:
+            sequence = reverse_complement(sequence)
+        records.append(FastaRecord(f"bench_{index}", sequence))
+    return records
+
+
+def mafft_add(records, reference: Path, threads: int, work: Path, label: str) -> dict:
+    queries = work / f"{label}.fasta"
+    output = work / f"{label}_aligned.fasta"
+    write_fasta(records, queries)
+    command = ["mafft", "--thread", str(threads), "--adjustdirection", "--keeplength",
+               "--ep", "0.0", "--add", str(queries), str(reference)]
+    with open(output, "w") as out:
+        subprocess.run(command, stdout=out, stderr=subprocess.DEVNULL, check=True)
+    return read_added_placements(output, records)
+
+
+def single(records, reference: Path, threads: int, work: Path) -> dict:
+    return mafft_add(records, reference, threads, work, "single")
+
+
+def chunked(records, reference: Path, threads: int, work: Path) -> dict:
+    chunks = [records[i:i + MAFFT_ADD_CHUNK_SIZE] for i in range(0, len(records), MAFFT_ADD_CHUNK_SIZE)]
+    parallel = min(len(chunks), threads)
+    per_process = max(1, threads // parallel)
+    placements = {}
+    with ThreadPoolExecutor(parallel) as pool:
+        for result in pool.map(lambda item: mafft_add(item[1], reference, per_process, work, f"chunk_{item[0]}"),
+                               enumerate(chunks)):
+            placements.update(result)
+    return placements
+
+
+def main(n: int, threads: int) -> None:
+    if shutil.which("mafft") is None:
+        sys.exit("mafft não encontrado no PATH")
+    records = new_sequences(REFERENCE, n)
+    print(f"{n} sequências novas, referência {REFERENCE.name}, {threads} threads, "
+          f"blocos de {MAFFT_ADD_CHUNK_SIZE}")
+    with tempfile.TemporaryDirectory() as work:
+        results = {}
+        for label, run in (("um processo", single), ("blocos", chunked)):
+            start = time.perf_counter()
+            results[label] = run(records, REFERENCE, threads, Path(work))
+            elapsed = time.perf_counter() - start
+            reversed_rows = sum(placement.reversed for placement in results[label].values())
+            print(f"{label:<12} {elapsed:8.1f} s  ({reversed_rows} invertidas)")
+        print("linhas iguais:", "sim" if results["um processo"] == results["blocos"] else "NÃO")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
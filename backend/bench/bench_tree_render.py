@@ -0,0 +1,91 @@
+"""
+Benchmark do layout e da escrita do SVG de árvores grandes (newick.py,
+tree_layout.py, tree_lod.py).
+
+Gera árvores aleatórias (junções de vizinhos ao acaso, profundidade ~log n) e
+em escada (caterpillar, profundidade n, o pior caso das travessias
+recursivas) e mede cada etapa da renderização completa: leitura do Newick,
+enraizamento + ladderize, layout e SVG.
+
+Uso (a partir de backend/):
+    python bench/bench_tree_render.py [número de tips ..., padrão 10000 50000]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND / "tree_set_svg_edit"))
+sys.path.insert(0, str(BACKEND))
+
+from newick import ladderize, read_tree, root_on_outgroup  # noqa: E402
+from tree_layout import TreeLayout  # noqa: E402
+from tree_lod import render_full  # noqa: E402
+
+GENERA = ["Fomitiporia", "Phellinus", "Fulvifomes", "Inonotus", "Coltricia", "Tropicoporus"]
+OUTGROUP = "Coltricia_sp0"
+
+
+def tip_names(n_tips: int, rng: random.Random):
+    names = [f"{rng.choice(GENERA[:-1])}_sp{i}_MUCL_{i}" for i in range(n_tips)]
+    names[0] = f"{OUTGROUP}_MUCL_0"
+    # Algumas sequências do usuário (negrito/vermelho no SVG)
+    return [f"neew_{name}" if i % 997 == 1 else name for i, name in enumerate(names)]
+
+
+def random_tree(n_tips: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    nodes = [f"{name}:{rng.random() * 0.05:.5f}" for name in tip_names(n_tips, rng)]
+    while len(nodes) > 2:
+        i = rng.randrange(len(nodes) - 1)
+        nodes[i:i + 2] = [f"({nodes[i]},{nodes[i + 1]}){rng.randint(0, 100)}:{rng.random() * 0.02:.5f}"]
+    return f"({nodes[0]},{nodes[1]});"
+
+
+def caterpillar_tree(n_tips: int, seed: int = 1) -> str:
+    rng = random.Random(seed)
+    names = tip_names(n_tips, rng)
+    # (t0,(t1,(t2,...,t[n-1])s:l)s:l): aberturas e fechamentos montados em listas
+    opening = [f"({name}:{rng.random() * 0.05:.5f}," for name in names[:-1]]
+    closing = [f"){rng.randint(0, 100)}:{rng.random() * 0.01:.5f}" for _ in names[:-2]]
+    return "".join(opening) + f"{names[-1]}:{rng.random() * 0.05:.5f}" + "".join(closing) + ");"
+
+
+def bench(label: str, newick_text: str, work: Path) -> None:
+    path = work / "tree.tre"
+    path.write_text(newick_text)
+    timings = []
+
+    start = time.perf_counter()
+    tree = read_tree(path)
+    timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tree, _ = root_on_outgroup(tree, OUTGROUP)
+    tree = ladderize(tree)
+    timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    layout = TreeLayout.from_tree(tree)
+    timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    svg = render_full(layout)
+    timings.append(time.perf_counter() - start)
+
+    print(f"{label:<22}" + "".join(f"{value:>10.2f}" for value in timings)
+          + f"{sum(timings):>10.2f}{len(svg) / 1e6:>9.1f}")
+
+
+def main(sizes) -> None:
+    print(f"{'árvore':<22}{'leitura':>10}{'raiz+lad':>10}{'layout':>10}{'svg':>10}{'total':>10}{'SVG MB':>9}")
+    with tempfile.TemporaryDirectory() as work:
+        for n_tips in sizes:
+            bench(f"aleatória {n_tips}", random_tree(n_tips), Path(work))
+            bench(f"caterpillar {n_tips}", caterpillar_tree(n_tips), Path(work))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000])
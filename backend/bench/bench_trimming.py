@@ -0,0 +1,87 @@
+"""
+Benchmark da curadoria embutida (trimming.py) contra o binário trimAl.
+
+Gera alinhamentos aleatórios (sequências x colunas) com a fração de gaps
+variando por coluna, e mede a curadoria embutida (leitura, corte e escrita)
+com os parâmetros do modo 3 (-gt 0.2 -cons 60). Se o ``trimal`` estiver no
+PATH, roda ``trimal -gt 0.2 -cons 60`` no mesmo arquivo e compara as saídas
+(o trimAl mantém a caixa original; a comparação ignora maiúsculas).
+
+Uso (a partir de backend/):
+    python bench/bench_trimming.py [SEQUÊNCIASxCOLUNAS ..., padrão 200x2000 2000x20000]
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from alignment import Alignment  # noqa: E402
+from fasta_io import read_fasta  # noqa: E402
+from trimming import GAP_THRESHOLD, MIN_CONSERVED_PERCENT, trim_alignment, write_trimmed  # noqa: E402
+
+
+def generate(path: Path, n_sequences: int, length: int, seed: int = 1) -> None:
+    """Alinhamento aleatório: cada coluna tem sua própria probabilidade de gap."""
+    rng = np.random.default_rng(seed)
+    gap_probability = rng.beta(0.6, 1.2, size=length)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)[rng.integers(0, 4, size=(n_sequences, length))]
+    gaps = rng.random((n_sequences, length)) < gap_probability
+    matrix = np.where(gaps, ord("-"), bases).astype(np.uint8)
+    with open(path, "w") as out:
+        for index, row in enumerate(matrix):
+            out.write(f">seq_{index}\n{row.tobytes().decode('ascii')}\n")
+
+
+def run_builtin(source: Path, output: Path) -> float:
+    start = time.perf_counter()
+    alignment = Alignment.from_fasta(source)
+    result = trim_alignment(alignment, GAP_THRESHOLD, MIN_CONSERVED_PERCENT)
+    write_trimmed(alignment, result, output)
+    return time.perf_counter() - start
+
+
+def run_trimal(source: Path, output: Path) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        ["trimal", "-in", str(source), "-out", str(output), "-fasta",
+         "-gt", str(GAP_THRESHOLD), "-cons", str(MIN_CONSERVED_PERCENT)],
+        check=True, capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def same_output(first: Path, second: Path) -> bool:
+    def records(path):
+        # O trimAl pode acrescentar o comprimento ao nome (" 1234 bp")
+        return [(r.name.split()[0], r.sequence.upper()) for r in read_fasta(path)]
+    return records(first) == records(second)
+
+
+def main(shapes) -> None:
+    trimal = shutil.which("trimal")
+    if trimal is None:
+        print("trimal não encontrado no PATH: só a curadoria embutida será medida")
+    with tempfile.TemporaryDirectory() as work:
+        work = Path(work)
+        for n_sequences, length in shapes:
+            source = work / "input.fasta"
+            generate(source, n_sequences, length)
+            builtin = run_builtin(source, work / "builtin.fasta")
+            kept = len(next(read_fasta(work / "builtin.fasta")).sequence)
+            line = f"{n_sequences}x{length}: embutido {builtin:.2f} s ({kept} colunas mantidas)"
+            if trimal:
+                external = run_trimal(source, work / "trimal.fasta")
+                identical = same_output(work / "builtin.fasta", work / "trimal.fasta")
+                line += f"; trimal {external:.2f} s; saídas iguais: {'sim' if identical else 'NÃO'}"
+            print(line)
+
+
+if __name__ == "__main__":
+    shapes = [tuple(int(value) for value in arg.lower().split("x")) for arg in sys.argv[1:]]
+    main(shapes or [(200, 2000), (2000, 20000)])
@@ -0,0 +1,102 @@
+"""
+Colapso de sequências idênticas antes da inferência da árvore.
+
+Conjuntos de referência e submissões costumam ter muitos haplótipos
+idênticos, e o FastTree/IQ-TREE gastam tempo com eles sem ganhar informação.
+Antes da inferência as linhas do alinhamento são comparadas (hash das linhas
+da matriz NumPy) e só um representante de cada grupo vai para a ferramenta;
+o mapeamento representante -> duplicatas fica em duplicates.json. Depois da
+inferência as duplicatas são enxertadas de volta no tree.tre como uma
+politomia de ramos com comprimento zero no lugar do representante.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from alignment import Alignment, MIN_SEQUENCES
+from newick import quote, tokenize_newick, unquote
+
+COLLAPSE_DUPLICATES = os.getenv("COLLAPSE_DUPLICATES", "true").lower() in ("1", "true", "yes")
+
+# Caracteres que o IQ-TREE troca por '_' nos nomes das sequências
+_IQTREE_UNSAFE = re.compile(r"[^\w\-.|/]")
+
+
+def collapse_duplicates(aligned_file: Path, collapsed_file: Path, mapping_file: Path) -> Dict[str, List[str]]:
+    """
+    Grava em collapsed_file o alinhamento com um representante por grupo de
+    sequências idênticas.
+
+    Returns:
+        Mapeamento representante -> duplicatas removidas (vazio se não há
+        duplicatas ou se sobrariam menos de MIN_SEQUENCES sequências; nesse
+        caso collapsed_file e mapping_file de uma execução anterior são
+        removidos)
+    """
+    collapsed_file.unlink(missing_ok=True)
+    mapping_file.unlink(missing_ok=True)
+    alignment = Alignment.from_fasta(aligned_file)
+    groups = alignment.duplicate_groups()
+    removed = sum(len(group) - 1 for group in groups)
+    if not groups or alignment.n_sequences - removed < MIN_SEQUENCES:
+        return {}
+
+    mapping = {group[0]: group[1:] for group in groups}
+    duplicate_names = {name for group in groups for name in group[1:]}
+    keep = np.array([name not in duplicate_names for name in alignment.names])
+    alignment.write_fasta(collapsed_file, rows=keep)
+    mapping_file.write_text(json.dumps(mapping, indent=2))
+    print(f"Sequências idênticas: {removed} colapsadas em {len(groups)} representantes")
+    return mapping
+
+
+def expand_duplicates(tree_file: Path, mapping: Dict[str, List[str]]) -> int:
+    """
+    Enxerta as duplicatas de volta na árvore: cada folha representante vira
+    (representante:0,duplicata:0,...) com o comprimento de ramo original.
+
+    Nomes encurtados no primeiro espaço ou alterados pelo IQ-TREE (caracteres
+    especiais -> '_') também são reconhecidos; as duplicatas recebem o mesmo
+    tratamento.
+
+    Returns:
+        Número de folhas expandidas
+    """
+    if not mapping:
+        return 0
+    # Formas em que o nome pode aparecer na árvore: como no FASTA, só até o
+    # primeiro espaço e com os caracteres especiais trocados pelo IQ-TREE
+    transforms = [
+        lambda name: name,
+        lambda name: name.split()[0] if name.split() else name,
+        lambda name: _IQTREE_UNSAFE.sub("_", name),
+        lambda name: _IQTREE_UNSAFE.sub("_", name.split()[0] if name.split() else name),
+    ]
+    lookup = {}
+    for representative, duplicates in mapping.items():
+        for transform in transforms:
+            lookup.setdefault(transform(representative),
+                              (transform(representative), [transform(name) for name in duplicates]))
+
+    output = []
+    expanded = 0
+    previous = None
+    for kind, token in tokenize_newick(tree_file.read_text()):
+        # Folha: rótulo logo depois de '(' ou ',' (rótulos após ')' são de nós internos)
+        if kind == "label" and previous in (None, "(", ","):
+            entry = lookup.get(unquote(token))
+            if entry is not None:
+                representative, duplicates = entry
+                members = [representative, *duplicates]
+                token = "(" + ",".join(f"{quote(name)}:0" for name in members) + ")"
+                expanded += 1
+        output.append(token)
+        if kind == "punct" or kind == "label":
+            previous = token if kind == "punct" else "label"
+
+    tree_file.write_text("".join(output))
+    return expanded
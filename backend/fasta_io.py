@@ -0,0 +1,150 @@
+"""
+Leitura e escrita de FASTA em streaming.
+
+Módulo único usado por todo o backend (uploads, junção de matrizes, hash do
+cache, contagem de sequências da renderização). Os registros são lidos um de
+cada vez, então a memória depende do maior registro e não do arquivo:
+aceita sequências quebradas em várias linhas, CRLF, linhas vazias e arquivos
+compactados com gzip (detectados pelo conteúdo, não pela extensão).
+"""
+import gzip
+import io
+from pathlib import Path
+from typing import IO, Iterable, Iterator, NamedTuple, Optional, Union
+
+# Assinatura de arquivos gzip
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Buffer de leitura dos arquivos
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class FastaFormatError(ValueError):
+    """Conteúdo que não é FASTA válido."""
+
+
+class FastaRecord(NamedTuple):
+    name: str       # header sem o '>'
+    sequence: str
+
+
+class FastaParser:
+    """
+    Parser incremental: recebe linhas e devolve registros completos.
+
+    Base de read_fasta e do recebimento de uploads (que chegam em blocos).
+
+    Args:
+        inline_sequence: Formato de texto colado: o primeiro token do header é
+            o nome e o restante da linha já é sequência
+        strict: Erro para conteúdo antes do primeiro header (senão é ignorado)
+    """
+
+    def __init__(self, inline_sequence: bool = False, strict: bool = True):
+        self.inline_sequence = inline_sequence
+        self.strict = strict
+        self._name: Optional[str] = None
+        self._parts = []
+
+    def feed(self, line: str) -> Optional[FastaRecord]:
+        """Processa uma linha; devolve o registro anterior quando um novo header começa."""
+        line = line.strip()
+        if not line:
+            return None
+        if line.startswith('>'):
+            record = self.close()
+            if self.inline_sequence:
+                parts = line.split(None, 1)
+                self._name = parts[0][1:]
+                if len(parts) > 1:
+                    self._parts.append(parts[1])
+            else:
+                self._name = line[1:].strip()
+            return record
+        if self._name is None:
+            if self.strict:
+                raise FastaFormatError("conteúdo antes do primeiro header '>'")
+            return None
+        self._parts.append(line)
+        return None
+
+    def close(self) -> Optional[FastaRecord]:
+        """Finaliza e devolve o registro em andamento, se houver."""
+        if self._name is None:
+            return None
+        record = FastaRecord(self._name, ''.join(self._parts))
+        self._name, self._parts = None, []
+        return record
+
+
+def open_fasta(path: Union[str, Path]) -> IO[str]:
+    """Abre um FASTA para leitura em texto, descompactando gzip se necessário."""
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == GZIP_MAGIC
+    if compressed:
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8-sig")
+    return open(path, "r", encoding="utf-8-sig", buffering=READ_BUFFER_SIZE)
+
+
+def read_fasta(source: Union[str, Path, Iterable[str]], strict: bool = True) -> Iterator[FastaRecord]:
+    """
+    Itera sobre os registros de um FASTA (caminho ou iterável de linhas).
+
+    Raises:
+        FastaFormatError: conteúdo antes do primeiro header (com strict=True)
+    """
+    if isinstance(source, (str, Path)):
+        with open_fasta(source) as f:
+            yield from read_fasta(f, strict)
+        return
+
+    parser = FastaParser(strict=strict)
+    for line in source:
+        record = parser.feed(line)
+        if record is not None:
+            yield record
+    record = parser.close()
+    if record is not None:
+        yield record
+
+
+def count_sequences(path: Union[str, Path]) -> int:
+    """Conta os registros sem montar as sequências (só olha o início das linhas)."""
+    count = 0
+    with open_fasta(path) as f:
+        for line in f:
+            if line.lstrip().startswith('>'):
+                count += 1
+    return count
+
+
+def write_record(out: IO[str], record: FastaRecord, width: Optional[int] = None) -> None:
+    """Grava um registro; width quebra a sequência em linhas (None = uma linha)."""
+    out.write(f">{record.name}\n")
+    sequence = record.sequence
+    if width:
+        for start in range(0, len(sequence), width):
+            out.write(sequence[start:start + width])
+            out.write("\n")
+    else:
+        out.write(sequence)
+        out.write("\n")
+
+
+def write_fasta(records: Iterable[FastaRecord], destination: Union[str, Path, IO[str]],
+                width: Optional[int] = None) -> int:
+    """
+    Grava registros em um arquivo (caminho) ou stream de texto.
+
+    Returns:
+        Número de registros gravados
+    """
+    if isinstance(destination, (str, Path)):
+        with open(destination, "w", encoding="utf-8", buffering=READ_BUFFER_SIZE) as out:
+            return write_fasta(records, out, width)
+
+    count = 0
+    for record in records:
+        write_record(destination, record, width)
+        count += 1
+    return count
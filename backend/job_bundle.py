@@ -0,0 +1,126 @@
+"""
+Pacote .zip com todos os artefatos de um job, gerado em streaming.
+
+O zip é escrito num destino sem seek (descritores de dados após cada
+arquivo, ZIP64 quando necessário) e cada bloco comprimido é repassado ao
+cliente assim que sai do zipfile: nada é montado em memória ou em disco,
+então o uso de memória não depende do tamanho do pacote.
+
+Conteúdo:
+- results/: árvore, SVG final, duplicates.json e subprodutos do IQ-TREE
+  (iqtree.iqtree, .log, .ufboot, .contree...);
+- sequences/: FASTA do job (entradas, alinhamento, versão trimada...);
+- manifest.json (por último): dados do job e nome, tamanho e SHA-256 de
+  cada arquivo, calculados durante a escrita.
+"""
+import fnmatch
+import hashlib
+import json
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from artifact_transfer import ENCODINGS
+
+# Arquivos de trabalho que não são resultado (refeitos sob demanda)
+INTERNAL_FILES = {
+    "layout.npz", "temp.tre", "stages.json",
+    # Intermediários do alinhamento do modo 2 e da colapsagem de duplicatas
+    "oriented_sequences.fasta", "reduced_reference.fasta", "uncached_sequences.fasta",
+    "placed.fasta", "collapsed.fasta",
+}
+# Blocos do MAFFT --add em paralelo (uncached_{i}/placed_{i}), caso sobrem
+INTERNAL_PATTERNS = ("uncached_*.fasta", "placed_*.fasta")
+
+# Extensões já comprimidas: guardadas sem recomprimir
+STORED_SUFFIXES = {".gz", ".br", ".zip", ".npz", ".bz2", ".xz"}
+
+# Tamanho dos blocos lidos de cada arquivo
+BUNDLE_CHUNK_SIZE = 256 * 1024
+
+
+def _is_internal(name: str) -> bool:
+    return name in INTERNAL_FILES or any(fnmatch.fnmatch(name, pattern) for pattern in INTERNAL_PATTERNS)
+
+
+def _is_variant(path: Path) -> bool:
+    """Versão .gz/.br de outro artefato (artifact_transfer), não um resultado."""
+    return path.suffix in ENCODINGS.values() and path.with_suffix("").exists()
+
+
+def bundle_entries(result_dir: Path, upload_dir: Optional[Path] = None) -> List[Tuple[str, Path]]:
+    """Arquivos do pacote como (nome no zip, caminho), em ordem estável."""
+    entries = []
+    for folder, directory in (("results", result_dir), ("sequences", upload_dir)):
+        if directory is None or not directory.is_dir():
+            continue
+        for path in sorted(directory.iterdir()):
+            if (not path.is_file() or path.name.startswith(".")
+                    or _is_internal(path.name) or _is_variant(path)):
+                continue
+            entries.append((f"{folder}/{path.name}", path))
+    return entries
+
+
+class _ZipSink:
+    """Destino do ZipFile sem seek: guarda os bytes até o gerador repassá-los."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_bundle(entries: List[Tuple[str, Path]], job_info: dict) -> Iterator[bytes]:
+    """
+    Gera o zip bloco a bloco (para StreamingResponse).
+
+    Args:
+        entries: Arquivos do pacote (bundle_entries)
+        job_info: Dados do job gravados no manifest.json
+    """
+    sink = _ZipSink()
+    files = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for name, path in entries:
+            try:
+                info = zipfile.ZipInfo.from_file(path, name)
+                source = open(path, "rb")
+            except FileNotFoundError:
+                # Removido entre a listagem e a escrita (ex.: limpeza do job)
+                continue
+            stored = path.suffix in STORED_SUFFIXES
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            digest = hashlib.sha256()
+            size = 0
+            with source, archive.open(info, "w") as target:
+                for chunk in iter(lambda: source.read(BUNDLE_CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            files.append({"name": name, "size": size, "sha256": digest.hexdigest()})
+            data = sink.drain()
+            if data:
+                yield data
+
+        manifest = {
+            **job_info,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "files": files,
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+    yield sink.drain()
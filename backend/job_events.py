@@ -0,0 +1,73 @@
+"""
+Notificação de mudanças no status dos jobs (SSE / long-poll).
+
+Em vez de o navegador consultar /status a cada 500 ms, os clientes esperam
+por uma versão mais nova que a última vista. Gravações feitas neste processo
+acordam os clientes na hora (listener do JobStore); gravações feitas por
+outros workers do uvicorn são percebidas por uma consulta de baixa frequência
+à versão no store (STATUS_POLL_INTERVAL).
+"""
+import asyncio
+import os
+from typing import Optional
+
+from job_store import JobStore
+
+STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", "2"))
+# Intervalo máximo sem mensagens no SSE (comentário keep-alive para proxies)
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+TERMINAL_STATUSES = {"completed", "error", "cancelled"}
+
+
+class JobEvents:
+    """
+    Espera por mudanças de versão no status de um job.
+
+    Args:
+        store: JobStore observado
+        poll_interval: Intervalo da consulta ao store (mudanças de outros processos)
+    """
+
+    def __init__(self, store: JobStore, poll_interval: float = STATUS_POLL_INTERVAL):
+        self.store = store
+        self.poll_interval = poll_interval
+        self._events = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        store.add_listener(self._on_write)
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Associa o event loop da API (chamado no startup)."""
+        self._loop = loop
+
+    def _on_write(self, job_id: str) -> None:
+        # Pode ser chamado de threads (asyncio.to_thread), então agenda no loop
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake, job_id)
+
+    def _wake(self, job_id: str) -> None:
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, job_id: str, since: int, timeout: float) -> Optional[dict]:
+        """
+        Espera até o job ter versão maior que since, ou até o timeout.
+
+        Returns:
+            O status atual (mais novo que since, ou o mesmo se deu timeout),
+            ou None se o job não existe
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Consultas ao store (SQLite) fora do event loop
+            version = await asyncio.to_thread(self.store.version, job_id)
+            remaining = deadline - loop.time()
+            if version is None or version > since or remaining <= 0:
+                return await asyncio.to_thread(self.store.get, job_id)
+            event = self._events.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
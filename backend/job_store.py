@@ -0,0 +1,303 @@
+"""
+Armazenamento do status dos jobs.
+
+O store se comporta como um dicionário job_id -> status (``in``, ``[]``,
+``get``), então o código da API continua lendo e gravando como antes, mas o
+backend padrão (SQLite) é persistente e compartilhado entre processos: um
+restart não perde os jobs e vários workers do uvicorn enxergam o mesmo
+estado.
+
+Cada gravação incrementa a "version" do job, devolvida junto com o status.
+Clientes usam esse número para pedir apenas mudanças (long-poll / SSE), e
+listeners registrados com add_listener são avisados a cada gravação.
+
+Cada job em execução é associado ao processo que o roda (claim). No startup,
+interrupt_orphans marca como erro os jobs em andamento cujo processo não
+existe mais (restart ou queda do servidor), que de outra forma ficariam em
+"processing" para sempre.
+
+Backends disponíveis (variável JOB_STORE):
+    - sqlite (padrão): arquivo em JOB_STORE_PATH
+    - memory: dicionário em memória, apenas para um único processo
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# Status de jobs que uma task de análise ainda está rodando
+RUNNING_STATUSES = {"queued", "processing"}
+
+
+def process_token(pid: int) -> Optional[str]:
+    """
+    Identifica um processo vivo: pid + instante de início (/proc), para que um
+    pid reaproveitado depois de um restart não se passe pelo processo antigo.
+
+    Returns:
+        None se o processo não existe
+    """
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        if Path("/proc/self/stat").exists():
+            return None
+        # Sem /proc (fora do Linux): só dá para saber se o pid existe
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass
+        return str(pid)
+    # Campo 22 (starttime); o nome do processo, entre parênteses, pode ter espaços
+    return f"{pid}:{stat.rsplit(')', 1)[1].split()[19]}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    if not owner:
+        return False
+    return process_token(int(owner.split(":", 1)[0])) == owner
+
+
+class JobStore:
+    """Interface comum dos backends de status de jobs."""
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """Registra um callback chamado com o job_id após cada gravação
+        (pode ser chamado de qualquer thread)."""
+        self._listeners.append(callback)
+
+    def _notify(self, job_id: str) -> None:
+        for callback in self._listeners:
+            callback(job_id)
+
+    def get(self, job_id: str, default=None) -> Optional[dict]:
+        """Status do job, incluindo a chave "version"."""
+        raise NotImplementedError
+
+    def set(self, job_id: str, status: dict) -> None:
+        raise NotImplementedError
+
+    def mutate(self, job_id: str, fn: Callable[[dict], dict]) -> Optional[dict]:
+        """
+        Aplica fn ao status atual de forma atômica (ler-modificar-gravar).
+        Não faz nada se o job não existir.
+
+        Returns:
+            O novo status, ou None se o job não existe
+        """
+        raise NotImplementedError
+
+    def version(self, job_id: str) -> Optional[int]:
+        status = self.get(job_id)
+        return status["version"] if status is not None else None
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        """Mescla campos no status atual de forma atômica."""
+        return self.mutate(job_id, lambda current: {**current, **fields})
+
+    def claim(self, job_id: str) -> None:
+        """Registra que o processo atual está rodando o job."""
+        raise NotImplementedError
+
+    def _running(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """(job_id, dono) dos jobs com status em RUNNING_STATUSES."""
+        raise NotImplementedError
+
+    def interrupt_orphans(self, message: str) -> List[str]:
+        """
+        Marca como erro os jobs em andamento cujo processo dono não existe mais.
+
+        Returns:
+            Os job_ids marcados
+        """
+        def interrupt(current: dict) -> dict:
+            if current.get("status") not in RUNNING_STATUSES:
+                return current
+            current.pop("queue_position", None)
+            return {**current, "status": "error", "message": message}
+
+        orphans = [job_id for job_id, owner in self._running() if not _owner_alive(owner)]
+        for job_id in orphans:
+            self.mutate(job_id, interrupt)
+        return orphans
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def __getitem__(self, job_id: str) -> dict:
+        status = self.get(job_id)
+        if status is None:
+            raise KeyError(job_id)
+        return status
+
+    def __setitem__(self, job_id: str, status: dict) -> None:
+        self.set(job_id, status)
+
+
+class MemoryJobStore(JobStore):
+    """Store em memória (um único processo)."""
+
+    def __init__(self):
+        super().__init__()
+        self._jobs = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str, default=None) -> Optional[dict]:
+        with self._lock:
+            status = self._jobs.get(job_id)
+            return dict(status) if status is not None else default
+
+    def _write(self, job_id: str, status: dict) -> dict:
+        previous = self._jobs.get(job_id)
+        version = previous["version"] + 1 if previous else 1
+        new_status = {k: v for k, v in status.items() if k != "version"}
+        new_status["version"] = version
+        self._jobs[job_id] = new_status
+        return dict(new_status)
+
+    def set(self, job_id: str, status: dict) -> None:
+        with self._lock:
+            self._write(job_id, status)
+        self._notify(job_id)
+
+    def mutate(self, job_id: str, fn: Callable[[dict], dict]) -> Optional[dict]:
+        with self._lock:
+            current = self._jobs.get(job_id)
+            if current is None:
+                return None
+            new_status = self._write(job_id, fn(dict(current)))
+        self._notify(job_id)
+        return new_status
+
+    def claim(self, job_id: str) -> None:
+        with self._lock:
+            self._owners[job_id] = process_token(os.getpid())
+
+    def _running(self) -> Iterator[Tuple[str, Optional[str]]]:
+        with self._lock:
+            running = [(job_id, self._owners.get(job_id)) for job_id, status in self._jobs.items()
+                       if status.get("status") in RUNNING_STATUSES]
+        return iter(running)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Store persistente em SQLite, seguro para threads e processos.
+
+    Cada thread usa sua própria conexão; o modo WAL permite leituras
+    concorrentes enquanto um worker grava, e as atualizações atômicas usam
+    BEGIN IMMEDIATE para serializar ler-modificar-gravar entre processos.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "owner" not in columns:
+            # Fora de "data": set() substitui o status inteiro sem perder o dono
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _decode(data: str, version: int) -> dict:
+        status = json.loads(data)
+        status["version"] = version
+        return status
+
+    @staticmethod
+    def _encode(status: dict) -> str:
+        return json.dumps({k: v for k, v in status.items() if k != "version"})
+
+    def get(self, job_id: str, default=None) -> Optional[dict]:
+        row = self._connection().execute(
+            "SELECT data, version FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._decode(*row) if row else default
+
+    def version(self, job_id: str) -> Optional[int]:
+        """Versão atual do job sem decodificar o status (consulta barata)."""
+        row = self._connection().execute(
+            "SELECT version FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, job_id: str, status: dict) -> None:
+        self._connection().execute(
+            "INSERT INTO jobs (job_id, data, updated_at, version) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT(job_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at,"
+            " version = jobs.version + 1",
+            (job_id, self._encode(status), time.time()),
+        )
+        self._notify(job_id)
+
+    def mutate(self, job_id: str, fn: Callable[[dict], dict]) -> Optional[dict]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data, version FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            new_status = dict(fn(self._decode(*row)))
+            new_status["version"] = row[1] + 1
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ?, version = ? WHERE job_id = ?",
+                (self._encode(new_status), time.time(), new_status["version"], job_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(job_id)
+        return new_status
+
+
+    def claim(self, job_id: str) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET owner = ? WHERE job_id = ?", (process_token(os.getpid()), job_id)
+        )
+
+    def _running(self) -> Iterator[Tuple[str, Optional[str]]]:
+        rows = self._connection().execute("SELECT job_id, data, owner FROM jobs").fetchall()
+        for job_id, data, owner in rows:
+            if json.loads(data).get("status") in RUNNING_STATUSES:
+                yield job_id, owner
+
+
+def create_job_store(default_path: Path) -> JobStore:
+    """Cria o store configurado via JOB_STORE / JOB_STORE_PATH."""
+    backend = os.getenv("JOB_STORE", "sqlite").lower()
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(Path(os.getenv("JOB_STORE_PATH", str(default_path))))
+    raise ValueError(f"JOB_STORE desconhecido: {backend}")
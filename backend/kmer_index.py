@@ -0,0 +1,280 @@
+"""
+Índice de k-mers do alinhamento de referência, para triagem das sequências
+novas antes do MAFFT.
+
+Para cada versão da referência (hash do FASTA normalizado) o índice é
+montado uma vez e gravado em disco como arrays NumPy, abertos depois com
+memory-map (só as páginas consultadas são lidas):
+
+- ``offsets.npy``/``postings.npy``: índice invertido em formato CSR; os
+  táxons que contêm o k-mer ``c`` são ``postings[offsets[c]:offsets[c + 1]]``;
+- ``sizes.npy``: número de k-mers distintos de cada táxon;
+- ``taxa.json``: k, nomes e hash de cada sequência sem gaps.
+
+A triagem de uma sequência junta as listas dos seus k-mers e conta, com um
+bincount, quantos k-mers ela compartilha com cada táxon: milissegundos, sem
+alinhar nada. Daí saem:
+
+- orientação: a fita (direta ou complemento reverso) que compartilha mais
+  k-mers com a referência; as invertidas são viradas antes do MAFFT, com o
+  prefixo ``_R_`` que o --adjustdirection usaria, e o MAFFT deixa de testar
+  as duas orientações de cada sequência (lotes com alguma sequência sem
+  orientação definida, "unknown", mantêm o --adjustdirection);
+- duplicatas exatas (mesma sequência sem gaps) e quase duplicatas
+  (similaridade de Jaccard dos k-mers a partir de NEAR_DUPLICATE_SIMILARITY);
+- os KMER_TOP_K táxons mais próximos, usados também pelo modo de referência
+  reduzida (reduced_reference).
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from alignment import Alignment
+from fasta_io import FastaRecord, read_fasta, write_fasta
+from placement_cache import REVERSED_PREFIX
+from result_cache import fasta_digest
+
+KMER_SIZE = int(os.getenv("KMER_SIZE", "10"))
+# offsets.npy tem 4**k + 1 posições int64: 128 MB com k=12, 512 MB com k=13
+MAX_KMER_SIZE = 12
+KMER_TOP_K = int(os.getenv("KMER_TOP_K", "10"))
+# Jaccard ~0.8 com k=10 corresponde a ~99% de identidade
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_SIMILARITY", "0.8"))
+# Fração mínima dos k-mers da sequência presente em algum táxon para decidir a
+# orientação (sequências sem relação com a referência ficam como vieram)
+MIN_ORIENTATION_CONTAINMENT = 0.05
+
+# Muda quando o formato dos arquivos muda (índices antigos são refeitos)
+INDEX_FORMAT_VERSION = 1
+# Índices abertos por processo
+MAX_LOADED_INDEXES = 4
+
+# Código 0-3 para A/C/G/T(U); 4 para ambiguidades
+_CODE = np.full(256, 4, dtype=np.uint8)
+for _index, _base in enumerate(b"ACGT"):
+    _CODE[_base] = _index
+    _CODE[_base + 32] = _index
+_CODE[ord("U")] = _CODE[ord("u")] = 3
+
+_COMPLEMENT = str.maketrans("ACGTURYSWKMBDHVNacgturyswkmbdhvn", "TGCAAYRSWMKVHDBNtgcaayrswmkvhdbn")
+
+_loaded: Dict[str, "KmerIndex"] = {}
+
+
+def ungapped(sequence: str) -> str:
+    return sequence.replace("-", "").replace(".", "")
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+def sequence_key(sequence: str) -> str:
+    """Hash da sequência sem gaps, em maiúsculas e com U -> T (duplicatas exatas)."""
+    return hashlib.sha256(ungapped(sequence).upper().replace("U", "T").encode()).hexdigest()
+
+
+def _codes(sequence: str) -> np.ndarray:
+    return _CODE[np.frombuffer(ungapped(sequence).encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def kmer_set(codes: np.ndarray, k: int = KMER_SIZE) -> np.ndarray:
+    """K-mers distintos (ordenados, 2 bits por base) sem ambiguidades."""
+    n = codes.size - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    values = np.zeros(n, dtype=np.int64)
+    for offset in range(k):
+        values = (values << 2) | (codes[offset:offset + n] & 3)
+    ambiguous = np.concatenate([[0], np.cumsum(codes == 4)])
+    return np.unique(values[ambiguous[k:] == ambiguous[:n]])
+
+
+def _reverse_codes(codes: np.ndarray) -> np.ndarray:
+    reverse = codes[::-1]
+    return np.where(reverse < 4, 3 - reverse, 4).astype(np.uint8)
+
+
+def check_kmer_size(k: int) -> int:
+    if not 1 <= k <= MAX_KMER_SIZE:
+        raise ValueError(f"KMER_SIZE deve estar entre 1 e {MAX_KMER_SIZE} (recebido {k})")
+    return k
+
+
+def build_index(reference: Path, directory: Path, k: int = KMER_SIZE) -> None:
+    """Monta o índice de uma referência (gravado em diretório temporário e renomeado)."""
+    check_kmer_size(k)
+    names, keys, sets = [], [], []
+    for record in read_fasta(reference):
+        names.append(record.name)
+        keys.append(sequence_key(record.sequence))
+        sets.append(kmer_set(_codes(record.sequence), k))
+
+    sizes = np.array([kmers.size for kmers in sets], dtype=np.int64)
+    kmers = np.concatenate(sets) if sets else np.empty(0, dtype=np.int64)
+    taxa = np.repeat(np.arange(len(sets), dtype=np.int32), sizes)
+    order = np.argsort(kmers, kind="stable")
+    offsets = np.zeros(4 ** k + 1, dtype=np.int64)
+    np.cumsum(np.bincount(kmers, minlength=4 ** k), out=offsets[1:])
+
+    staging = directory.with_name(f".{directory.name}.{uuid.uuid4().hex}")
+    staging.mkdir(parents=True)
+    try:
+        np.save(staging / "offsets.npy", offsets)
+        np.save(staging / "postings.npy", taxa[order])
+        np.save(staging / "sizes.npy", sizes)
+        (staging / "taxa.json").write_text(json.dumps({"k": k, "names": names, "keys": keys}))
+        os.rename(staging, directory)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        # Outro processo montou o mesmo índice primeiro
+        if not directory.exists():
+            raise
+
+
+class KmerIndex:
+    """
+    Índice de k-mers de uma referência, aberto com memory-map.
+
+    Args:
+        directory: Pasta do índice (build_index)
+    """
+
+    def __init__(self, directory: Path):
+        meta = json.loads((directory / "taxa.json").read_text())
+        self.k = meta["k"]
+        self.names: List[str] = meta["names"]
+        self._by_key: Dict[str, List[str]] = {}
+        for name, key in zip(self.names, meta["keys"]):
+            self._by_key.setdefault(key, []).append(name)
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        self.postings = np.load(directory / "postings.npy", mmap_mode="r")
+        self.sizes = np.load(directory / "sizes.npy")
+
+    @classmethod
+    def for_reference(cls, reference: Path, root: Path, k: int = KMER_SIZE) -> "KmerIndex":
+        """Índice da referência, montado na primeira vez que essa versão aparece."""
+        directory = Path(root) / f"{fasta_digest(reference)}-k{k}-v{INDEX_FORMAT_VERSION}"
+        index = _loaded.get(str(directory))
+        if index is None:
+            if not directory.exists():
+                directory.parent.mkdir(parents=True, exist_ok=True)
+                build_index(reference, directory, k)
+            index = cls(directory)
+            if len(_loaded) >= MAX_LOADED_INDEXES:
+                _loaded.pop(next(iter(_loaded)))
+            _loaded[str(directory)] = index
+        return index
+
+    @property
+    def n_taxa(self) -> int:
+        return len(self.names)
+
+    def shared_kmers(self, kmers: np.ndarray) -> np.ndarray:
+        """Número de k-mers de ``kmers`` presentes em cada táxon."""
+        starts = np.asarray(self.offsets[kmers])
+        lengths = np.asarray(self.offsets[kmers + 1]) - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(self.n_taxa, dtype=np.int64)
+        # Posições de todas as listas concatenadas, sem laço em Python
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        return np.bincount(self.postings[positions], minlength=self.n_taxa)
+
+    def screen(self, record: FastaRecord, top_k: int = KMER_TOP_K) -> dict:
+        """
+        Triagem de uma sequência: orientação, duplicatas e táxons mais próximos.
+
+        A similaridade é o índice de Jaccard entre os conjuntos de k-mers.
+        """
+        codes = _codes(record.sequence)
+        forward = kmer_set(codes, self.k)
+        reverse = kmer_set(_reverse_codes(codes), self.k)
+        shared_forward = self.shared_kmers(forward)
+        shared_reverse = self.shared_kmers(reverse)
+
+        best_forward = shared_forward.max(initial=0) / max(forward.size, 1)
+        best_reverse = shared_reverse.max(initial=0) / max(reverse.size, 1)
+        if max(best_forward, best_reverse) < MIN_ORIENTATION_CONTAINMENT:
+            orientation = "unknown"
+        else:
+            orientation = "reverse" if best_reverse > best_forward else "forward"
+
+        shared, size = (shared_reverse, reverse.size) if orientation == "reverse" else (shared_forward, forward.size)
+        similarity = shared / np.maximum(size + self.sizes - shared, 1)
+        nearest = np.argsort(-similarity, kind="stable")[:top_k]
+        near = np.flatnonzero(similarity >= NEAR_DUPLICATE_SIMILARITY)
+        near = near[np.argsort(-similarity[near], kind="stable")]
+
+        oriented = reverse_complement(record.sequence) if orientation == "reverse" else record.sequence
+        return {
+            "name": record.name,
+            "orientation": orientation,
+            "exact_duplicates": self._by_key.get(sequence_key(oriented), []),
+            "near_duplicates": [
+                {"name": self.names[taxon], "similarity": round(float(similarity[taxon]), 4)}
+                for taxon in near
+            ],
+            "nearest": [
+                {"name": self.names[taxon], "similarity": round(float(similarity[taxon]), 4)}
+                for taxon in nearest if shared[taxon] > 0
+            ],
+        }
+
+    def screen_fasta(self, queries: Path, top_k: int = KMER_TOP_K) -> List[dict]:
+        return [self.screen(record, top_k) for record in read_fasta(queries)]
+
+
+def write_oriented(queries: Path, reports: List[dict], output: Path) -> int:
+    """
+    Grava as sequências na orientação da referência: as invertidas viram
+    complemento reverso, com o prefixo _R_ do MAFFT.
+
+    Returns:
+        Número de sequências invertidas
+    """
+    flipped = 0
+
+    def oriented():
+        nonlocal flipped
+        for record, report in zip(read_fasta(queries), reports):
+            if report["orientation"] == "reverse":
+                flipped += 1
+                yield FastaRecord(REVERSED_PREFIX + record.name, reverse_complement(record.sequence))
+            else:
+                yield record
+
+    write_fasta(oriented(), output)
+    return flipped
+
+
+def reduced_reference(reference: Path, names: set, output: Path) -> Optional[np.ndarray]:
+    """
+    Alinhamento de referência só com os táxons ``names`` e sem as colunas que
+    ficam só com gaps neles (referências muito grandes: cada sequência nova é
+    alinhada contra os táxons mais próximos).
+
+    Returns:
+        Máscara das colunas mantidas (para expand_row), ou None se nenhum
+        táxon da referência está em ``names``
+    """
+    alignment = Alignment.from_fasta(reference)
+    rows = np.array([name in names for name in alignment.names])
+    if not rows.any():
+        return None
+    columns = ~alignment.gap_mask()[rows].all(axis=0)
+    alignment.write_fasta(output, rows, columns)
+    return columns
+
+
+def expand_row(row: str, columns: np.ndarray) -> str:
+    """Linha alinhada à referência reduzida, de volta às colunas da referência completa."""
+    full = np.full(columns.size, ord("-"), dtype=np.uint8)
+    full[columns] = np.frombuffer(row.encode("ascii"), dtype=np.uint8)
+    return full.tobytes().decode("ascii")
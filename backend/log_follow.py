@@ -0,0 +1,383 @@
+"""
+Acompanhamento incremental de logs e progresso das ferramentas.
+
+LogFollower guarda o offset do arquivo e, a cada consulta, lê apenas os bytes
+acrescentados (o monitor antigo relia o iqtree.log inteiro a cada 2 s). As
+linhas novas alimentam um ProgressTracker, que extrai o andamento real da
+ferramenta (contadores do MAFFT, modelos testados, iterações e tempo restante
+do IQ-TREE) e estima o tempo até o fim. ProgressReporter publica esse
+andamento no status do job sem gravar a cada linha.
+"""
+import asyncio
+import codecs
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from tool_runner import LineSplitter, READ_CHUNK_SIZE
+
+# Intervalo entre leituras do log e entre gravações de progresso (segundos)
+FOLLOW_INTERVAL = 1.0
+PUBLISH_INTERVAL = 1.0
+
+
+class LogFollower:
+    """
+    Segue um arquivo de log que cresce (como tail -f), lendo só o que foi
+    acrescentado desde a última consulta.
+
+    Args:
+        path: Arquivo de log (pode ainda não existir)
+        on_line: Callback chamado com cada linha nova
+    """
+
+    def __init__(self, path: Path, on_line: Callable[[str], None]):
+        self.path = Path(path)
+        self.offset = 0
+        self.on_line = on_line
+        # poll() roda em threads (asyncio.to_thread): uma leitura por vez
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._splitter = LineSplitter(self.on_line)
+
+    def poll(self) -> bool:
+        """
+        Lê os bytes novos do arquivo.
+
+        Returns:
+            True se havia conteúdo novo
+        """
+        with self._lock:
+            return self._read_new()
+
+    def _read_new(self) -> bool:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return False
+        if size < self.offset:
+            # Arquivo truncado/recriado: recomeça do início
+            self.offset = 0
+            self._reset()
+        if size == self.offset:
+            return False
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                self._splitter.feed(self._decoder.decode(chunk))
+        return True
+
+    def close(self) -> None:
+        """Lê o restante do arquivo e entrega a última linha incompleta."""
+        with self._lock:
+            self._read_new()
+            self._splitter.feed(self._decoder.decode(b"", final=True))
+            self._splitter.close()
+
+    async def follow(self, interval: float = FOLLOW_INTERVAL) -> None:
+        """Consulta o arquivo periodicamente até a task ser cancelada."""
+        while True:
+            try:
+                # Leitura e callbacks fora do event loop
+                await asyncio.to_thread(self.poll)
+            except OSError as e:
+                print(f"Aviso: falha ao ler {self.path}: {e}")
+            await asyncio.sleep(interval)
+
+
+class ProgressTracker:
+    """
+    Base dos parsers de progresso.
+
+    Atributos atualizados por feed():
+        fraction: Fração concluída da ferramenta (0 a 1, nunca diminui)
+        detail: Descrição curta do que a ferramenta está fazendo
+    """
+
+    def __init__(self):
+        self.fraction = 0.0
+        self.detail: Optional[str] = None
+        self.started = time.monotonic()
+        # Tempo restante informado pela própria ferramenta (e quando foi lido)
+        self._reported_remaining: Optional[float] = None
+        self._reported_at = 0.0
+
+    def feed(self, line: str) -> None:
+        raise NotImplementedError
+
+    def _advance(self, fraction: float) -> None:
+        self.fraction = max(self.fraction, min(1.0, fraction))
+
+    def _report_remaining(self, seconds: Optional[float]) -> None:
+        self._reported_remaining = seconds
+        self._reported_at = time.monotonic()
+
+    def eta_seconds(self) -> Optional[int]:
+        """Segundos estimados até o fim, ou None se ainda não há base para estimar."""
+        now = time.monotonic()
+        if self._reported_remaining is not None:
+            return max(0, int(self._reported_remaining - (now - self._reported_at)))
+        elapsed = now - self.started
+        if self.fraction < 0.02 or elapsed < 5:
+            return None
+        return int(elapsed * (1 - self.fraction) / self.fraction)
+
+
+_COUNTER_RE = re.compile(r"(\d+)\s*/\s*(\d+)")
+
+
+class MafftProgress(ProgressTracker):
+    """
+    Progresso do MAFFT a partir do stderr.
+
+    O MAFFT informa cada fase (matriz de distâncias, árvore-guia, alinhamento
+    progressivo) seguida de contadores "i / n" atualizados com '\\r'. No
+    FFT-NS-2 as fases se repetem em duas passadas ("Progressive alignment 1/2").
+    """
+
+    # (texto da fase, início, fim) dentro de uma passada
+    PHASES = [
+        ("generating a scoring matrix", 0.00, 0.05, "Gerando matriz de pontuação"),
+        ("Making a distance matrix", 0.05, 0.30, "Matriz de distâncias"),
+        ("Constructing a UPGMA tree", 0.30, 0.45, "Árvore-guia"),
+        ("Progressive alignment", 0.45, 1.00, "Alinhamento progressivo"),
+    ]
+    _PASS_RE = re.compile(r"Progressive alignment (\d+)/(\d+)")
+
+    def __init__(self):
+        super().__init__()
+        self._phase = None
+        self._pass = 0
+        self._passes = 1
+
+    def feed(self, line: str) -> None:
+        for text, start, end, label in self.PHASES:
+            if text in line:
+                if text == "Making a distance matrix" and self._phase and self._phase[0] == "Progressive alignment":
+                    # Nova passada após um alinhamento progressivo completo
+                    self._pass = min(self._pass + 1, self._passes - 1)
+                match = self._PASS_RE.search(line)
+                if match:
+                    self._pass = int(match.group(1)) - 1
+                    self._passes = max(1, int(match.group(2)))
+                self._phase = (text, start, end, label)
+                self._update(0.0)
+                return
+
+        if self._phase:
+            match = _COUNTER_RE.search(line)
+            if match and int(match.group(2)) > 0:
+                self._update(int(match.group(1)) / int(match.group(2)))
+
+    def _update(self, phase_fraction: float) -> None:
+        _, start, end, label = self._phase
+        within = start + (end - start) * min(1.0, phase_fraction)
+        self._advance((self._pass + within) / self._passes)
+        suffix = f" ({self._pass + 1}/{self._passes})" if self._passes > 1 else ""
+        self.detail = f"{label}{suffix}"
+
+
+class IqtreeProgress(ProgressTracker):
+    """
+    Progresso do IQ-TREE a partir do iqtree.log.
+
+    Fases: seleção de modelo (ModelFinder, linha a linha da tabela de
+    modelos), árvores candidatas, busca (iterações, com o tempo restante
+    estimado pelo próprio IQ-TREE) e consenso do bootstrap. Os avisos de
+    convergência do UFBoot entram na descrição: quando não converge, o IQ-TREE
+    estende a busca além do previsto.
+    """
+
+    _MODELS_RE = re.compile(r"ModelFinder will test (?:up to )?(\d+)")
+    _MODEL_ROW_RE = re.compile(r"^\s*(\d+)\s+\S+\s+-?\d+\.\d+")
+    _BOOTSTRAP_RE = re.compile(r"Generating (\d+) samples for ultrafast bootstrap")
+    _ITERATION_RE = re.compile(
+        r"Iteration (\d+) / LogL: \S+ / Time: (\d+)h:(\d+)m:(\d+)s(?: \((\d+)h:(\d+)m:(\d+)s left\))?"
+    )
+    _NOT_CONVERGED_RE = re.compile(r"does not converge(?:, continue at least (\d+) more iterations)?")
+
+    # Faixas de cada fase na fração total
+    MODEL_TESTING = (0.00, 0.25)
+    INITIAL_TREES = (0.25, 0.35)
+    TREE_SEARCH = (0.35, 0.85)
+    FINALIZING = (0.85, 0.92)
+    CONSENSUS = (0.92, 1.00)
+
+    def __init__(self):
+        super().__init__()
+        self.models_total = None
+        self.bootstrap = None
+        self.iteration = None
+        # Situação da convergência do UFBoot (texto para a descrição)
+        self.ufboot_status: Optional[str] = None
+
+    def feed(self, line: str) -> None:
+        match = self._MODELS_RE.search(line)
+        if match:
+            self.models_total = int(match.group(1))
+            self.detail = "Seleção de modelo"
+            return
+
+        if self.models_total and self.fraction < self.INITIAL_TREES[0]:
+            match = self._MODEL_ROW_RE.match(line)
+            if match:
+                done = min(int(match.group(1)), self.models_total)
+                self._phase(self.MODEL_TESTING, done / self.models_total)
+                self.detail = f"Testando modelos ({done}/{self.models_total})"
+                return
+
+        match = self._BOOTSTRAP_RE.search(line)
+        if match:
+            self.bootstrap = int(match.group(1))
+            return
+
+        if "INITIALIZING CANDIDATE TREE SET" in line:
+            self._phase(self.INITIAL_TREES, 0.0)
+            self.detail = "Gerando árvores candidatas"
+        elif "OPTIMIZING CANDIDATE TREE SET" in line:
+            self._phase(self.INITIAL_TREES, 0.5)
+            self.detail = "Otimizando árvores candidatas"
+        elif line.startswith("Iteration "):
+            match = self._ITERATION_RE.search(line)
+            if match:
+                self._iteration(match)
+        elif "UFBoot trees and support values converged" in line:
+            self.ufboot_status = "UFBoot convergiu"
+            self._describe_search()
+        elif "does not converge" in line:
+            match = self._NOT_CONVERGED_RE.search(line)
+            more = f", mais {match.group(1)} iterações" if match.group(1) else ""
+            self.ufboot_status = f"UFBoot não convergiu{more}"
+            # A busca continua além do tempo previsto na última iteração
+            self._report_remaining(None)
+            self._describe_search()
+        elif "FINALIZING TREE SEARCH" in line:
+            self._report_remaining(None)
+            self._phase(self.FINALIZING, 0.0)
+            self.detail = "Finalizando a busca"
+        elif "Computing bootstrap consensus tree" in line:
+            self._phase(self.CONSENSUS, 0.0)
+            self.detail = "Árvore consenso do bootstrap"
+        elif "Analysis results written to" in line:
+            self._advance(1.0)
+
+    def _phase(self, bounds, phase_fraction: float) -> None:
+        start, end = bounds
+        self._advance(start + (end - start) * phase_fraction)
+
+    def _iteration(self, match: re.Match) -> None:
+        iteration = int(match.group(1))
+        elapsed = int(match.group(2)) * 3600 + int(match.group(3)) * 60 + int(match.group(4))
+        if match.group(5) is not None:
+            left = int(match.group(5)) * 3600 + int(match.group(6)) * 60 + int(match.group(7))
+            self._report_remaining(left)
+            if elapsed + left > 0:
+                self._phase(self.TREE_SEARCH, elapsed / (elapsed + left))
+        self.iteration = iteration
+        self._describe_search()
+
+    def _describe_search(self) -> None:
+        detail = "Busca da árvore"
+        if self.iteration is not None:
+            detail += f": iteração {self.iteration}"
+        if self.ufboot_status:
+            detail += f", {self.ufboot_status}"
+        elif self.bootstrap:
+            detail += f", UFBoot {self.bootstrap} réplicas"
+        self.detail = detail
+
+
+class ProgressReporter:
+    """
+    Publica o progresso de um tracker no status do job, mapeando a fração da
+    ferramenta para a faixa [start, end] da barra de progresso.
+
+    Grava no máximo uma vez por PUBLISH_INTERVAL (o MAFFT chega a emitir
+    milhares de contadores), exceto quando a descrição da etapa muda.
+    """
+
+    def __init__(self, tracker: ProgressTracker, start: int, end: int,
+                 publish: Callable[[dict], None], interval: float = PUBLISH_INTERVAL):
+        self.tracker = tracker
+        self.start = start
+        self.end = end
+        self.publish = publish
+        self.interval = interval
+        self._last = None
+        self._last_time = 0.0
+
+    def feed(self, line: str) -> None:
+        self.tracker.feed(line)
+        self.flush(force=False)
+
+    def flush(self, force: bool = True) -> None:
+        progress = int(self.start + (self.end - self.start) * self.tracker.fraction)
+        state = (progress, self.tracker.detail)
+        now = time.monotonic()
+        if state == self._last:
+            return
+        if not force and self._last and state[1] == self._last[1] and now - self._last_time < self.interval:
+            return
+        self._last = state
+        self._last_time = now
+        self.publish({"progress": progress, "detail": self.tracker.detail,
+                      "eta_seconds": self.tracker.eta_seconds()})
+
+
+class BackgroundPublisher:
+    """
+    Tira do event loop as gravações de um ProgressReporter.
+
+    Callbacks chamados no loop (como o on_stderr_line do run_tool, usado pelo
+    MAFFT) não podem gravar no status direto: cada gravação no SQLite é um
+    BEGIN IMMEDIATE que pode esperar outro worker. Aqui o callback só guarda
+    o estado mais recente, e uma task grava em uma thread, um por vez e na
+    ordem. Estados que chegam durante uma gravação são resumidos no último.
+
+    Usado como ``async with``: na saída, o último estado pendente é gravado e
+    nenhuma gravação fica em andamento (o status final do job, gravado depois,
+    nunca é sobrescrito por um progresso atrasado).
+    """
+
+    def __init__(self, publish: Callable[[dict], None]):
+        self._publish = publish
+        self._latest: Optional[dict] = None
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, fields: dict) -> None:
+        self._latest = fields
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            fields, self._latest = self._latest, None
+            if fields is not None:
+                try:
+                    await asyncio.to_thread(self._publish, fields)
+                except Exception as e:
+                    print(f"Aviso: falha ao publicar progresso: {e}")
+            if self._closing and self._latest is None:
+                return
+
+    async def __aenter__(self) -> "BackgroundPublisher":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._closing = True
+        self._wake.set()
+        await asyncio.shield(self._task)
@@ -1,19 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import itertools
+import json
 import os
-import subprocess
 import uuid
 import shutil
 from pathlib import Path
 from typing import Optional, Literal
 from pydantic import BaseModel
 import tempfile
-import threading
-import time
 import sys
 from enum import Enum
 
+from tool_runner import run_tool, ToolTimeoutError, ALIGNMENT_TIMEOUT, TREE_TIMEOUT
+from scheduler import CoreScheduler, CPU_CORES, MAX_THREADS_PER_TOOL, MIN_THREADS_PER_TOOL
+from job_store import create_job_store
+from job_events import JobEvents, SSE_KEEPALIVE, TERMINAL_STATUSES
+from log_follow import LogFollower, MafftProgress, IqtreeProgress, ProgressReporter, BackgroundPublisher
+from fasta_io import read_fasta, write_fasta, FastaFormatError
+from alignment import Alignment, AlignmentError, preflight_check
+from newick import read_tree, NewickError
+from duplicates import collapse_duplicates, expand_duplicates, COLLAPSE_DUPLICATES
+from trimming import trim_fasta, TRIMMER, GAP_THRESHOLD, MIN_CONSERVED_PERCENT
+from upload_ingest import (ingest_fasta, save_upload, UploadError, NEW_LABEL_PREFIX,
+                           MAX_REQUEST_SIZE, MAX_FILE_SIZE_MB)
+from result_cache import ResultCache, analysis_key, fasta_digest, RESULT_CACHE_MAX_MB, IGNORED_OPTIONS
+from placement_cache import (PlacementCache, placement_context, sequence_digest, uncached_records,
+                             read_added_placements, assemble_alignment, REVERSED_PREFIX)
+from kmer_index import (KmerIndex, write_oriented, reduced_reference, expand_row, check_kmer_size,
+                        KMER_SIZE, KMER_TOP_K)
+from pipeline_stages import StageLedger
+from artifact_transfer import artifact_response, precompress
+from job_bundle import bundle_entries, stream_bundle
+import render_service
+
 app = FastAPI(title="Phylogenetic Analysis API")
 
 # Enum para os modos de workflow
@@ -22,6 +44,40 @@ class WorkflowMode(str, Enum):
     ADD_SEQUENCES = "2"     # Matriz alinhada + novas seqs -> MAFFT --add -> árvore
     RAW_ALIGNMENT = "3"     # Matriz crua -> MAFFT --auto -> trimAl -> árvore
 
+@app.on_event("startup")
+async def start_render_service():
+    # Aquece o pool de renderização (importa os módulos de desenho uma vez)
+    render_service.start()
+    # Gravações no status passam a acordar os clientes de SSE/long-poll
+    job_events.bind(asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def interrupt_orphaned_jobs():
+    # Jobs que ficaram em andamento quando o processo que os rodava morreu
+    # (restart, queda) não têm mais task: viram erro em vez de "processing"
+    orphans = await asyncio.to_thread(
+        job_status.interrupt_orphans,
+        "Análise interrompida: o servidor foi reiniciado durante a execução. Envie a análise novamente.",
+    )
+    if orphans:
+        print(f"{len(orphans)} job(s) interrompido(s) marcados como erro: {', '.join(orphans)}")
+
+@app.on_event("shutdown")
+async def stop_render_service():
+    render_service.shutdown()
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Rejeita uploads grandes demais antes de o corpo ser recebido
+    if request.method == "POST" and request.url.path.startswith("/upload"):
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_REQUEST_SIZE:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload excede o limite de {MAX_FILE_SIZE_MB} MB por arquivo"},
+            )
+    return await call_next(request)
+
 # CORS para permitir acesso do frontend
 app.add_middleware(
     CORSMiddleware,
@@ -46,16 +102,62 @@ if not DEFAULT_ALIGNMENT.exists():
         f.write(">example_seq_2\n")
         f.write("ATCGATCGATCGATCGATCGATCGATCGATCG\n")
 
-# Armazena status dos jobs
-job_status = {}
+# Armazena status dos jobs (SQLite por padrão: persiste entre restarts e é
+# compartilhado entre workers do uvicorn)
+job_status = create_job_store(RESULTS_DIR / "jobs.sqlite3")
+
+# Clientes de /events e /status?since=N esperam aqui por novas versões
+job_events = JobEvents(job_status)
+
+# Tasks de análise em execução neste processo (permite cancelamento; com
+# vários workers, /cancel só funciona no worker que iniciou o job)
+running_tasks = {}
+
+def update_queue_position(job_id: str, position: Optional[int]) -> None:
+    """Reflete no status do job a sua posição na fila do escalonador."""
+    def apply(current: dict) -> dict:
+        if position is None:
+            current.pop("queue_position", None)
+            if current.get("status") == "queued":
+                current["status"] = "processing"
+        else:
+            current.update(status="queued", queue_position=position)
+        return current
+    
+    job_status.mutate(job_id, apply)
+
+# Orçamento global de núcleos compartilhado por todos os jobs
+scheduler = CoreScheduler(CPU_CORES, MAX_THREADS_PER_TOOL, MIN_THREADS_PER_TOOL,
+                          on_queue_change=update_queue_position)
+
+# Cache de análises completas (entradas + parâmetros idênticos)
+result_cache = ResultCache(RESULTS_DIR / "cache", RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Modo 2 com --keeplength (opcional, descarta as inserções das sequências
+# novas): as colunas da referência não mudam, então a posição de cada sequência
+# nova fica em cache e é reaproveitada entre jobs
+MAFFT_KEEPLENGTH = os.getenv("MAFFT_KEEPLENGTH", "false").lower() in ("1", "true", "yes")
+placement_cache = PlacementCache(RESULTS_DIR / "placement_cache.sqlite3") if MAFFT_KEEPLENGTH else None
+# Acima disso, as sequências novas são alinhadas em blocos, em processos MAFFT paralelos
+MAFFT_ADD_CHUNK_SIZE = int(os.getenv("MAFFT_ADD_CHUNK_SIZE", "200"))
+
+# Triagem das sequências novas pelo índice de k-mers da referência: orientação
+# decidida antes do MAFFT (sem --adjustdirection), duplicatas e táxons próximos
+KMER_SCREEN = os.getenv("KMER_SCREEN", "true").lower() in ("1", "true", "yes")
+# KMER_SIZE grande demais não cabe na memória (também usado por /screening):
+# falha já na inicialização
+check_kmer_size(KMER_SIZE)
+kmer_index_dir = RESULTS_DIR / "kmer_index"
+# Referências com mais táxons que isso: cada lote de sequências novas é
+# alinhado só contra os KMER_TOP_K táxons mais próximos de cada uma (0 desativa)
+REDUCED_REFERENCE_MIN_TAXA = int(os.getenv("REDUCED_REFERENCE_MIN_TAXA", "0"))
 
 # Default outgroup para enraizamento da árvore
 DEFAULT_OUTGROUP = "uncisetus"
 
-def run_trimal(input_fasta: Path, output_fasta: Path) -> bool:
+async def run_trimal(input_fasta: Path, output_fasta: Path) -> bool:
     """
-    Executa trimAl no modo automático para limpar o alinhamento.
-    Usa -automated1 que escolhe a melhor heurística baseada na similaridade.
+    Executa trimAl (-gt 0.2 -cons 60) para limpar o alinhamento.
     
     Args:
         input_fasta: Caminho do alinhamento de entrada
@@ -65,54 +167,46 @@ def run_trimal(input_fasta: Path, output_fasta: Path) -> bool:
         True se sucesso, False se falhou
     """
     try:
-        command = ["trimal", "-in", str(input_fasta), "-out", str(output_fasta), "-gt", "0.2", "-cons", "60"]
-        result = subprocess.run(command, capture_output=True, text=True, timeout=600)
+        command = ["trimal", "-in", str(input_fasta), "-out", str(output_fasta),
+                   "-gt", str(GAP_THRESHOLD), "-cons", str(MIN_CONSERVED_PERCENT)]
+        result = await run_tool(command, timeout=600)
         if result.returncode != 0:
             print(f"Erro trimAl: {result.stderr}")
             return False
         return True
-    except subprocess.TimeoutExpired:
+    except ToolTimeoutError:
         print("Erro: trimAl timeout")
         return False
     except Exception as e:
         print(f"Erro na trimagem: {e}")
         return False
 
+async def run_trimming(input_fasta: Path, output_fasta: Path) -> bool:
+    """
+    Curadoria do alinhamento do modo 3 (-gt 0.2 -cons 60).
+    
+    Usa o trimming embutido (NumPy, sem processo externo) ou o trimAl,
+    conforme TRIMMER.
+    
+    Returns:
+        True se sucesso, False se falhou
+    """
+    if TRIMMER == "trimal":
+        return await run_trimal(input_fasta, output_fasta)
+    try:
+        await asyncio.to_thread(trim_fasta, input_fasta, output_fasta, GAP_THRESHOLD, MIN_CONSERVED_PERCENT)
+        return True
+    except (AlignmentError, FastaFormatError) as e:
+        print(f"Erro na trimagem: {e}")
+        return False
+
 def merge_fasta_files(file1: Path, file2: Path, output: Path) -> None:
     """
     Junta dois arquivos FASTA em um único arquivo.
     Usado no modo 3 para combinar matriz bruta + sequências do usuário.
     """
-    with open(output, 'w') as out:
-        for fasta_file in [file1, file2]:
-            if fasta_file.exists():
-                with open(fasta_file, 'r') as f:
-                    content = f.read()
-                    if not content.endswith('\n'):
-                        content += '\n'
-                    out.write(content)
-
-def add_new_label_to_fasta(fasta_path: Path) -> None:
-    """Adiciona prefixo neew aos headers das sequências para identificação posterior.
-    
-    Exemplo: >Genus_species -> >neew_Genus_species
-    """
-    with open(fasta_path, 'r') as f:
-        content = f.read()
-    
-    lines = content.splitlines()
-    new_lines = []
-    
-    for line in lines:
-        if line.startswith('>'):
-            # Remove o '>' inicial, adiciona o label, e reconstrói
-            seq_name = line[1:].strip()
-            new_lines.append(f">neew_{seq_name}")
-        else:
-            new_lines.append(line)
-    
-    with open(fasta_path, 'w') as f:
-        f.write('\n'.join(new_lines) + '\n')
+    sources = [fasta_file for fasta_file in [file1, file2] if fasta_file.exists()]
+    write_fasta(itertools.chain.from_iterable(read_fasta(f) for f in sources), output)
 
 @app.get("/")
 async def root():
@@ -141,79 +235,43 @@ async def upload_multiple_files(
     job_dir.mkdir(exist_ok=True)
     
     files_uploaded = []
+    input_digests = {}
     
     print(f"DEBUG: use_default_alignment = {use_default_alignment}")
     
-    # Alinhamento existente
-    if existing_alignment:
-        path = job_dir / "existing_alignment.fasta"
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(existing_alignment.file, buffer)
-        files_uploaded.append("existing_alignment")
-    elif use_default_alignment == "true":
-        # Copiar alinhamento padrão
-        print(f"DEBUG: Copiando alinhamento padrão de {DEFAULT_ALIGNMENT}")
-        shutil.copy(DEFAULT_ALIGNMENT, job_dir / "existing_alignment.fasta")
-        files_uploaded.append("default_alignment")
-    else:
-        print(f"DEBUG: Nenhum alinhamento foi fornecido!")
-    
-    # Novas sequências - arquivo
-    if new_sequences:
-        path = job_dir / "new_sequences.fasta"
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(new_sequences.file, buffer)
-        # Adicionar label neew para identificação no SVG
-        add_new_label_to_fasta(path)
-        files_uploaded.append("new_sequences_file")
-    
-    # Novas sequências - texto
-    if new_sequences_text:
-        content = await new_sequences_text.read()
-        raw_text = content.decode('utf-8')
-
-        def normalize_fasta(text: str) -> str:
-            lines = text.splitlines()
-            records = []
-            header = None
-            seq_parts = []
-
-            def flush_record():
-                nonlocal header, seq_parts
-                if header:
-                    seq = ''.join(seq_parts).replace(' ', '').replace('\t', '').upper()
-                    if seq:
-                        records.append(f"{header}\n{seq}\n")
-                header, seq_parts = None, []
-
-            for line in lines:
-                if not line.strip():
-                    continue
-                if line.lstrip().startswith('>'):
-                    # salva anterior
-                    flush_record()
-                    # trata header com possível sequência na mesma linha
-                    parts = line.strip().split(None, 1)
-                    header = parts[0]
-                    if not header.startswith('>'):
-                        header = '>' + header
-                    if len(parts) > 1:
-                        seq_parts.append(parts[1])
-                else:
-                    seq_parts.append(line.strip())
-
-            flush_record()
-            return ''.join(records)
-
-        norm_text = normalize_fasta(raw_text)
-        path = job_dir / "new_sequences.fasta"
-        with open(path, "w") as f:
-            f.write(norm_text)
-        # Adicionar label neew para identificação no SVG
-        add_new_label_to_fasta(path)
-        files_uploaded.append("new_sequences_text")
+    try:
+        # Alinhamento existente
+        if existing_alignment:
+            path = job_dir / "existing_alignment.fasta"
+            result = await ingest_fasta(existing_alignment, path)
+            input_digests[path.name] = result.digest
+            files_uploaded.append("existing_alignment")
+        elif use_default_alignment == "true":
+            # Copiar alinhamento padrão
+            print(f"DEBUG: Copiando alinhamento padrão de {DEFAULT_ALIGNMENT}")
+            shutil.copy(DEFAULT_ALIGNMENT, job_dir / "existing_alignment.fasta")
+            files_uploaded.append("default_alignment")
+        else:
+            print(f"DEBUG: Nenhum alinhamento foi fornecido!")
+        
+        # Novas sequências - arquivo ou texto (com label neew para identificação no SVG)
+        if new_sequences:
+            path = job_dir / "new_sequences.fasta"
+            result = await ingest_fasta(new_sequences, path, label_prefix=NEW_LABEL_PREFIX)
+            input_digests[path.name] = result.digest
+            files_uploaded.append("new_sequences_file")
+        
+        if new_sequences_text:
+            path = job_dir / "new_sequences.fasta"
+            result = await ingest_fasta(new_sequences_text, path, label_prefix=NEW_LABEL_PREFIX, paste=True)
+            input_digests[path.name] = result.digest
+            files_uploaded.append("new_sequences_text")
+    except UploadError as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
-    job_status[job_id] = {"status": "uploaded", "progress": 0, "files": files_uploaded}
+    job_status[job_id] = {"status": "uploaded", "progress": 0, "files": files_uploaded,
+                          "input_digests": input_digests}
     
     return {
         "job_id": job_id,
@@ -222,39 +280,6 @@ async def upload_multiple_files(
     }
 
 
-def normalize_fasta_text(raw_text: str) -> str:
-    """Normaliza texto FASTA para formato padrão."""
-    lines = raw_text.splitlines()
-    records = []
-    header = None
-    seq_parts = []
-
-    def flush_record():
-        nonlocal header, seq_parts
-        if header:
-            seq = ''.join(seq_parts).replace(' ', '').replace('\t', '').upper()
-            if seq:
-                records.append(f"{header}\n{seq}\n")
-        header, seq_parts = None, []
-
-    for line in lines:
-        if not line.strip():
-            continue
-        if line.lstrip().startswith('>'):
-            flush_record()
-            parts = line.strip().split(None, 1)
-            header = parts[0]
-            if not header.startswith('>'):
-                header = '>' + header
-            if len(parts) > 1:
-                seq_parts.append(parts[1])
-        else:
-            seq_parts.append(line.strip())
-
-    flush_record()
-    return ''.join(records)
-
-
 @app.post("/upload")
 async def upload_files(
     workflow_mode: str = Form(...),
@@ -286,103 +311,100 @@ async def upload_files(
     job_dir.mkdir(exist_ok=True)
     
     files_uploaded = []
+    input_digests = {}
     effective_outgroup = outgroup if outgroup else DEFAULT_OUTGROUP
     
     print(f"DEBUG: workflow_mode = {workflow_mode}, outgroup = {effective_outgroup}")
     
-    if workflow_mode == "1":
-        # Modo 1: Matriz já alinhada
-        if not aligned_matrix:
-            raise HTTPException(status_code=400, detail="Modo 1 requer matriz alinhada")
-        
-        path = job_dir / "aligned.fasta"
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(aligned_matrix.file, buffer)
-        files_uploaded.append("aligned_matrix")
-        
-    elif workflow_mode == "2":
-        # Modo 2: Matriz alinhada + novas sequências (atual)
-        if existing_alignment:
-            path = job_dir / "existing_alignment.fasta"
-            with open(path, "wb") as buffer:
-                shutil.copyfileobj(existing_alignment.file, buffer)
-            files_uploaded.append("existing_alignment")
-        elif use_default_alignment == "true":
-            shutil.copy(DEFAULT_ALIGNMENT, job_dir / "existing_alignment.fasta")
-            files_uploaded.append("default_alignment")
-        else:
-            raise HTTPException(status_code=400, detail="Modo 2 requer alinhamento existente ou usar o padrão")
-        
-        # Novas sequências - arquivo
-        if new_sequences:
-            path = job_dir / "new_sequences.fasta"
-            with open(path, "wb") as buffer:
-                shutil.copyfileobj(new_sequences.file, buffer)
-            add_new_label_to_fasta(path)
-            files_uploaded.append("new_sequences_file")
-        # Novas sequências - texto
-        elif new_sequences_text:
-            content = await new_sequences_text.read()
-            raw_text = content.decode('utf-8')
-            norm_text = normalize_fasta_text(raw_text)
+    try:
+        if workflow_mode == "1":
+            # Modo 1: Matriz já alinhada
+            if not aligned_matrix:
+                raise HTTPException(status_code=400, detail="Modo 1 requer matriz alinhada")
+            
+            path = job_dir / "aligned.fasta"
+            result = await ingest_fasta(aligned_matrix, path)
+            input_digests[path.name] = result.digest
+            files_uploaded.append("aligned_matrix")
+            
+        elif workflow_mode == "2":
+            # Modo 2: Matriz alinhada + novas sequências (atual)
+            if existing_alignment:
+                path = job_dir / "existing_alignment.fasta"
+                result = await ingest_fasta(existing_alignment, path)
+                input_digests[path.name] = result.digest
+                files_uploaded.append("existing_alignment")
+            elif use_default_alignment == "true":
+                shutil.copy(DEFAULT_ALIGNMENT, job_dir / "existing_alignment.fasta")
+                files_uploaded.append("default_alignment")
+            else:
+                raise HTTPException(status_code=400, detail="Modo 2 requer alinhamento existente ou usar o padrão")
+            
+            # Novas sequências - arquivo ou texto (label neew para identificação no SVG)
             path = job_dir / "new_sequences.fasta"
-            with open(path, "w") as f:
-                f.write(norm_text)
-            add_new_label_to_fasta(path)
-            files_uploaded.append("new_sequences_text")
-        else:
-            raise HTTPException(status_code=400, detail="Modo 2 requer novas sequências")
+            if new_sequences:
+                result = await ingest_fasta(new_sequences, path, label_prefix=NEW_LABEL_PREFIX)
+                files_uploaded.append("new_sequences_file")
+            elif new_sequences_text:
+                result = await ingest_fasta(new_sequences_text, path, label_prefix=NEW_LABEL_PREFIX, paste=True)
+                files_uploaded.append("new_sequences_text")
+            else:
+                raise HTTPException(status_code=400, detail="Modo 2 requer novas sequências")
+            input_digests[path.name] = result.digest
+                
+        elif workflow_mode == "3":
+            # Modo 3: Matriz crua + sequências do usuário
+            if not raw_matrix:
+                raise HTTPException(status_code=400, detail="Modo 3 requer matriz crua")
             
-    elif workflow_mode == "3":
-        # Modo 3: Matriz crua + sequências do usuário
-        if not raw_matrix:
-            raise HTTPException(status_code=400, detail="Modo 3 requer matriz crua")
-        
-        path_raw = job_dir / "raw_matrix.fasta"
-        with open(path_raw, "wb") as buffer:
-            shutil.copyfileobj(raw_matrix.file, buffer)
-        files_uploaded.append("raw_matrix")
-        
-        # Sequências do usuário (opcional, mas encorajada)
-        if user_sequences:
-            path_user = job_dir / "user_sequences.fasta"
-            with open(path_user, "wb") as buffer:
-                shutil.copyfileobj(user_sequences.file, buffer)
-            add_new_label_to_fasta(path_user)
-            files_uploaded.append("user_sequences_file")
-        elif user_sequences_text:
-            content = await user_sequences_text.read()
-            raw_text = content.decode('utf-8')
-            norm_text = normalize_fasta_text(raw_text)
+            path_raw = job_dir / "raw_matrix.fasta"
+            result = await ingest_fasta(raw_matrix, path_raw)
+            input_digests[path_raw.name] = result.digest
+            files_uploaded.append("raw_matrix")
+            
+            # Sequências do usuário (opcional, mas encorajada)
             path_user = job_dir / "user_sequences.fasta"
-            with open(path_user, "w") as f:
-                f.write(norm_text)
-            add_new_label_to_fasta(path_user)
-            files_uploaded.append("user_sequences_text")
-    
-    elif workflow_mode == "4":
-        # Modo 4: Árvore pronta - apenas renderização
-        if not tree_file:
-            raise HTTPException(status_code=400, detail="Modo 4 requer arquivo de árvore (.nwk ou .tre)")
+            if user_sequences:
+                result = await ingest_fasta(user_sequences, path_user, label_prefix=NEW_LABEL_PREFIX)
+                input_digests[path_user.name] = result.digest
+                files_uploaded.append("user_sequences_file")
+            elif user_sequences_text:
+                result = await ingest_fasta(user_sequences_text, path_user, label_prefix=NEW_LABEL_PREFIX, paste=True)
+                input_digests[path_user.name] = result.digest
+                files_uploaded.append("user_sequences_text")
         
-        # Salvar árvore no diretório de resultados também
-        result_dir = RESULTS_DIR / job_id
-        result_dir.mkdir(exist_ok=True)
+        elif workflow_mode == "4":
+            # Modo 4: Árvore pronta - apenas renderização
+            if not tree_file:
+                raise HTTPException(status_code=400, detail="Modo 4 requer arquivo de árvore (.nwk ou .tre)")
+            
+            # Salvar árvore no diretório de resultados também
+            result_dir = RESULTS_DIR / job_id
+            result_dir.mkdir(exist_ok=True)
+            
+            path_tree = result_dir / "tree.tre"
+            await save_upload(tree_file, path_tree)
+            # Rejeita já no upload o que não é Newick/NEXUS (em vez de falhar na renderização)
+            try:
+                await asyncio.to_thread(read_tree, path_tree)
+            except NewickError as e:
+                raise UploadError(f"Árvore inválida: {e}")
+            files_uploaded.append("tree_file")
         
-        path_tree = result_dir / "tree.tre"
-        with open(path_tree, "wb") as buffer:
-            shutil.copyfileobj(tree_file.file, buffer)
-        files_uploaded.append("tree_file")
-    
-    else:
-        raise HTTPException(status_code=400, detail="workflow_mode deve ser 1, 2, 3 ou 4")
+        else:
+            raise HTTPException(status_code=400, detail="workflow_mode deve ser 1, 2, 3 ou 4")
+    except UploadError as e:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        shutil.rmtree(RESULTS_DIR / job_id, ignore_errors=True)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     
     job_status[job_id] = {
         "status": "uploaded", 
         "progress": 0, 
         "files": files_uploaded,
         "workflow_mode": workflow_mode,
-        "outgroup": effective_outgroup
+        "outgroup": effective_outgroup,
+        "input_digests": input_digests
     }
     
     return {
@@ -394,16 +416,67 @@ async def upload_files(
     }
 
 
+# Tempo máximo que um long-poll de /status fica aberto
+MAX_STATUS_WAIT = 60
+
 @app.get("/status/{job_id}")
-async def get_status(job_id: str):
-    """Consulta status do job"""
+async def get_status(job_id: str, since: Optional[int] = None, wait: float = 30):
+    """
+    Consulta status do job.
+    
+    Com since=N a resposta é um long-poll: espera até wait segundos por uma
+    versão maior que N (campo "version" do status) antes de responder.
+    """
+    if since is None:
+        status = await asyncio.to_thread(job_status.get, job_id)
+    else:
+        status = await job_events.wait(job_id, since, max(0, min(wait, MAX_STATUS_WAIT)))
+    
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    return status
+
+@app.get("/events/{job_id}")
+async def stream_status(job_id: str, request: Request):
+    """
+    Stream de progresso do job (Server-Sent Events).
+    
+    Envia um evento "status" a cada mudança e encerra quando o job termina.
+    Reconexões com Last-Event-ID retomam a partir da última versão recebida.
+    """
     if job_id not in job_status:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
-    return job_status[job_id]
+    try:
+        since = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        since = 0
+    
+    async def event_stream():
+        last_version = since
+        while True:
+            status = await job_events.wait(job_id, last_version, SSE_KEEPALIVE)
+            if status is None:
+                return
+            if status["version"] > last_version:
+                last_version = status["version"]
+                yield f"id: {last_version}\nevent: status\ndata: {json.dumps(status)}\n\n"
+                if status.get("status") in TERMINAL_STATUSES:
+                    return
+            elif status.get("status") in TERMINAL_STATUSES:
+                return
+            else:
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/analyze/{job_id}")
-async def analyze(job_id: str, background_tasks: BackgroundTasks, 
+async def analyze(job_id: str,
                   tree_tool: str = "skip",
                   bootstrap: int = 1000):
     """Inicia análise filogenética baseada no workflow_mode do job"""
@@ -441,9 +514,10 @@ async def analyze(job_id: str, background_tasks: BackgroundTasks,
         
         # Executar apenas renderização (síncrono, rápido)
         job_status[job_id] = {"status": "processing", "progress": 50, "step": "rendering", "workflow_mode": workflow_mode}
+        job_status.claim(job_id)
         
         try:
-            generate_svg_with_outgroup(tree_file, result_dir, outgroup)
+            await generate_svg_with_outgroup(tree_file, result_dir, outgroup)
             job_status[job_id] = {
                 "status": "completed", 
                 "progress": 100,
@@ -461,25 +535,57 @@ async def analyze(job_id: str, background_tasks: BackgroundTasks,
             "message": "Renderização concluída" if job_status[job_id]["status"] == "completed" else "Erro na renderização"
         }
     
+    # Verificação prévia das matrizes que já devem chegar alinhadas
+    if workflow_mode == "1" and tree_tool != "skip":
+        problems = await asyncio.to_thread(preflight_check, aligned_file)
+    elif workflow_mode == "2":
+        problems = await asyncio.to_thread(preflight_check, existing_alignment, 1)
+    else:
+        problems = []
+    if problems:
+        raise HTTPException(status_code=400, detail=f"Alinhamento inválido: {'; '.join(problems)}")
+    
     # Opções MAFFT
     mafft_options = {
-        "threads": 8,
+        "threads": MAX_THREADS_PER_TOOL,
         "reorder": True,
-        "adjustdirection": True,
-        "keeplength": False,
+        "adjustdirection": not KMER_SCREEN,
+        "keeplength": MAFFT_KEEPLENGTH,
         "compactmapout": False,
         "ep": 0.0,
         "mode": "auto"
     }
     
-    # Agenda processamento em background
-    background_tasks.add_task(
-        run_phylogenetic_analysis, 
-        job_id, workflow_mode, outgroup,
-        tree_tool, bootstrap, mafft_options
+    if job_id in running_tasks:
+        raise HTTPException(status_code=409, detail="Análise já em andamento para este job")
+    
+    # Acerto no cache: mesmas entradas e parâmetros já analisados antes
+    cache_key = await asyncio.to_thread(
+        analysis_key, job_dir, workflow_mode, outgroup, tree_tool, bootstrap, mafft_options,
+        job_info.get("input_digests"), analysis_settings()
     )
+    result_dir = RESULTS_DIR / job_id
+    if cache_key and await asyncio.to_thread(result_cache.restore, cache_key, job_dir, result_dir):
+        job_status[job_id] = completed_status(job_id, workflow_mode, outgroup, tree_tool, cached=True)
+        return {
+            "job_id": job_id,
+            "status": "completed",
+            "workflow_mode": workflow_mode,
+            "cached": True,
+            "message": "Resultado recuperado do cache"
+        }
     
     job_status[job_id] = {"status": "processing", "progress": 10, "workflow_mode": workflow_mode, "outgroup": outgroup}
+    job_status.claim(job_id)
+    
+    # Agenda processamento em background (task própria para permitir cancelamento)
+    scheduler.register(job_id)
+    task = asyncio.create_task(run_phylogenetic_analysis(
+        job_id, workflow_mode, outgroup,
+        tree_tool, bootstrap, mafft_options, cache_key
+    ))
+    running_tasks[job_id] = task
+    task.add_done_callback(lambda _: running_tasks.pop(job_id, None))
     
     return {
         "job_id": job_id,
@@ -488,17 +594,111 @@ async def analyze(job_id: str, background_tasks: BackgroundTasks,
         "message": "Análise iniciada"
     }
 
+@app.get("/alignment/{job_id}/stats")
+async def get_alignment_stats(job_id: str, columns: bool = False):
+    """
+    Estatísticas do alinhamento do job: gaps, conservação, sítios constantes e
+    parcimoniosamente informativos, sequências idênticas e problemas que
+    impediriam a inferência. columns=true inclui os vetores por coluna.
+    """
+    job_dir = UPLOAD_DIR / job_id
+    # Alinhamento final (modo 1 ou após a análise) ou a matriz de referência do modo 2
+    for name in ["aligned.fasta", "existing_alignment.fasta"]:
+        path = job_dir / name
+        if path.exists():
+            break
+    else:
+        raise HTTPException(status_code=404, detail="Alinhamento não encontrado")
+    
+    def compute() -> dict:
+        alignment = Alignment.from_fasta(path)
+        return {"file": name, **alignment.stats(per_column=columns), "problems": alignment.preflight()}
+    
+    try:
+        return await asyncio.to_thread(compute)
+    except (AlignmentError, FastaFormatError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/screening/{job_id}")
+async def get_screening(job_id: str, top_k: int = KMER_TOP_K):
+    """
+    Triagem das sequências novas contra a referência pelo índice de k-mers
+    (kmer_index): orientação, duplicatas exatas e quase duplicatas e os
+    táxons mais próximos de cada uma. Não depende da análise ter rodado.
+    """
+    job_dir = UPLOAD_DIR / job_id
+    # Modo 2: novas sequências x matriz alinhada; modo 3: sequências do usuário x matriz crua
+    for reference, queries in [("existing_alignment.fasta", "new_sequences.fasta"),
+                               ("raw_matrix.fasta", "user_sequences.fasta")]:
+        if (job_dir / reference).exists() and (job_dir / queries).exists():
+            break
+    else:
+        raise HTTPException(status_code=404, detail="Sequências novas e referência não encontradas")
+    
+    def compute() -> dict:
+        index = KmerIndex.for_reference(job_dir / reference, kmer_index_dir)
+        reports = index.screen_fasta(job_dir / queries, max(1, min(top_k, index.n_taxa)))
+        return {
+            "reference": reference,
+            "reference_taxa": index.n_taxa,
+            "k": index.k,
+            "summary": {
+                "sequences": len(reports),
+                "reverse": sum(report["orientation"] == "reverse" for report in reports),
+                "unknown_orientation": sum(report["orientation"] == "unknown" for report in reports),
+                "exact_duplicates": sum(bool(report["exact_duplicates"]) for report in reports),
+                "near_duplicates": sum(bool(report["near_duplicates"]) for report in reports),
+            },
+            "sequences": reports,
+        }
+    
+    try:
+        return await asyncio.to_thread(compute)
+    except FastaFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.post("/cancel/{job_id}")
+async def cancel_analysis(job_id: str):
+    """Cancela uma análise em andamento, encerrando a ferramenta em execução"""
+    if job_id not in job_status:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    task = running_tasks.get(job_id)
+    if task is None:
+        raise HTTPException(status_code=400, detail="Nenhuma análise em andamento para este job")
+    
+    task.cancel()
+    return {"job_id": job_id, "status": "cancelling", "message": "Cancelamento solicitado"}
+
 @app.get("/download/{job_id}/{file_type}")
-async def download_result(job_id: str, file_type: str):
-    """Download de resultados (tree, tree_svg ou alignment)"""
+async def download_result(job_id: str, file_type: str, request: Request):
+    """
+    Download de resultados (tree, tree_svg ou alignment), com gzip/brotli,
+    ETag e Range; "bundle" gera um .zip com todos os artefatos do job
+    """
     
     if job_id not in job_status:
         raise HTTPException(status_code=404, detail="Job não encontrado")
     
-    if job_status[job_id]["status"] != "completed":
+    status = job_status[job_id]
+    if status["status"] != "completed":
         raise HTTPException(status_code=400, detail="Análise ainda não completada")
     
-    if file_type == "tree":
+    if file_type == "bundle":
+        entries = bundle_entries(RESULTS_DIR / job_id, UPLOAD_DIR / job_id)
+        job_info = {
+            "job_id": job_id,
+            "workflow_mode": status.get("workflow_mode"),
+            "outgroup": status.get("outgroup"),
+            "cached": status.get("cached", False),
+        }
+        # Gerador síncrono: o StreamingResponse o consome numa thread, fora do event loop
+        return StreamingResponse(
+            stream_bundle(entries, job_info),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="job_{job_id[:8]}.zip"'},
+        )
+    elif file_type == "tree":
         file_path = RESULTS_DIR / job_id / "tree.tre"
         media_type = "text/plain"
         filename = "phylogenetic_tree.tre"
@@ -516,16 +716,30 @@ async def download_result(job_id: str, file_type: str):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     
-    return FileResponse(
-        path=file_path,
-        media_type=media_type,
-        filename=filename
-    )
+    return await artifact_response(request, file_path, media_type, filename=filename)
+
+
+@app.get("/results/{job_id}/svg")
+async def get_svg(job_id: str, request: Request):
+    """SVG da árvore para exibição inline (arquivo direto, comprimido e com ETag)"""
+    
+    if job_id not in job_status:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    if job_status[job_id]["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Análise ainda não completada")
+    
+    svg_path = RESULTS_DIR / job_id / "supportvalue_output.svg"
+    
+    if not svg_path.exists():
+        raise HTTPException(status_code=404, detail="Arquivo SVG não encontrado")
+    
+    return await artifact_response(request, svg_path, "image/svg+xml")
 
 
 @app.get("/results/{job_id}/svg-content")
 async def get_svg_content(job_id: str):
-    """Retorna o conteúdo SVG como texto para exibição inline no frontend"""
+    """Retorna o conteúdo SVG dentro de um JSON (mantido por compatibilidade; prefira /results/{job_id}/svg)"""
     
     if job_id not in job_status:
         raise HTTPException(status_code=404, detail="Job não encontrado")
@@ -576,7 +790,7 @@ async def rerender_svg(job_id: str, request: RerenderRequest):
     
     try:
         # Re-gerar SVG com novas dimensões
-        generate_svg_with_outgroup(
+        await generate_svg_with_outgroup(
             tree_file, 
             result_dir, 
             outgroup, 
@@ -585,16 +799,13 @@ async def rerender_svg(job_id: str, request: RerenderRequest):
             height=request.height
         )
         
-        # Retornar novo conteúdo SVG
+        # O SVG novo é buscado em svg_url (comprimido, com ETag novo)
         svg_path = result_dir / "supportvalue_output.svg"
         if not svg_path.exists():
             raise HTTPException(status_code=500, detail="Falha ao gerar SVG")
         
-        with open(svg_path, "r", encoding="utf-8") as f:
-            svg_content = f.read()
-        
         return {
-            "svg_content": svg_content,
+            "svg_url": f"/results/{job_id}/svg",
             "job_id": job_id,
             "width": request.width,
             "height": request.height
@@ -604,16 +815,105 @@ async def rerender_svg(job_id: str, request: RerenderRequest):
         raise HTTPException(status_code=500, detail=f"Erro ao re-renderizar: {str(e)}")
 
 
+# Acima deste número de tips o frontend abre a visão geral (LOD) em vez do SVG completo
+LOD_MIN_TIPS = int(os.getenv("LOD_MIN_TIPS", "500"))
+SVG_WIDTH = 1700
+
+
+async def render_tree_view(job_id: str, view: str, **params):
+    """Visualização por nível de detalhe a partir do layout salvo do job."""
+    if job_id not in job_status:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    
+    if job_status[job_id]["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Análise ainda não completada")
+    
+    result_dir = RESULTS_DIR / job_id
+    tree_file = result_dir / "tree.tre"
+    if not tree_file.exists():
+        raise HTTPException(status_code=404, detail="Arquivo de árvore não encontrado")
+    
+    outgroup = job_status[job_id].get("outgroup", DEFAULT_OUTGROUP)
+    try:
+        return await render_service.render_view(tree_file, result_dir, outgroup, view, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/results/{job_id}/tree")
+async def get_tree_summary(job_id: str):
+    """Tamanho da árvore e se a visualização por nível de detalhe é recomendada"""
+    summary = await render_tree_view(job_id, "summary")
+    return {"job_id": job_id, **summary, "lod": summary["tips"] > LOD_MIN_TIPS}
+
+
+@app.get("/results/{job_id}/tree/overview")
+async def get_tree_overview(job_id: str, collapse: Literal["genus", "support"] = "genus",
+                            min_support: float = 70, depth: float = 0.5, width: int = SVG_WIDTH):
+    """Árvore com clados colapsados em triângulos (por gênero ou por suporte/profundidade)"""
+    svg = await render_tree_view(job_id, "overview", width=width, by=collapse,
+                                 min_support=min_support, depth=depth)
+    return Response(content=svg, media_type="image/svg+xml")
+
+
+@app.get("/results/{job_id}/tree/window")
+async def get_tree_window(job_id: str, start: int, end: int, width: int = SVG_WIDTH):
+    """Linhas [start, end) da árvore completa (mesma escala do SVG inteiro)"""
+    svg = await render_tree_view(job_id, "window", start=start, end=end, width=width)
+    return Response(content=svg, media_type="image/svg+xml")
+
+
+@app.get("/results/{job_id}/tree/subtree/{node}")
+async def get_tree_subtree(job_id: str, node: int, width: int = SVG_WIDTH):
+    """Um clado da árvore (node = data-node de um triângulo da visão geral)"""
+    svg = await render_tree_view(job_id, "subtree", node=node, width=width)
+    return Response(content=svg, media_type="image/svg+xml")
+
+
+def analysis_settings() -> dict:
+    """Configurações do servidor (variáveis de ambiente) que alteram o resultado da análise."""
+    return {
+        "collapse_duplicates": COLLAPSE_DUPLICATES,
+        "trimmer": TRIMMER,
+        "kmer_screen": KMER_SIZE if KMER_SCREEN else None,
+        "reduced_reference": [REDUCED_REFERENCE_MIN_TAXA, KMER_TOP_K] if REDUCED_REFERENCE_MIN_TAXA else None,
+    }
+
+
+def completed_status(job_id: str, workflow_mode: str, outgroup: str, tree_tool: str,
+                     cached: bool = False, reused_stages: Optional[list] = None) -> dict:
+    """
+    Status final de um job concluído com sucesso.
+    
+    Args:
+        reused_stages: Estágios pulados por já estarem atualizados (pipeline_stages)
+    """
+    return {
+        "status": "completed", 
+        "progress": 100,
+        "workflow_mode": workflow_mode,
+        "outgroup": outgroup,
+        "tree_file": str(RESULTS_DIR / job_id / "tree.tre") if tree_tool != "skip" else None,
+        "aligned_file": str(UPLOAD_DIR / job_id / "aligned.fasta"),
+        "cached": cached,
+        "reused_stages": reused_stages or []
+    }
+
+
 async def run_phylogenetic_analysis(job_id: str, workflow_mode: str, outgroup: str,
                                      tree_tool: str, bootstrap: int, 
-                                     mafft_options: dict):
+                                     mafft_options: dict, cache_key: Optional[str] = None):
     """
     Executa pipeline filogenético baseado no modo de workflow:
     
     - Modo 1: Matriz alinhada -> direto para árvore
     - Modo 2: MAFFT --add + árvore (comportamento original)
     - Modo 3: Juntar matrizes -> MAFFT --auto -> trimAl -> árvore
+    
+    Se outro job idêntico (mesma cache_key) estiver em andamento, aguarda o
+    resultado dele em vez de repetir o pipeline.
     """
+    is_leader = False
     try:
         job_dir = UPLOAD_DIR / job_id
         result_dir = RESULTS_DIR / job_id
@@ -623,6 +923,28 @@ async def run_phylogenetic_analysis(job_id: str, workflow_mode: str, outgroup: s
         trimmed_file = job_dir / "trimmed.fasta"
         tree_file = result_dir / "tree.tre"
         
+        if cache_key:
+            while (leader := result_cache.inflight(cache_key)) is not None:
+                job_status.update(job_id, status="processing", step="waiting_duplicate")
+                await asyncio.shield(leader)
+                if await asyncio.to_thread(result_cache.restore, cache_key, job_dir, result_dir):
+                    job_status[job_id] = completed_status(job_id, workflow_mode, outgroup, tree_tool, cached=True)
+                    return
+            result_cache.start(cache_key)
+            is_leader = True
+        
+        # Estágios já concluídos com as mesmas entradas (ex.: só a ferramenta
+        # de árvore mudou) são pulados; ver pipeline_stages
+        ledger = StageLedger(job_dir)
+        
+        async def stage(name: str, inputs: list, params: dict, outputs: list, run) -> None:
+            fingerprint = await asyncio.to_thread(ledger.fingerprint, name, inputs, params)
+            if await asyncio.to_thread(ledger.reuse, name, fingerprint, outputs):
+                job_status.update(job_id, step=f"{name}_reused", reused_stages=list(ledger.reused))
+                return
+            await run()
+            await asyncio.to_thread(ledger.record, name, fingerprint, outputs)
+        
         # ============================================================
         # PASSO 1: PREPARAÇÃO DO ALINHAMENTO (depende do modo)
         # ============================================================
@@ -637,63 +959,139 @@ async def run_phylogenetic_analysis(job_id: str, workflow_mode: str, outgroup: s
             existing_alignment = job_dir / "existing_alignment.fasta"
             new_sequences = job_dir / "new_sequences.fasta"
             
-            job_status[job_id] = {"status": "processing", "progress": 20, "step": "alignment", "workflow_mode": workflow_mode}
-            
-            mafft_cmd = build_mafft_add_command(mafft_options, new_sequences, existing_alignment)
+            async def align():
+                job_status[job_id] = {"status": "processing", "progress": 20, "step": "alignment", "workflow_mode": workflow_mode}
+                sequences = new_sequences
+                options = mafft_options
+                nearest = None
+                flipped = 0
+                if KMER_SCREEN:
+                    # Sequências invertidas viradas aqui (em milissegundos), não pelo MAFFT
+                    sequences = job_dir / "oriented_sequences.fasta"
+                    index = await asyncio.to_thread(KmerIndex.for_reference, existing_alignment, kmer_index_dir)
+                    reports = await asyncio.to_thread(index.screen_fasta, new_sequences)
+                    flipped = await asyncio.to_thread(write_oriented, new_sequences, reports, sequences)
+                    unknown = sum(report["orientation"] == "unknown" for report in reports)
+                    if unknown:
+                        # Orientação que o índice não decidiu fica com o MAFFT
+                        print(f"{unknown} sequência(s) sem orientação pelo índice: MAFFT com --adjustdirection")
+                        options = {**options, "adjustdirection": True}
+                    # Referência reduzida só com --keeplength (colunas reinseridas em expand_row)
+                    if (options["keeplength"] and REDUCED_REFERENCE_MIN_TAXA
+                            and index.n_taxa > REDUCED_REFERENCE_MIN_TAXA):
+                        nearest = {
+                            (REVERSED_PREFIX if report["orientation"] == "reverse" else "") + report["name"]:
+                                [taxon["name"] for taxon in report["nearest"]]
+                            for report in reports
+                        }
+                if options["keeplength"]:
+                    await run_mafft_add_cached(job_id, options, sequences, existing_alignment,
+                                               aligned_file, workflow_mode, nearest)
+                else:
+                    async with scheduler.lease(job_id, options["threads"]) as threads:
+                        mafft_cmd = build_mafft_add_command({**options, "threads": threads},
+                                                            sequences, existing_alignment)
+                        await run_mafft_with_monitoring(job_id, mafft_cmd, aligned_file, workflow_mode)
+                job_status.update(job_id, reverse_complemented=flipped)
             
-            await run_mafft_with_monitoring(job_id, mafft_cmd, aligned_file, workflow_mode)
+            await stage("align", [existing_alignment, new_sequences],
+                        {"command": "add",
+                         "options": {k: v for k, v in mafft_options.items() if k not in IGNORED_OPTIONS},
+                         "kmer_screen": KMER_SIZE if KMER_SCREEN else None,
+                         "reduced_reference": [REDUCED_REFERENCE_MIN_TAXA, KMER_TOP_K]},
+                        [aligned_file], align)
             
         elif workflow_mode == "3":
             # Modo 3: Juntar matrizes -> MAFFT --auto -> trimAl
             raw_matrix = job_dir / "raw_matrix.fasta"
             user_sequences = job_dir / "user_sequences.fasta"
             merged_file = job_dir / "merged_input.fasta"
+            raw_aligned_file = job_dir / "raw_aligned.fasta"
             
             # Passo 3a: Juntar matrizes
-            job_status[job_id] = {"status": "processing", "progress": 10, "step": "merging_files", "workflow_mode": workflow_mode}
+            async def merge():
+                job_status[job_id] = {"status": "processing", "progress": 10, "step": "merging_files", "workflow_mode": workflow_mode}
+                if user_sequences.exists():
+                    await asyncio.to_thread(merge_fasta_files, raw_matrix, user_sequences, merged_file)
+                else:
+                    shutil.copy(raw_matrix, merged_file)
             
-            if user_sequences.exists():
-                merge_fasta_files(raw_matrix, user_sequences, merged_file)
-            else:
-                shutil.copy(raw_matrix, merged_file)
+            await stage("merge", [path for path in (raw_matrix, user_sequences) if path.exists()],
+                        {}, [merged_file], merge)
             
             # Passo 3b: MAFFT --auto (sem --add)
-            job_status[job_id] = {"status": "processing", "progress": 15, "step": "alignment", "workflow_mode": workflow_mode}
-            
-            mafft_cmd = build_mafft_auto_command(mafft_options, merged_file)
+            async def align():
+                job_status[job_id] = {"status": "processing", "progress": 15, "step": "alignment", "workflow_mode": workflow_mode}
+                async with scheduler.lease(job_id, mafft_options["threads"]) as threads:
+                    mafft_cmd = build_mafft_auto_command({**mafft_options, "threads": threads}, merged_file)
+                    await run_mafft_with_monitoring(job_id, mafft_cmd, raw_aligned_file, workflow_mode,
+                                                    progress_start=15, progress_end=52)
             
-            raw_aligned_file = job_dir / "raw_aligned.fasta"
-            await run_mafft_with_monitoring(job_id, mafft_cmd, raw_aligned_file, workflow_mode)
+            await stage("align", [merged_file], {"command": "auto"}, [raw_aligned_file], align)
             
             # Passo 3c: trimAl para curadoria
-            job_status[job_id] = {"status": "processing", "progress": 55, "step": "trimming", "workflow_mode": workflow_mode}
-            
-            if not run_trimal(raw_aligned_file, aligned_file):
-                raise Exception("trimAl falhou na curadoria do alinhamento")
+            async def trim():
+                job_status[job_id] = {"status": "processing", "progress": 55, "step": "trimming", "workflow_mode": workflow_mode}
+                async with scheduler.lease(job_id, 1):
+                    trimmed = await run_trimming(raw_aligned_file, aligned_file)
+                if not trimmed:
+                    raise Exception("Falha na curadoria do alinhamento")
+                job_status[job_id] = {"status": "processing", "progress": 60, "step": "trimming_done", "workflow_mode": workflow_mode}
             
-            job_status[job_id] = {"status": "processing", "progress": 60, "step": "trimming_done", "workflow_mode": workflow_mode}
+            await stage("trim", [raw_aligned_file],
+                        {"trimmer": TRIMMER, "gap_threshold": GAP_THRESHOLD,
+                         "min_conserved_percent": MIN_CONSERVED_PERCENT},
+                        [aligned_file], trim)
         
         # ============================================================
         # PASSO 2: CONSTRUÇÃO DA ÁRVORE (comum a todos os modos)
         # ============================================================
         
         if tree_tool != "skip":
-            await build_tree(job_id, aligned_file, tree_file, result_dir, tree_tool, bootstrap, outgroup, workflow_mode)
+            async def infer():
+                # Verificação prévia: problemas no alinhamento aparecem aqui, e não
+                # minutos depois como falha do FastTree/IQ-TREE
+                problems = await asyncio.to_thread(preflight_check, aligned_file)
+                if problems:
+                    raise Exception(f"Alinhamento inválido: {'; '.join(problems)}")
+                await build_tree(job_id, aligned_file, tree_file, result_dir, tree_tool, bootstrap, workflow_mode)
+            
+            await stage("infer", [aligned_file],
+                        {"tree_tool": tree_tool,
+                         "bootstrap": bootstrap if tree_tool == "iqtree" else None,
+                         "collapse_duplicates": COLLAPSE_DUPLICATES},
+                        [tree_file], infer)
+            
+            async def render():
+                job_status.update(job_id, status="processing", progress=99, step="rendering")
+                await generate_svg_with_outgroup(tree_file, result_dir, outgroup, aligned_file)
+            
+            await stage("render", [tree_file, aligned_file], {"outgroup": outgroup},
+                        [result_dir / "supportvalue_output.svg"], render)
+        
+        # Renderização falha sem derrubar o job (generate_svg_with_outgroup só
+        # avisa): um resultado sem SVG não vai para o cache, nem um SVG com os
+        # nomes desenhados enquanto o IndexFungorum não respondia
+        if cache_key and (tree_tool == "skip" or (all(
+            (result_dir / name).exists() for name in ("tree.tre", "supportvalue_output.svg")
+        ) and render_service.labels_complete(result_dir))):
+            await asyncio.to_thread(result_cache.store, cache_key, job_dir, result_dir)
         
         # Sucesso
-        job_status[job_id] = {
-            "status": "completed", 
-            "progress": 100,
-            "workflow_mode": workflow_mode,
-            "outgroup": outgroup,
-            "tree_file": str(tree_file) if tree_tool != "skip" else None,
-            "aligned_file": str(aligned_file)
-        }
+        job_status[job_id] = completed_status(job_id, workflow_mode, outgroup, tree_tool,
+                                              reused_stages=ledger.reused)
         
-    except subprocess.TimeoutExpired:
+    except asyncio.CancelledError:
+        job_status[job_id] = {"status": "cancelled", "message": "Análise cancelada", "workflow_mode": workflow_mode, "outgroup": outgroup}
+        raise
+    except ToolTimeoutError:
         job_status[job_id] = {"status": "error", "message": "Timeout: análise muito longa", "workflow_mode": workflow_mode, "outgroup": outgroup}
     except Exception as e:
         job_status[job_id] = {"status": "error", "message": str(e), "workflow_mode": workflow_mode, "outgroup": outgroup}
+    finally:
+        scheduler.forget(job_id)
+        if is_leader:
+            result_cache.finish(cache_key)
 
 
 def build_mafft_add_command(mafft_options: dict, new_sequences: Path, existing_alignment: Path) -> list:
@@ -729,172 +1127,229 @@ def build_mafft_auto_command(mafft_options: dict, input_file: Path) -> list:
     return mafft_cmd
 
 
-async def run_mafft_with_monitoring(job_id: str, mafft_cmd: list, output_file: Path, workflow_mode: str):
-    """Executa MAFFT com monitoramento de progresso"""
-    monitor_active = [True]
-    
-    mafft_milestones = [
-        ("generating a scoring matrix", 25),
-        ("Making a distance matrix", 35),
-        ("Constructing a UPGMA tree", 45),
-        ("Progressive alignment", 55)
-    ]
-    
-    def monitor_mafft_output(stderr_pipe):
-        completed_milestones = set()
-        for line in iter(stderr_pipe.readline, ''):
-            if not monitor_active[0]:
-                break
-            for milestone_text, progress in mafft_milestones:
-                if milestone_text not in completed_milestones and milestone_text in line:
-                    completed_milestones.add(milestone_text)
-                    job_status[job_id] = {
-                        "status": "processing",
-                        "progress": progress,
-                        "step": "alignment",
-                        "workflow_mode": workflow_mode
-                    }
-    
-    process = subprocess.Popen(mafft_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                               text=True, bufsize=1)
-    
-    monitor_thread = threading.Thread(target=monitor_mafft_output, args=(process.stderr,), daemon=True)
-    monitor_thread.start()
-    
-    with open(output_file, "w") as out:
-        for line in process.stdout:
-            out.write(line)
-    
-    process.wait(timeout=3600)
-    
-    monitor_active[0] = False
-    monitor_thread.join(timeout=1)
-    
-    if process.returncode != 0:
+async def run_mafft_add_cached(job_id: str, mafft_options: dict, new_sequences: Path,
+                               existing_alignment: Path, aligned_file: Path, workflow_mode: str,
+                               nearest: Optional[dict] = None):
+    """
+    MAFFT --add --keeplength (modo 2) só para as sequências ainda sem posição
+    no cache; o alinhamento é montado com as linhas do cache e as novas.
+    
+    Args:
+        nearest: Táxons mais próximos de cada sequência (kmer_index); se
+            informado, o MAFFT alinha contra a referência reduzida a esses
+            táxons e o cache não é usado (a referência reduzida depende do lote
+            inteiro, então as linhas não valem para outros jobs)
+    """
+    reference_digest = await asyncio.to_thread(fasta_digest, existing_alignment)
+    context = placement_context(reference_digest, mafft_options)
+    use_cache = nearest is None
+    records = await asyncio.to_thread(lambda: list(read_fasta(new_sequences)))
+    placements = {}
+    if use_cache:
+        placements = await asyncio.to_thread(
+            placement_cache.get_many, context, [sequence_digest(record.sequence) for record in records]
+        )
+    missing = uncached_records(records, placements)
+    reused = sum(sequence_digest(record.sequence) in placements for record in records)
+    job_status.update(job_id, cached_placements=reused)
+    
+    # Referência reduzida: só os táxons mais próximos das sequências a alinhar,
+    # sem as colunas que ficam só com gaps (reinseridas depois em expand_row)
+    mafft_reference = existing_alignment
+    columns = None
+    if nearest is not None and missing:
+        taxa = set().union(*(nearest.get(record.name, []) for record in missing))
+        reduced_file = aligned_file.with_name("reduced_reference.fasta")
+        columns = await asyncio.to_thread(reduced_reference, existing_alignment, taxa, reduced_file)
+        if columns is not None:
+            mafft_reference = reduced_file
+    
+    if len(missing) > MAFFT_ADD_CHUNK_SIZE:
+        added = await run_mafft_add_chunks(job_id, mafft_options, missing, mafft_reference,
+                                           aligned_file.parent)
+    elif missing:
+        uncached_file = aligned_file.with_name("uncached_sequences.fasta")
+        placed_file = aligned_file.with_name("placed.fasta")
+        await asyncio.to_thread(write_fasta, missing, uncached_file)
+        # Sem --reorder: as linhas novas saem no fim, na ordem de entrada
+        async with scheduler.lease(job_id, mafft_options["threads"]) as threads:
+            mafft_cmd = build_mafft_add_command({**mafft_options, "threads": threads, "reorder": False},
+                                                uncached_file, mafft_reference)
+            await run_mafft_with_monitoring(job_id, mafft_cmd, placed_file, workflow_mode)
+        try:
+            added = await asyncio.to_thread(read_added_placements, placed_file, missing)
+        except ValueError as e:
+            raise Exception(f"MAFFT falhou: {e}")
+    else:
+        added = {}
+    if columns is not None:
+        added = {digest: placement._replace(row=expand_row(placement.row, columns))
+                 for digest, placement in added.items()}
+    if use_cache:
+        await asyncio.to_thread(placement_cache.put_many, context, added)
+    placements.update(added)
+    
+    await asyncio.to_thread(assemble_alignment, existing_alignment, records, placements, aligned_file)
+    job_status[job_id] = {"status": "processing", "progress": 60, "step": "alignment_done",
+                          "workflow_mode": workflow_mode, "cached_placements": reused}
+
+
+async def run_mafft_add_chunks(job_id: str, mafft_options: dict, records: list,
+                               existing_alignment: Path, work_dir: Path) -> dict:
+    """
+    MAFFT --add --keeplength para muitas sequências novas: blocos de até
+    MAFFT_ADD_CHUNK_SIZE sequências, cada um alinhado à referência por um
+    processo MAFFT próprio, em paralelo.
+    
+    Com --keeplength cada linha depende só da referência e da própria
+    sequência, então alinhar em blocos dá as mesmas linhas. A aposta é que o
+    tempo de um único --add cresça mais que linearmente com o número de
+    sequências e aproveite pouco as threads extras, mas o ganho ainda não foi
+    medido com o MAFFT real (bench/bench_mafft_chunks.py). As threads
+    concedidas pelo escalonador são repartidas entre os processos.
+    
+    Returns:
+        Posições das sequências (placement_cache), por hash da sequência
+    """
+    chunks = [records[i:i + MAFFT_ADD_CHUNK_SIZE] for i in range(0, len(records), MAFFT_ADD_CHUNK_SIZE)]
+    added = {}
+    
+    async with scheduler.lease(job_id, mafft_options["threads"]) as threads:
+        parallel = min(len(chunks), threads)
+        per_process = max(1, threads // parallel)
+        slots = asyncio.Semaphore(parallel)
+        finished = []
+        
+        async def align_chunk(index: int, chunk: list) -> None:
+            chunk_file = work_dir / f"uncached_{index}.fasta"
+            placed_file = work_dir / f"placed_{index}.fasta"
+            try:
+                async with slots:
+                    await asyncio.to_thread(write_fasta, chunk, chunk_file)
+                    mafft_cmd = build_mafft_add_command(
+                        {**mafft_options, "threads": per_process, "reorder": False}, chunk_file, existing_alignment
+                    )
+                    result = await run_tool(mafft_cmd, stdout_file=placed_file, timeout=ALIGNMENT_TIMEOUT)
+                if result.returncode != 0:
+                    raise Exception("MAFFT falhou")
+                try:
+                    added.update(await asyncio.to_thread(read_added_placements, placed_file, chunk))
+                except ValueError as e:
+                    raise Exception(f"MAFFT falhou: {e}")
+            finally:
+                chunk_file.unlink(missing_ok=True)
+                placed_file.unlink(missing_ok=True)
+            finished.append(index)
+            job_status.update(job_id, status="processing", step="alignment",
+                              progress=20 + 38 * len(added) // len(records),
+                              detail=f"Blocos alinhados ({len(finished)}/{len(chunks)})")
+        
+        tasks = [asyncio.create_task(align_chunk(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Um bloco falhou (ou o job foi cancelado): encerra os demais processos
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    return added
+
+
+async def run_mafft_with_monitoring(job_id: str, mafft_cmd: list, output_file: Path, workflow_mode: str,
+                                    progress_start: int = 20, progress_end: int = 58):
+    """Executa MAFFT com monitoramento de progresso (contadores do stderr)"""
+    # As linhas do stderr chegam no event loop: o progresso é gravado numa
+    # thread (BackgroundPublisher), não dentro do callback
+    async with BackgroundPublisher(
+        lambda fields: job_status.update(job_id, status="processing", step="alignment",
+                                         workflow_mode=workflow_mode, **fields)
+    ) as publish:
+        reporter = ProgressReporter(MafftProgress(), progress_start, progress_end, publish)
+        result = await run_tool(mafft_cmd, stdout_file=output_file,
+                                on_stderr_line=reporter.feed, timeout=ALIGNMENT_TIMEOUT)
+    
+    if result.returncode != 0:
         raise Exception("MAFFT falhou")
     
     job_status[job_id] = {"status": "processing", "progress": 60, "step": "alignment_done", "workflow_mode": workflow_mode}
 
 
 async def build_tree(job_id: str, aligned_file: Path, tree_file: Path, result_dir: Path,
-                     tree_tool: str, bootstrap: int, outgroup: str, workflow_mode: str):
-    """Constrói árvore filogenética com FastTree ou IQ-TREE"""
+                     tree_tool: str, bootstrap: int, workflow_mode: str):
+    """Constrói árvore filogenética com FastTree ou IQ-TREE (o SVG é o estágio seguinte)"""
     
     job_status[job_id] = {"status": "processing", "progress": 60, "step": "tree_building", "workflow_mode": workflow_mode}
     
+    # Sequências idênticas: a ferramenta recebe um representante por grupo e as
+    # duplicatas voltam para a árvore depois, como politomias de ramo zero
+    inference_file = aligned_file
+    duplicates = {}
+    mapping_file = result_dir / "duplicates.json"
+    if COLLAPSE_DUPLICATES:
+        collapsed_file = aligned_file.with_name("collapsed.fasta")
+        duplicates = await asyncio.to_thread(collapse_duplicates, aligned_file, collapsed_file, mapping_file)
+        if duplicates:
+            inference_file = collapsed_file
+            job_status.update(job_id, collapsed_duplicates=sum(len(names) for names in duplicates.values()))
+    else:
+        mapping_file.unlink(missing_ok=True)
+    
     if tree_tool == "fasttree":
-        tree_cmd = ["FastTree", "-nt", str(aligned_file)]
-        with open(tree_file, "w") as out:
-            result = subprocess.run(tree_cmd, stdout=out, stderr=subprocess.PIPE,
-                                   text=True, timeout=7200)
+        tree_cmd = ["FastTree", "-nt", str(inference_file)]
+        # FastTree (build padrão) é single-thread
+        async with scheduler.lease(job_id, 1):
+            result = await run_tool(tree_cmd, stdout_file=tree_file, timeout=TREE_TIMEOUT)
         
         if result.returncode == 0:
-            generate_svg_with_outgroup(tree_file, result_dir, outgroup, aligned_file)
+            await asyncio.to_thread(expand_duplicates, tree_file, duplicates)
         else:
             raise Exception(f"FastTree falhou: {result.stderr}")
             
     elif tree_tool == "iqtree":
-        tree_cmd = [
-            "iqtree", 
-            "-s", str(aligned_file), 
-            "-B", str(bootstrap),
-            "-T", "2",
-            "-pre", str(result_dir / "iqtree")
-        ]
-        
         log_file = result_dir / "iqtree.log"
-        monitor_active = [True]
-        
-        milestones = [
-            ("Generating 1000 samples for ultrafast bootstrap", 65),
-            ("INITIALIZING CANDIDATE TREE SET", 73),
-            ("OPTIMIZING CANDIDATE TREE SET", 81),
-            ("FINALIZING TREE SEARCH", 89),
-            ("Computing bootstrap consensus tree", 95)
-        ]
-        
-        def monitor_iqtree_log():
-            completed_milestones = set()
-            while monitor_active[0]:
-                try:
-                    if log_file.exists():
-                        with open(log_file, 'r') as f:
-                            content = f.read()
-                            for milestone_text, progress in milestones:
-                                if milestone_text not in completed_milestones and milestone_text in content:
-                                    completed_milestones.add(milestone_text)
-                                    job_status[job_id] = {
-                                        "status": "processing",
-                                        "progress": progress,
-                                        "step": "tree_building",
-                                        "workflow_mode": workflow_mode
-                                    }
-                    time.sleep(2)
-                except Exception as e:
-                    print(f"Erro no monitoramento: {e}")
-                    break
-        
-        monitor_thread = threading.Thread(target=monitor_iqtree_log, daemon=True)
-        monitor_thread.start()
         
-        result = subprocess.run(tree_cmd, capture_output=True, text=True, timeout=7200)
+        # Segue o iqtree.log lendo só o que foi acrescentado a cada segundo
+        reporter = ProgressReporter(
+            IqtreeProgress(), 62, 98,
+            lambda fields: job_status.update(job_id, status="processing", step="tree_building",
+                                             workflow_mode=workflow_mode, **fields)
+        )
+        follower = LogFollower(log_file, reporter.feed)
         
-        monitor_active[0] = False
-        monitor_thread.join(timeout=1)
+        async with scheduler.lease(job_id, MAX_THREADS_PER_TOOL) as threads:
+            tree_cmd = [
+                "iqtree", 
+                "-s", str(inference_file), 
+                "-B", str(bootstrap),
+                "-T", str(threads),
+                "-pre", str(result_dir / "iqtree")
+            ]
+            
+            monitor_task = asyncio.create_task(follower.follow())
+            try:
+                result = await run_tool(tree_cmd, timeout=TREE_TIMEOUT)
+            finally:
+                monitor_task.cancel()
+                await asyncio.to_thread(follower.close)
         
         if result.returncode == 0:
             job_status[job_id] = {"status": "processing", "progress": 99, "step": "tree_building", "workflow_mode": workflow_mode}
             shutil.copy(result_dir / "iqtree.contree", tree_file)
-            generate_svg_with_outgroup(tree_file, result_dir, outgroup, aligned_file)
+            await asyncio.to_thread(expand_duplicates, tree_file, duplicates)
         else:
             raise Exception(f"IQ-TREE falhou: {result.stderr}")
 
 
-def generate_svg_with_outgroup(tree_file: Path, result_dir: Path, outgroup: str, 
+async def generate_svg_with_outgroup(tree_file: Path, result_dir: Path, outgroup: str, 
                                 alignment_file: Path = None, width: int = None, height: int = None):
-    """Gera SVG da árvore passando o outgroup para tree_set_cli.py"""
+    """Gera SVG da árvore (com itálico/negrito) no pool de renderização"""
     try:
-        svg_script = Path(__file__).parent / "tree_set_svg_edit" / "tree_set_cli.py"
-        
-        # Montar argumentos: tree_file, output_dir, outgroup, [alignment_file], [width], [height]
-        svg_args = [sys.executable, str(svg_script), str(tree_file), str(result_dir), outgroup]
-        
-        # alignment_file (pode ser None, mas precisamos passar algo se width/height forem especificados)
-        if alignment_file:
-            svg_args.append(str(alignment_file))
-        elif width is not None or height is not None:
-            # Passar string vazia ou placeholder se não há alignment mas há width/height
-            svg_args.append("")
-        
-        # Adicionar width e height se especificados
-        if width is not None or height is not None:
-            svg_args.append(str(width) if width is not None else "")
-            svg_args.append(str(height) if height is not None else "")
-        
-        svg_result = subprocess.run(
-            svg_args,
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-        if svg_result.returncode != 0:
-            print(f"Aviso: Falha ao gerar SVG: {svg_result.stderr}")
-        else:
-            # Processar SVG com svg_edit (italics/bold)
-            svg_edit_script = Path(__file__).parent / "tree_set_svg_edit" / "svg_edit_cli.py"
-            input_svg = result_dir / "supportvalue.svg"
-            output_svg = result_dir / "supportvalue_output.svg"
-            
-            edit_result = subprocess.run(
-                [sys.executable, str(svg_edit_script), str(input_svg), str(output_svg)],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            if edit_result.returncode != 0:
-                print(f"Aviso: Falha ao processar SVG: {edit_result.stderr}")
+        svg_path = await render_service.render_svg(tree_file, result_dir, outgroup, alignment_file, width, height)
+        # Versões gzip/brotli prontas antes da primeira visualização
+        await asyncio.to_thread(precompress, svg_path)
     except Exception as e:
-        print(f"Aviso: Erro ao gerar/processar SVG: {e}")
+        print(f"Aviso: Erro ao gerar/processar SVG: {e!r}")
 
 if __name__ == "__main__":
     import uvicorn
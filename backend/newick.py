@@ -0,0 +1,430 @@
+"""
+Leitura de árvores Newick/NEXUS em arrays (sem ete3/toytree).
+
+Um único leitor para todas as árvores do sistema: tree.tre do FastTree,
+iqtree.contree do IQ-TREE e árvores enviadas pelo usuário no modo 4 (Newick
+ou NEXUS, com bloco translate, rótulos entre aspas e comentários [...]).
+
+A árvore vira um ArrayTree: nós em pré-ordem (o pai sempre antes dos
+filhos), com arrays de pai, comprimento de ramo e suporte, e os filhos de
+cada nó disponíveis em formato CSR. O enraizamento pelo outgroup e a
+ladderização também trabalham direto nesses arrays.
+"""
+import re
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Tokens de Newick: comentário [..], rótulo entre aspas, pontuação, texto livre
+_NEWICK_TOKEN = re.compile(r"\[[^\]]*\]|'(?:[^']|'')*'|[(),:;]|[^\s(),:;\[\]']+|\s+")
+
+# Comprimento usado quando o ramo não tem valor (mesmo padrão do ete3)
+DEFAULT_BRANCH_LENGTH = 1.0
+
+_NEXUS_TREES = re.compile(r"\bbegin\s+trees\s*;", re.IGNORECASE)
+_NEXUS_TRANSLATE = re.compile(r"\btranslate\b(.*?);", re.IGNORECASE | re.DOTALL)
+_NEXUS_TREE = re.compile(r"\b(?:u?tree)\s+[^=;]*=", re.IGNORECASE)
+
+
+class NewickError(ValueError):
+    """Texto que não é uma árvore Newick/NEXUS válida."""
+
+
+def tokenize_newick(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Divide um Newick em tokens (tipo, texto).
+
+    Tipos: "punct" para ( ) , : ;, "label" para rótulos/números, "comment"
+    para [..] e "space" para espaços. Concatenar os textos devolve a entrada.
+    """
+    for match in _NEWICK_TOKEN.finditer(text):
+        token = match.group(0)
+        if token in "(),:;":
+            yield "punct", token
+        elif token.startswith("["):
+            yield "comment", token
+        elif token.isspace():
+            yield "space", token
+        else:
+            yield "label", token
+
+
+def unquote(label: str) -> str:
+    if label.startswith("'") and label.endswith("'"):
+        return label[1:-1].replace("''", "'")
+    return label
+
+
+def quote(name: str) -> str:
+    if re.search(r"[\s(),:;\[\]']", name):
+        return "'" + name.replace("'", "''") + "'"
+    return name
+
+
+def _support_value(label: str) -> Optional[float]:
+    """
+    Suporte de um rótulo de nó interno: "95", "0.87" ou, no formato
+    SH-aLRT/UFBoot do IQ-TREE, "80.5/95" (vale o último valor).
+    """
+    try:
+        return float(label.rsplit("/", 1)[-1])
+    except ValueError:
+        return None
+
+
+class ArrayTree:
+    """
+    Árvore em pré-ordem.
+
+    Args:
+        names: Nome de cada nó ('' para nós internos sem nome)
+        parent: Índice do pai (-1 na raiz); o pai sempre vem antes do filho
+        branch: Comprimento do ramo até o pai (0 na raiz)
+        support: Suporte do nó (NaN se ausente)
+    """
+
+    def __init__(self, names: List[str], parent: np.ndarray, branch: np.ndarray, support: np.ndarray):
+        self.names = list(names)
+        self.parent = np.asarray(parent, dtype=np.int32)
+        self.branch = np.nan_to_num(np.asarray(branch, dtype=np.float64))
+        self.support = np.asarray(support, dtype=np.float64)
+        self.is_tip = np.ones(len(self.names), dtype=bool)
+        self.is_tip[self.parent[self.parent >= 0]] = False
+        self._child_ptr = None
+        self._child_index = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_tips(self) -> int:
+        return int(self.is_tip.sum())
+
+    def tip_labels(self) -> List[str]:
+        return [self.names[node] for node in np.flatnonzero(self.is_tip)]
+
+    def _build_children(self) -> None:
+        # CSR: filhos de i em child_index[child_ptr[i]:child_ptr[i + 1]],
+        # na ordem original (pré-ordem garante a ordem crescente)
+        children = np.arange(1, self.n_nodes, dtype=np.int32)
+        parents = self.parent[1:]
+        order = np.argsort(parents, kind="stable")
+        self._child_index = children[order]
+        counts = np.bincount(parents, minlength=self.n_nodes)
+        self._child_ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def children(self, node: int) -> np.ndarray:
+        if self._child_ptr is None:
+            self._build_children()
+        return self._child_index[self._child_ptr[node]:self._child_ptr[node + 1]]
+
+    def children_lists(self) -> List[List[int]]:
+        """Filhos de cada nó como listas Python (para percursos em laço)."""
+        children: List[List[int]] = [[] for _ in range(self.n_nodes)]
+        for child, up in enumerate(self.parent.tolist()[1:], 1):
+            children[up].append(child)
+        return children
+
+    def root_distances(self) -> np.ndarray:
+        """Distância de cada nó até a raiz (soma dos ramos)."""
+        return _ancestor_sums(self.parent, self.branch)
+
+    def clade_ends(self) -> np.ndarray:
+        """
+        Fim (exclusivo) do clado de cada nó: em pré-ordem o clado de i é
+        i .. clade_ends()[i] - 1.
+
+        O clado termina onde começa o próximo irmão; o último filho termina
+        junto com o pai. Isso é resolvido com saltos de ponteiro (O(n log
+        profundidade) em NumPy), sem recursão, então árvores desbalanceadas
+        não degradam.
+        """
+        n = self.n_nodes
+        if self._child_ptr is None:
+            self._build_children()
+        ordered = self._child_index
+        end = np.full(n, -1, dtype=np.int64)
+        end[0] = n
+        # Filhos que têm um irmão depois deles
+        same_parent = self.parent[ordered[:-1]] == self.parent[ordered[1:]]
+        end[ordered[:-1][same_parent]] = ordered[1:][same_parent]
+        # Últimos filhos: herdam o fim do pai
+        pointer = np.where(end < 0, self.parent, -1).astype(np.int64)
+        pending = np.flatnonzero(pointer >= 0)
+        while len(pending):
+            target = pointer[pending]
+            resolved = end[target] >= 0
+            end[pending[resolved]] = end[target[resolved]]
+            pointer[pending[~resolved]] = pointer[target[~resolved]]
+            pending = pending[~resolved]
+        return end
+
+    def tip_counts(self) -> np.ndarray:
+        """Número de tips no clado de cada nó."""
+        tips_before = np.concatenate(([0], np.cumsum(self.is_tip)))
+        return tips_before[self.clade_ends()] - tips_before[:-1]
+
+    def mrca(self, nodes: List[int]) -> int:
+        """Ancestral comum mais recente dos nós dados."""
+        marked = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        marked[np.asarray(nodes) + 1] = 1
+        marked_before = np.cumsum(marked)
+        inside = marked_before[self.clade_ends()] - marked_before[:-1]
+        # Os nós que contêm todos formam um caminho a partir da raiz; em
+        # pré-ordem o mais profundo é o de maior índice
+        return int(np.flatnonzero(inside >= len(set(nodes)))[-1])
+
+
+def _ancestor_sums(parent: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Soma de ``values`` no caminho de cada nó até a raiz (o próprio nó
+    incluído), por saltos de ponteiro: log2(profundidade) passadas em NumPy.
+    """
+    total = np.asarray(values, dtype=np.float64).copy()
+    total[parent < 0] = 0.0
+    pointer = parent.astype(np.int64)
+    pending = np.flatnonzero(pointer >= 0)
+    while len(pending):
+        target = pointer[pending]
+        total[pending] += total[target]
+        pointer[pending] = pointer[target]
+        pending = pending[pointer[pending] >= 0]
+    return total
+
+
+def _preorder(root: int, children: List[List[int]], names: List[str], branch: np.ndarray,
+              support: np.ndarray) -> ArrayTree:
+    """Monta um ArrayTree a partir de listas de filhos (renumera em pré-ordem)."""
+    order = []
+    new_parent = []
+    stack = [(root, -1)]
+    while stack:
+        node, up = stack.pop()
+        order.append(node)
+        new_parent.append(up)
+        position = len(order) - 1
+        # Empilha ao contrário para visitar os filhos na ordem da lista
+        for child in reversed(children[node]):
+            stack.append((child, position))
+    return ArrayTree(
+        [names[node] for node in order],
+        np.array(new_parent, dtype=np.int32),
+        np.asarray(branch)[order],
+        np.asarray(support)[order],
+    )
+
+
+# ----------------------------------------------------------------------
+# Leitura
+# ----------------------------------------------------------------------
+def parse_newick(text: str) -> ArrayTree:
+    """
+    Lê a primeira árvore de um texto Newick.
+
+    Rótulos numéricos de nós internos viram suporte; os demais, nome.
+
+    Raises:
+        NewickError: parênteses desbalanceados, comprimento inválido, árvore vazia
+    """
+    names: List[str] = [""]
+    parent: List[int] = [-1]
+    branch: List[float] = [np.nan]
+    stack: List[int] = []
+    current = 0
+    expect_length = False
+    finished = False
+
+    for kind, token in tokenize_newick(text):
+        if kind in ("space", "comment"):
+            continue
+        if kind == "label":
+            if expect_length:
+                try:
+                    branch[current] = float(token)
+                except ValueError:
+                    raise NewickError(f"Comprimento de ramo inválido: '{token}'")
+                expect_length = False
+            else:
+                names[current] = unquote(token)
+            continue
+
+        expect_length = False
+        if token == "(":
+            stack.append(current)
+            current = len(names)
+            names.append("")
+            parent.append(stack[-1])
+            branch.append(np.nan)
+        elif token == ",":
+            if not stack:
+                raise NewickError("',' fora de parênteses")
+            current = len(names)
+            names.append("")
+            parent.append(stack[-1])
+            branch.append(np.nan)
+        elif token == ")":
+            if not stack:
+                raise NewickError("')' sem '(' correspondente")
+            current = stack.pop()
+        elif token == ":":
+            expect_length = True
+        elif token == ";":
+            finished = True
+            break
+
+    if stack:
+        raise NewickError("Parênteses desbalanceados")
+    if len(names) < 2 and not finished:
+        raise NewickError("Nenhuma árvore encontrada")
+
+    parent_array = np.array(parent, dtype=np.int32)
+    is_tip = np.ones(len(names), dtype=bool)
+    is_tip[parent_array[parent_array >= 0]] = False
+    support = np.full(len(names), np.nan)
+    for node in np.flatnonzero(~is_tip):
+        value = _support_value(names[node]) if names[node] else None
+        if value is not None:
+            support[node] = value
+            names[node] = ""
+
+    lengths = np.array(branch, dtype=np.float64)
+    lengths[np.isnan(lengths)] = DEFAULT_BRANCH_LENGTH
+    lengths[0] = 0.0
+    return ArrayTree(names, parent_array, lengths, support)
+
+
+def parse_nexus(text: str) -> ArrayTree:
+    """
+    Lê a primeira árvore do bloco TREES de um NEXUS, aplicando o translate.
+
+    Raises:
+        NewickError: sem bloco TREES ou sem comando tree
+    """
+    block = _NEXUS_TREES.search(text)
+    if not block:
+        raise NewickError("Arquivo NEXUS sem bloco TREES")
+    body = text[block.end():]
+
+    translate = {}
+    statement = _NEXUS_TREE.search(body)
+    if not statement:
+        raise NewickError("Bloco TREES sem comando tree")
+    table = _NEXUS_TRANSLATE.search(body, 0, statement.start())
+    if table:
+        labels = [unquote(token) for kind, token in tokenize_newick(table.group(1)) if kind == "label"]
+        translate = dict(zip(labels[0::2], labels[1::2]))
+
+    tree = parse_newick(body[statement.end():])
+    if translate:
+        for node in np.flatnonzero(tree.is_tip):
+            tree.names[node] = translate.get(tree.names[node], tree.names[node])
+    return tree
+
+
+def read_tree(source: Union[str, Path]) -> ArrayTree:
+    """Lê um arquivo de árvore (Newick ou NEXUS, detectado pelo conteúdo)."""
+    text = Path(source).read_text(encoding="utf-8-sig", errors="replace")
+    if text.lstrip()[:6].upper() == "#NEXUS":
+        return parse_nexus(text)
+    return parse_newick(text)
+
+
+# ----------------------------------------------------------------------
+# Enraizamento e ladderização
+# ----------------------------------------------------------------------
+def reroot(tree: ArrayTree, node: int) -> ArrayTree:
+    """
+    Enraíza no meio do ramo acima de ``node``.
+
+    Os ramos no caminho até a raiz antiga são invertidos, levando junto o
+    comprimento e o suporte (que pertencem ao ramo, não ao nó). Se a raiz
+    antiga ficar com um só filho, ela é removida e os dois ramos somados.
+    """
+    parent = tree.parent
+    if node == 0:
+        return tree
+    if parent[node] == 0 and len(tree.children(0)) == 2:
+        # Já está enraizada nesse ramo
+        return tree
+
+    n = tree.n_nodes
+    names = tree.names + [""]
+    branch = tree.branch.tolist() + [0.0]
+    support = tree.support.tolist() + [np.nan]
+    old_children = tree.children_lists()
+    old_parents = parent.tolist()
+    children: List[List[int]] = [[] for _ in range(n + 1)]
+    new_branch = branch[:]
+    new_support = support[:]
+
+    root = n
+    up = old_parents[node]
+    # Nó que passa a ter a raiz antiga como filho
+    holder = root if up == 0 else None
+    half = branch[node] / 2
+    children[root] = [node, up]
+    new_branch[node] = new_branch[up] = half
+    new_support[up] = support[node]
+
+    # Percorre a árvore a partir da nova raiz, invertendo os ramos do caminho
+    stack = [(node, up), (up, node)]
+    while stack:
+        current, came_from = stack.pop()
+        for child in old_children[current]:
+            if child != came_from:
+                children[current].append(child)
+                stack.append((child, current))
+        old_parent = old_parents[current]
+        if old_parent >= 0 and old_parent != came_from:
+            children[current].append(old_parent)
+            if old_parent == 0:
+                holder = current
+            new_branch[old_parent] = branch[current]
+            new_support[old_parent] = support[current]
+            stack.append((old_parent, current))
+
+    # Raiz antiga com um único filho: junta os dois ramos
+    if len(children[0]) == 1 and children[0][0] != root:
+        only = children[0][0]
+        children[holder][children[holder].index(0)] = only
+        new_branch[only] += new_branch[0]
+        if not np.isnan(new_support[0]):
+            new_support[only] = new_support[0]
+
+    return _preorder(root, children, names, new_branch, new_support)
+
+
+def root_on_outgroup(tree: ArrayTree, outgroup: str) -> Tuple[ArrayTree, int]:
+    """
+    Enraíza pelo outgroup: ramo acima do MRCA das tips cujo nome contém
+    ``outgroup`` (sem diferenciar maiúsculas).
+
+    Para o MRCA não cair na raiz de uma árvore não enraizada (outgroup
+    espalhado entre os filhos da raiz), a árvore é antes enraizada em uma
+    tip do ingroup.
+
+    Returns:
+        (árvore, número de tips encontradas); sem tips encontradas a árvore
+        volta como está
+    """
+    query = outgroup.lower()
+    tips = np.flatnonzero(tree.is_tip)
+    matched = [int(node) for node in tips if query in tree.names[node].lower()]
+    if not matched or len(matched) == len(tips):
+        return tree, len(matched)
+
+    matched_names = {tree.names[node] for node in matched}
+    anchor = next(int(node) for node in tips if int(node) not in set(matched))
+    anchored = reroot(tree, anchor)
+    targets = [int(node) for node in np.flatnonzero(anchored.is_tip) if anchored.names[node] in matched_names]
+    return reroot(anchored, anchored.mrca(targets)), len(matched)
+
+
+def ladderize(tree: ArrayTree) -> ArrayTree:
+    """Ordena os filhos de cada nó do clado menor para o maior (ordem estável, como no toytree)."""
+    counts = tree.tip_counts().tolist()
+    children = [sorted(kids, key=counts.__getitem__) if len(kids) > 1 else kids
+                for kids in tree.children_lists()]
+    return _preorder(0, children, tree.names, tree.branch, tree.support)
@@ -0,0 +1,124 @@
+"""
+Estágios do pipeline de análise e reaproveitamento entre execuções do job.
+
+A análise é uma cadeia de estágios com entradas e saídas em arquivo:
+
+    merge (modo 3) -> align (modos 2 e 3) -> trim (modo 3) -> infer -> render
+
+Ao concluir um estágio, grava-se em ``stages.json`` (na pasta de uploads do
+job) a impressão digital dele (hash do conteúdo de cada entrada mais os
+parâmetros que alteram o resultado) e o hash de cada saída. Numa nova
+análise do mesmo job, o estágio cuja impressão digital não mudou e cujas
+saídas continuam no disco, intactas, é pulado.
+
+As saídas de um estágio são as entradas do seguinte, então trocar só a
+ferramenta de árvore refaz infer e render e reaproveita o alinhamento (MAFFT
+e curadoria, as etapas longas dos modos 2 e 3). E um estágio refeito que
+gera a mesma saída não invalida os seguintes.
+
+Diferente do result_cache (análise inteira, entre jobs), aqui o registro é
+por job e por estágio.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+
+STAGES_FILE = "stages.json"
+
+# Tamanho dos blocos lidos ao calcular o hash
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+class StageLedger:
+    """
+    Registro dos estágios concluídos de um job.
+
+    O hash de cada arquivo fica guardado junto com tamanho e mtime: o arquivo
+    só é lido de novo quando muda.
+
+    Args:
+        job_dir: Pasta de uploads do job (onde fica stages.json)
+    """
+
+    def __init__(self, job_dir: Path):
+        self.path = Path(job_dir) / STAGES_FILE
+        # Estágios pulados nesta execução, em ordem
+        self.reused: List[str] = []
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        if not isinstance(data, dict):
+            # stages.json corrompido: trata como vazio (tudo é refeito)
+            data = {}
+        self._stages = data.get("stages", {})
+        self._files = data.get("files", {})
+
+    def file_digest(self, path: Path) -> Optional[str]:
+        """Hash SHA-256 do conteúdo, ou None se o arquivo não existe."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        known = self._files.get(str(path))
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        self._files[str(path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest(),
+        }
+        return digest.hexdigest()
+
+    def fingerprint(self, stage: str, inputs: List[Path], params: dict) -> str:
+        """Impressão digital do estágio: conteúdo das entradas + parâmetros."""
+        payload = {
+            "stage": stage,
+            "params": params,
+            "inputs": [[path.name, self.file_digest(path)] for path in inputs],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def is_current(self, stage: str, fingerprint: str, outputs: List[Path]) -> bool:
+        """True se o estágio já rodou com essa impressão digital e as saídas estão intactas."""
+        record = self._stages.get(stage)
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        if set(record["outputs"]) != {path.name for path in outputs}:
+            return False
+        for path in outputs:
+            digest = self.file_digest(path)
+            if digest is None or digest != record["outputs"][path.name]:
+                return False
+        return True
+
+    def reuse(self, stage: str, fingerprint: str, outputs: List[Path]) -> bool:
+        """Como is_current, anotando o estágio em ``reused`` quando pode ser pulado."""
+        if not self.is_current(stage, fingerprint, outputs):
+            return False
+        self.reused.append(stage)
+        return True
+
+    def record(self, stage: str, fingerprint: str, outputs: List[Path]) -> None:
+        """Registra um estágio concluído (saídas ausentes nunca contam como atuais)."""
+        self._stages[stage] = {
+            "fingerprint": fingerprint,
+            "outputs": {path.name: self.file_digest(path) for path in outputs},
+        }
+        self.save()
+
+    def save(self) -> None:
+        # Grava em arquivo temporário e renomeia: nunca fica um stages.json pela metade
+        temp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        try:
+            temp.write_text(json.dumps({"stages": self._stages, "files": self._files}, indent=2))
+            os.replace(temp, self.path)
+        except OSError as e:
+            print(f"Aviso: falha ao gravar {self.path}: {e}")
+            temp.unlink(missing_ok=True)
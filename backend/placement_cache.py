@@ -0,0 +1,184 @@
+"""
+Cache por sequência das posições do MAFFT --add --keeplength (modo 2).
+
+Com --keeplength as colunas do alinhamento de referência não mudam (inserções
+das sequências novas são descartadas), então a linha alinhada de cada
+sequência nova depende só da referência, da própria sequência e das opções
+do MAFFT. A maioria dos jobs do modo 2 adiciona poucas sequências ao mesmo
+default_alignment.fasta, e quem volta costuma reenviar boa parte das mesmas
+amostras: essas linhas ficam guardadas aqui e só as sequências ainda não
+vistas vão para o MAFFT.
+
+Chave: (contexto, hash da sequência). O contexto é o hash da referência
+normalizada (result_cache.fasta_digest) com as opções do MAFFT. O valor é a
+linha alinhada e se o --adjustdirection inverteu a sequência (prefixo _R_
+no nome de saída).
+
+O alinhamento final é montado com as linhas da referência, na ordem do
+arquivo, seguidas das sequências novas na ordem do upload, como sai do
+MAFFT --add sem --reorder. Esse é o mesmo resultado com ou sem acertos no
+cache.
+
+O cache é um SQLite compartilhado entre jobs e workers, limitado a
+PLACEMENT_CACHE_MAX_ROWS linhas (remoção das menos usadas).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from fasta_io import FastaRecord, read_fasta, write_fasta
+
+PLACEMENT_CACHE_MAX_ROWS = int(os.getenv("PLACEMENT_CACHE_MAX_ROWS", "200000"))
+
+# Prefixo do MAFFT (--adjustdirection) para sequências usadas invertidas
+REVERSED_PREFIX = "_R_"
+
+# Opções que não alteram as linhas alinhadas (não entram no contexto)
+IGNORED_OPTIONS = {"threads", "reorder"}
+
+
+class Placement(NamedTuple):
+    row: str            # linha alinhada (comprimento da referência)
+    reversed: bool      # usada como complemento reverso (_R_)
+
+
+def placement_context(reference_digest: str, mafft_options: dict) -> str:
+    """Contexto das posições: referência + opções do MAFFT que afetam o resultado."""
+    payload = {
+        "reference": reference_digest,
+        "mafft_options": {k: v for k, v in sorted(mafft_options.items()) if k not in IGNORED_OPTIONS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def sequence_digest(sequence: str) -> str:
+    return hashlib.sha256(sequence.encode()).hexdigest()
+
+
+class PlacementCache:
+    """
+    Linhas alinhadas por (contexto, hash da sequência), em SQLite.
+
+    Uma conexão por thread (as chamadas vêm de asyncio.to_thread).
+
+    Args:
+        path: Arquivo SQLite
+        max_rows: Linhas mantidas antes da remoção LRU
+    """
+
+    def __init__(self, path: Path, max_rows: int = PLACEMENT_CACHE_MAX_ROWS):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS placements ("
+                " context TEXT NOT NULL,"
+                " sequence TEXT NOT NULL,"
+                " row TEXT NOT NULL,"
+                " reversed INTEGER NOT NULL,"
+                " used_at REAL NOT NULL,"
+                " PRIMARY KEY (context, sequence))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS placements_used ON placements (used_at)")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, context: str, digests: List[str]) -> Dict[str, Placement]:
+        """Posições já conhecidas entre ``digests`` (e marca o uso para o LRU)."""
+        found = {}
+        try:
+            db = self._db()
+            for digest in digests:
+                row = db.execute(
+                    "SELECT row, reversed FROM placements WHERE context = ? AND sequence = ?",
+                    (context, digest),
+                ).fetchone()
+                if row is not None:
+                    found[digest] = Placement(row[0], bool(row[1]))
+            if found:
+                db.executemany(
+                    "UPDATE placements SET used_at = ? WHERE context = ? AND sequence = ?",
+                    [(time.time(), context, digest) for digest in found],
+                )
+        except sqlite3.Error as e:
+            print(f"Aviso: cache de posições indisponível: {e}")
+        return found
+
+    def put_many(self, context: str, placements: Dict[str, Placement]) -> None:
+        """Guarda posições novas e aplica o limite de linhas."""
+        if not placements:
+            return
+        now = time.time()
+        try:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO placements (context, sequence, row, reversed, used_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(context, digest, p.row, int(p.reversed), now) for digest, p in placements.items()],
+            )
+            db.execute(
+                "DELETE FROM placements WHERE rowid IN ("
+                " SELECT rowid FROM placements ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+        except sqlite3.Error as e:
+            print(f"Aviso: falha ao gravar cache de posições: {e}")
+
+
+def uncached_records(records: List[FastaRecord], cached: Dict[str, Placement]) -> List[FastaRecord]:
+    """Sequências a enviar ao MAFFT: sem posição no cache, uma por conteúdo."""
+    missing = {}
+    for record in records:
+        digest = sequence_digest(record.sequence)
+        if digest not in cached and digest not in missing:
+            missing[digest] = record
+    return list(missing.values())
+
+
+def read_added_placements(mafft_output: Path, added: List[FastaRecord]) -> Dict[str, Placement]:
+    """
+    Posições das sequências adicionadas, lidas da saída do MAFFT --add sem
+    --reorder (referência primeiro, depois as novas na ordem de entrada).
+    """
+    # Só as últimas len(added) linhas interessam: a referência não fica em memória
+    output = deque(read_fasta(mafft_output), maxlen=len(added))
+    if len(output) < len(added):
+        raise ValueError("saída do MAFFT com menos sequências que a entrada")
+    placements = {}
+    for record, aligned in zip(added, output):
+        if aligned.name not in (record.name, REVERSED_PREFIX + record.name):
+            raise ValueError(f"saída do MAFFT fora de ordem: esperado '{record.name}', veio '{aligned.name}'")
+        placements[sequence_digest(record.sequence)] = Placement(
+            aligned.sequence, aligned.name != record.name
+        )
+    return placements
+
+
+def assemble_alignment(reference: Path, records: List[FastaRecord],
+                       placements: Dict[str, Placement], output: Path) -> None:
+    """Grava a referência seguida das linhas das sequências novas."""
+    def added():
+        for record in records:
+            placement = placements[sequence_digest(record.sequence)]
+            name = REVERSED_PREFIX + record.name if placement.reversed else record.name
+            yield FastaRecord(name, placement.row)
+
+    def rows():
+        yield from read_fasta(reference)
+        yield from added()
+
+    write_fasta(rows(), output)
+
@@ -0,0 +1,156 @@
+"""
+Serviço de renderização de SVG com processos "quentes".
+
+Antes cada renderização iniciava dois interpretadores Python novos
+(tree_set_cli.py e svg_edit_cli.py), que reimportavam os módulos de desenho
+a cada job e a cada clique em re-renderizar. Aqui um pool de processos importa
+esses módulos uma única vez (no initializer) e executa generate_tree_svg
+diretamente. Os scripts CLI continuam funcionando isoladamente para uso manual.
+
+A árvore é lida pelo leitor Newick/NEXUS próprio (newick.py) direto em
+arrays, sem passar por ete3/toytree nem gravar arquivos temporários, e os
+nomes saem formatados já na escrita (label_format.py): não há mais uma
+segunda passada do svg_edit_cli sobre um supportvalue.svg intermediário.
+
+O layout enraizado de cada job (com a formatação dos nomes) fica salvo em
+layout.npz e em um LRU dentro de cada worker, então re-renderizar com outras
+dimensões não reprocessa a árvore: só reescala e reescreve o SVG.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_TIMEOUT = int(os.getenv("RENDER_TIMEOUT", "180"))
+
+SCRIPTS_DIR = Path(__file__).parent / "tree_set_svg_edit"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _init_worker() -> None:
+    """Roda uma vez por processo do pool: importa os módulos de desenho."""
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    import tree_set_cli  # noqa: F401 (newick, tree_layout, numpy)
+    import label_format  # noqa: F401
+    import tree_lod  # noqa: F401
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _render(tree_file: str, result_dir: str, outgroup: str, alignment_file: Optional[str],
+            width: Optional[int], height: Optional[int]) -> str:
+    """
+    Executado dentro do worker: gera o SVG final (nomes em itálico/negrito já
+    na escrita) a partir do layout, que fica em cache no worker.
+    """
+    import tree_set_cli
+
+    return tree_set_cli.generate_tree_svg(tree_file, result_dir, outgroup, alignment_file, width, height)
+
+
+def _view(tree_file: str, result_dir: str, outgroup: str, view: str, params: dict):
+    """Executado dentro do worker: visualização LOD a partir do layout salvo."""
+    import tree_set_cli
+    import tree_lod
+
+    layout = tree_set_cli.get_layout(tree_file, result_dir, outgroup)
+    if view == "summary":
+        return tree_lod.summary(layout)
+    if view == "overview":
+        return tree_lod.render_overview(layout, **params)
+    if view == "window":
+        return tree_lod.render_window(layout, **params)
+    if view == "subtree":
+        return tree_lod.render_subtree(layout, **params)
+    raise ValueError(f"Visualização desconhecida: {view}")
+
+
+def _create_executor() -> ProcessPoolExecutor:
+    # spawn: os workers não herdam o event loop, conexões SQLite e threads da API
+    return ProcessPoolExecutor(
+        max_workers=RENDER_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def start() -> None:
+    """Cria o pool e aquece os workers (chamado no startup da API)."""
+    global _executor
+    if _executor is None:
+        _executor = _create_executor()
+        for _ in range(RENDER_WORKERS):
+            _executor.submit(_warm_up)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run(task):
+    start()
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_executor, task), RENDER_TIMEOUT)
+    except BrokenProcessPool:
+        # Um worker morreu (ex.: falta de memória): recria o pool para os próximos jobs
+        shutdown()
+        raise
+
+
+async def render_svg(tree_file: Path, result_dir: Path, outgroup: str,
+                     alignment_file: Optional[Path] = None,
+                     width: Optional[int] = None, height: Optional[int] = None) -> Path:
+    """
+    Renderiza supportvalue_output.svg em um worker do pool.
+
+    Raises:
+        asyncio.TimeoutError: se a renderização exceder RENDER_TIMEOUT
+        Exception: erros de renderização do worker são repassados
+    """
+    task = partial(
+        _render, str(tree_file), str(result_dir), outgroup,
+        str(alignment_file) if alignment_file else None, width, height
+    )
+    return Path(await _run(task))
+
+
+async def render_view(tree_file: Path, result_dir: Path, outgroup: str, view: str, **params):
+    """
+    Visualização por nível de detalhe (summary, overview, window ou subtree).
+
+    Returns:
+        SVG (str) ou, para "summary", o dicionário com o tamanho da árvore
+
+    Raises:
+        ValueError: parâmetros inválidos (janela fora da árvore, nó inexistente...)
+    """
+    return await _run(partial(_view, str(tree_file), str(result_dir), outgroup, view, params))
+
+
+def labels_complete(result_dir: Path) -> bool:
+    """
+    False se o layout de result_dir foi desenhado com alguma consulta de gênero
+    sem resposta (nomes ainda sem itálico, refeitos na próxima renderização).
+    """
+    try:
+        with np.load(Path(result_dir) / "layout.npz", allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+    except (OSError, KeyError, ValueError):
+        return True
+    return not meta.get("genus_lookup_failed")
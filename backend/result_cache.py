@@ -0,0 +1,220 @@
+"""
+Cache de resultados de análises completas, endereçado por conteúdo.
+
+A chave é um hash das entradas normalizadas (registros FASTA sem quebras de
+linha/espaços), do modo de workflow, do outgroup, dos parâmetros das
+ferramentas e das configurações do servidor que mudam o resultado
+(COLLAPSE_DUPLICATES, TRIMMER...). Cada entrada guarda os artefatos finais
+(aligned.fasta, tree.tre, SVGs e subprodutos do IQ-TREE); um acerto copia
+esses arquivos para o job e o conclui na hora. Só análises completas entram:
+um job cuja renderização falhou (sem SVG) ou cujos nomes ficaram sem a
+verificação de gênero (IndexFungorum fora do ar) não é guardado.
+
+Submissões idênticas simultâneas compartilham uma única execução: a primeira
+vira "líder" e as demais aguardam o resultado dela. Esse controle fica em
+memória, então só vale dentro de um mesmo worker do uvicorn. O tamanho total é
+limitado por RESULT_CACHE_MAX_MB, com remoção LRU.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fasta_io import read_fasta
+
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+
+# Entradas usadas por cada modo de workflow (arquivos em uploads/<job_id>)
+MODE_INPUTS = {
+    "1": ["aligned.fasta"],
+    "2": ["existing_alignment.fasta", "new_sequences.fasta"],
+    "3": ["raw_matrix.fasta", "user_sequences.fasta"],
+}
+
+# Artefatos guardados no cache (uploads/<job_id> e results/<job_id>). O
+# layout.npz fica de fora: os nomes formatados dependem das consultas ao
+# IndexFungorum e ele é refeito a partir de tree.tre na primeira renderização
+UPLOAD_ARTIFACTS = ["aligned.fasta"]
+RESULT_ARTIFACTS = ["tree.tre", "supportvalue_output.svg", "iqtree.*", "duplicates.json"]
+
+# Opções que não alteram o resultado (não entram na chave)
+IGNORED_OPTIONS = {"threads"}
+
+
+def fasta_digest(path: Path) -> str:
+    """
+    Hash SHA-256 de um FASTA normalizado, lido em streaming.
+
+    Quebras de linha (incluindo CRLF), linhas vazias, espaços nas pontas e
+    compressão gzip não alteram o hash, então o mesmo conjunto de sequências
+    formatado de outro jeito gera a mesma chave.
+    """
+    digest = hashlib.sha256()
+    for record in read_fasta(path, strict=False):
+        digest.update(f"\n>{record.name}\n".encode())
+        digest.update(record.sequence.encode())
+    return digest.hexdigest()
+
+
+def analysis_key(job_dir: Path, workflow_mode: str, outgroup: str, tree_tool: str,
+                 bootstrap: int, mafft_options: dict, digests: Optional[dict] = None,
+                 settings: Optional[dict] = None) -> Optional[str]:
+    """
+    Calcula a chave de cache de uma análise.
+
+    Args:
+        digests: Hashes já calculados no upload (nome do arquivo -> hash);
+            arquivos sem hash conhecido são lidos aqui
+        settings: Configurações do servidor que alteram o resultado
+            (COLLAPSE_DUPLICATES, TRIMMER...)
+
+    Returns:
+        Hash hexadecimal, ou None se o modo não é cacheável
+    """
+    if workflow_mode not in MODE_INPUTS:
+        return None
+
+    inputs = {}
+    for name in MODE_INPUTS[workflow_mode]:
+        path = job_dir / name
+        if digests and digests.get(name):
+            inputs[name] = digests[name]
+        else:
+            inputs[name] = fasta_digest(path) if path.exists() else None
+
+    payload = {
+        "workflow_mode": workflow_mode,
+        "outgroup": outgroup,
+        "tree_tool": tree_tool,
+        "bootstrap": bootstrap if tree_tool == "iqtree" else None,
+        "mafft_options": {k: v for k, v in sorted(mafft_options.items()) if k not in IGNORED_OPTIONS},
+        "inputs": inputs,
+        "settings": settings or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache LRU de artefatos de análises em disco.
+
+    Args:
+        root: Diretório das entradas (uma subpasta por chave)
+        max_bytes: Tamanho máximo total antes da remoção LRU
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._inflight = {}
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key
+
+    # ------------------------------------------------------------------
+    # Deduplicação de execuções simultâneas
+    # ------------------------------------------------------------------
+    def inflight(self, key: str) -> Optional[asyncio.Future]:
+        """Future da execução líder para a chave, se houver uma em andamento."""
+        return self._inflight.get(key)
+
+    def start(self, key: str) -> None:
+        """Marca o job atual como líder da chave."""
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def finish(self, key: str) -> None:
+        """Libera os jobs que aguardavam o líder (com ou sem sucesso)."""
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    # ------------------------------------------------------------------
+    # Leitura / escrita de entradas
+    # ------------------------------------------------------------------
+    def restore(self, key: str, job_dir: Path, result_dir: Path) -> bool:
+        """
+        Copia os artefatos de uma entrada para o job.
+
+        Returns:
+            True se houve acerto e os arquivos foram restaurados
+        """
+        entry = self._entry(key)
+        meta_file = entry / "meta.json"
+        if not meta_file.exists():
+            return False
+        try:
+            meta = json.loads(meta_file.read_text())
+            job_dir.mkdir(parents=True, exist_ok=True)
+            result_dir.mkdir(parents=True, exist_ok=True)
+            for name in meta["uploads"]:
+                shutil.copy2(entry / "uploads" / name, job_dir / name)
+            for name in meta["results"]:
+                shutil.copy2(entry / "results" / name, result_dir / name)
+            # Marca o uso para a política LRU
+            os.utime(entry)
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            # Entrada removida/corrompida por outro processo: trata como miss
+            print(f"Aviso: falha ao restaurar cache {key}: {e}")
+            return False
+
+    def store(self, key: str, job_dir: Path, result_dir: Path) -> None:
+        """Guarda os artefatos de um job concluído e aplica a remoção LRU."""
+        entry = self._entry(key)
+        if entry.exists():
+            os.utime(entry)
+            return
+
+        staging = self.root / f".{key}.{uuid.uuid4().hex}"
+        try:
+            meta = {"created": time.time(), "uploads": [], "results": [], "size": 0}
+            (staging / "uploads").mkdir(parents=True)
+            (staging / "results").mkdir()
+            for name in UPLOAD_ARTIFACTS:
+                src = job_dir / name
+                if src.exists():
+                    shutil.copy2(src, staging / "uploads" / name)
+                    meta["uploads"].append(name)
+                    meta["size"] += src.stat().st_size
+            for pattern in RESULT_ARTIFACTS:
+                for src in result_dir.glob(pattern):
+                    if src.is_file():
+                        shutil.copy2(src, staging / "results" / src.name)
+                        meta["results"].append(src.name)
+                        meta["size"] += src.stat().st_size
+            (staging / "meta.json").write_text(json.dumps(meta))
+            os.rename(staging, entry)
+        except OSError as e:
+            print(f"Aviso: falha ao gravar cache {key}: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove as entradas menos usadas até o cache caber em max_bytes."""
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            meta_file = entry / "meta.json"
+            if entry.name.startswith(".") or not meta_file.exists():
+                continue
+            try:
+                size = json.loads(meta_file.read_text())["size"]
+                entries.append((entry.stat().st_mtime, size, entry))
+                total += size
+            except (OSError, ValueError, KeyError):
+                continue
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
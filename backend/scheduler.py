@@ -0,0 +1,129 @@
+"""
+Escalonador de jobs com orçamento global de núcleos de CPU.
+
+Cada etapa que executa uma ferramenta (MAFFT, trimAl, FastTree, IQ-TREE)
+pede uma "concessão" de núcleos ao escalonador. As concessões saem de um
+orçamento global, então jobs simultâneos não disputam mais threads do que a
+máquina tem. Quando não há núcleos livres o job espera em uma fila FIFO
+ordenada pela chegada do job (não da etapa), o que faz um job já em andamento
+passar à frente de jobs que chegaram depois dele.
+"""
+import asyncio
+import bisect
+import itertools
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+
+def _default_total_cores() -> int:
+    # Com vários workers do uvicorn cada processo recebe uma fatia da máquina
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+# Orçamento de núcleos e limites por ferramenta, configuráveis via .env
+CPU_CORES = int(os.getenv("CPU_CORES", "0")) or _default_total_cores()
+MAX_THREADS_PER_TOOL = int(os.getenv("MAX_THREADS_PER_TOOL", "8"))
+MIN_THREADS_PER_TOOL = int(os.getenv("MIN_THREADS_PER_TOOL", "2"))
+
+
+class CoreScheduler:
+    """
+    Distribui núcleos de CPU entre as ferramentas dos jobs ativos.
+
+    Args:
+        total_cores: Orçamento global de núcleos
+        max_threads_per_tool: Máximo de threads concedidas a uma ferramenta
+        min_threads_per_tool: Uma ferramenta só inicia quando houver pelo menos
+            esse número de núcleos livres (ou o que ela pediu, se for menor)
+        on_queue_change: Callback chamado com (job_id, posição) quando a posição
+            de um job na fila muda; posição None indica que o job saiu da fila
+    """
+
+    def __init__(self, total_cores: int, max_threads_per_tool: int, min_threads_per_tool: int = 1,
+                 on_queue_change: Optional[Callable[[str, Optional[int]], None]] = None):
+        self.total_cores = max(1, total_cores)
+        self.max_threads_per_tool = max(1, min(max_threads_per_tool, self.total_cores))
+        self.min_threads_per_tool = max(1, min(min_threads_per_tool, self.max_threads_per_tool))
+        self.on_queue_change = on_queue_change
+        self._free = self.total_cores
+        self._tickets = {}
+        self._counter = itertools.count()
+        self._waiting = []
+        self._positions = {}
+        self._condition = asyncio.Condition()
+
+    @property
+    def free_cores(self) -> int:
+        return self._free
+
+    def register(self, job_id: str) -> int:
+        """Registra o job e devolve sua senha na fila (ordem de chegada)."""
+        if job_id not in self._tickets:
+            self._tickets[job_id] = next(self._counter)
+        return self._tickets[job_id]
+
+    def forget(self, job_id: str) -> None:
+        """Remove o job do escalonador ao final da análise."""
+        self._tickets.pop(job_id, None)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Posição (1 = próximo) do job na fila, ou None se ele não está esperando."""
+        return self._positions.get(job_id)
+
+    def _publish_positions(self) -> None:
+        positions = {job_id: index + 1 for index, (_, job_id) in enumerate(self._waiting)}
+        if self.on_queue_change:
+            for job_id in self._positions.keys() - positions.keys():
+                self.on_queue_change(job_id, None)
+            for job_id, position in positions.items():
+                if self._positions.get(job_id) != position:
+                    self.on_queue_change(job_id, position)
+        self._positions = positions
+
+    async def acquire(self, job_id: str, wanted: int) -> int:
+        """
+        Espera a vez do job e reserva núcleos para uma ferramenta.
+
+        Returns:
+            Número de threads concedidas (entre 1 e wanted)
+        """
+        wanted = max(1, min(wanted, self.max_threads_per_tool))
+        needed = min(wanted, self.min_threads_per_tool)
+        entry = (self.register(job_id), job_id)
+
+        async with self._condition:
+            # Caminho rápido: ninguém na fila e núcleos suficientes
+            if self._waiting or self._free < needed:
+                bisect.insort(self._waiting, entry)
+                self._publish_positions()
+                try:
+                    await self._condition.wait_for(
+                        lambda: self._waiting[0] == entry and self._free >= needed
+                    )
+                finally:
+                    self._waiting.remove(entry)
+                    self._publish_positions()
+                    self._condition.notify_all()
+
+            granted = min(wanted, self._free)
+            self._free -= granted
+            return granted
+
+    async def release(self, cores: int) -> None:
+        """Devolve núcleos ao orçamento e acorda os jobs em espera."""
+        # Atualiza o saldo antes de aguardar o lock, para não perder núcleos
+        # se a task for cancelada neste ponto
+        self._free = min(self.total_cores, self._free + cores)
+        async with self._condition:
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def lease(self, job_id: str, wanted: int):
+        """Context manager que reserva núcleos durante a execução de uma ferramenta."""
+        granted = await self.acquire(job_id, wanted)
+        try:
+            yield granted
+        finally:
+            await self.release(granted)
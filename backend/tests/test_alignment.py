@@ -0,0 +1,71 @@
+"""Verificação prévia e estatísticas por coluna do alinhamento (alignment.py)."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from alignment import Alignment, AlignmentError, preflight_check  # noqa: E402
+
+
+def write_fasta(tmp_path, records):
+    path = tmp_path / "aligned.fasta"
+    path.write_text("".join(f">{name}\n{sequence}\n" for name, sequence in records))
+    return path
+
+
+def test_ragged_rows_are_rejected(tmp_path):
+    path = write_fasta(tmp_path, [("a", "ACGT"), ("b", "ACGTA"), ("c", "ACGT")])
+    with pytest.raises(AlignmentError, match="'b' tem 5 posições"):
+        Alignment.from_fasta(path)
+    assert len(preflight_check(path)) == 1
+
+
+def test_invalid_characters(tmp_path):
+    path = write_fasta(tmp_path, [("a", "ACGT"), ("b", "AC*T"), ("c", "ACGé")])
+    alignment = Alignment.from_fasta(path)
+    assert alignment.invalid_characters() == {"sequence": "b", "position": 3, "character": "*", "count": 2}
+    assert preflight_check(path) == ["Caractere inválido '*' em 'b', posição 3 (2 no total)"]
+
+
+def test_ambiguity_codes_and_gaps_are_valid(tmp_path):
+    path = write_fasta(tmp_path, [("a", "ACGTN"), ("b", "ryswk"), ("c", "--.?U")])
+    assert preflight_check(path) == []
+
+
+def test_too_few_sequences(tmp_path):
+    path = write_fasta(tmp_path, [("a", "ACGT"), ("b", "ACGA")])
+    assert preflight_check(path) == ["São necessárias pelo menos 3 sequências (encontradas 2)"]
+    # Modo 2: a referência pode ter uma única sequência
+    assert preflight_check(path, 1) == []
+
+
+def test_repeated_names(tmp_path):
+    path = write_fasta(tmp_path, [("a", "ACGT"), ("b", "ACGA"), ("a", "ACGC")])
+    assert preflight_check(path) == ["Nomes de sequência repetidos: a"]
+
+
+def test_constant_and_informative_columns(tmp_path):
+    # coluna 1: constante (A)
+    # coluna 2: constante ignorando gap e N
+    # coluna 3: variável, mas singleton (um único G)
+    # coluna 4: informativa (AA / CC)
+    # coluna 5: variável, só um par (TT / G / C)
+    path = write_fasta(tmp_path, [
+        ("a", "AC-AT"),
+        ("b", "A-AAT"),
+        ("c", "ANAC-"),
+        ("d", "ACGCG"),
+        ("e", "ACACC"),
+    ])
+    alignment = Alignment.from_fasta(path)
+    assert alignment.constant_sites().tolist() == [True, True, False, False, False]
+    assert alignment.parsimony_informative_sites().tolist() == [False, False, False, True, False]
+
+    stats = alignment.stats()
+    assert stats["constant_sites"] == 2
+    assert stats["variable_sites"] == 3
+    assert stats["parsimony_informative_sites"] == 1
+    assert alignment.gap_fraction().tolist() == [0, 0.2, 0.2, 0, 0.2]
+    assert alignment.conservation().tolist() == [1, 1, 0.75, 0.6, 0.5]
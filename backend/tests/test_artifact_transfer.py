@@ -0,0 +1,78 @@
+"""Range, Accept-Encoding e versões comprimidas dos artefatos (artifact_transfer.py)."""
+import gzip
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import artifact_transfer  # noqa: E402
+from artifact_transfer import accepted_encodings, parse_range, precompress, variant_path  # noqa: E402
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-10", (10, 10)),
+    ("bytes=900-5000", (900, 999)),     # fim além do arquivo: vai até o último byte
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),          # sufixo maior que o arquivo: arquivo inteiro
+    (" bytes = 5 - 6 ", (5, 6)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-1001", "bytes=20-10", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    assert parse_range(header, 1000) is False
+
+
+@pytest.mark.parametrize("header", ["", "bytes=-", "bytes=0-1,5-6", "items=0-1", "bytes=a-b"])
+def test_parse_range_ignored(header):
+    assert parse_range(header, 1000) is None
+
+
+def test_parse_range_empty_file():
+    assert parse_range("bytes=0-", 0) is False
+    assert parse_range("bytes=-10", 0) is False
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert accepted_encodings("gzip;q=0.0, br ; q=1") == {"br"}
+    assert accepted_encodings("*") == {"gzip", "br"}
+    assert accepted_encodings("*;q=0") == set()
+    assert accepted_encodings("") == set()
+
+
+def test_concurrent_compression_of_same_artifact(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_transfer, "brotli", None)
+    path = tmp_path / "supportvalue_output.svg"
+    content = b"<svg>" + b"<text>Fomitiporia</text>" * 5000 + b"</svg>"
+    path.write_bytes(content)
+
+    errors = []
+
+    def compress():
+        try:
+            artifact_transfer._compress(path, variant_path(path, "gzip"), "gzip")
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=compress) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert gzip.decompress(variant_path(path, "gzip").read_bytes()) == content
+    assert [item.name for item in tmp_path.iterdir() if item.name.endswith(".tmp")] == []
+    # Já atualizada: precompress não refaz
+    mtime = variant_path(path, "gzip").stat().st_mtime_ns
+    precompress(path)
+    assert variant_path(path, "gzip").stat().st_mtime_ns == mtime
@@ -0,0 +1,138 @@
+"""
+Cache de validação de gêneros (check_genus.py) contra um IndexFungorum local.
+
+Um servidor HTTP de teste responde como a busca do IndexFungorum (a página
+contém o nome quando o gênero existe) e conta as consultas, para verificar a
+lista local, o cache persistente com TTL, o cache negativo e que falhas de
+rede não são gravadas.
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tree_set_svg_edit"))
+
+import check_genus  # noqa: E402
+
+KNOWN_GENERA = {"stubomyces"}
+
+
+class StubIndexFungorum(BaseHTTPRequestHandler):
+    queries = []
+    failing = False
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        term = parse_qs(self.rfile.read(length).decode())["SearchTerm"][0]
+        StubIndexFungorum.queries.append(term)
+        if StubIndexFungorum.failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        found = term.lower() in KNOWN_GENERA
+        body = f"<html><body>{term} Fr. 1821</body></html>" if found else "<html><body>No records</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = HTTPServer(("127.0.0.1", 0), StubIndexFungorum)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/Names/Names.asp"
+    server.shutdown()
+
+
+@pytest.fixture
+def genus_cache(stub_url, tmp_path, monkeypatch):
+    """check_genus apontado para o servidor de teste, com cache vazio."""
+    monkeypatch.setattr(check_genus, "INDEXFUNGORUM_URL", stub_url)
+    monkeypatch.setattr(check_genus, "GENUS_CACHE_PATH", tmp_path / "genus_cache.sqlite3")
+    monkeypatch.setattr(check_genus, "_db_local", threading.local())
+    monkeypatch.setattr(check_genus, "_memory_cache", {})
+    StubIndexFungorum.queries = []
+    StubIndexFungorum.failing = False
+    return check_genus
+
+
+def forget_memory(module):
+    """Simula outro processo: só o cache persistente é compartilhado."""
+    module._memory_cache.clear()
+
+
+def test_seed_list_needs_no_query(genus_cache):
+    assert "fomitiporia" in genus_cache.load_local_genera()
+    assert genus_cache.check_genus("Fomitiporia") is True
+    assert StubIndexFungorum.queries == []
+
+
+def test_found_genus_is_cached_persistently(genus_cache):
+    assert genus_cache.check_genus("Stubomyces") is True
+    forget_memory(genus_cache)
+    assert genus_cache.check_genus("Stubomyces") is True
+    assert StubIndexFungorum.queries == ["Stubomyces"]
+
+
+def test_expired_entry_is_queried_again(genus_cache, monkeypatch):
+    monkeypatch.setattr(genus_cache, "GENUS_CACHE_TTL", -1)
+    assert genus_cache.check_genus("Stubomyces") is True
+    forget_memory(genus_cache)
+    assert genus_cache.check_genus("Stubomyces") is True
+    assert StubIndexFungorum.queries == ["Stubomyces", "Stubomyces"]
+
+
+def test_unknown_genus_uses_negative_ttl(genus_cache):
+    assert genus_cache.check_genus("Nullomyces") is False
+    forget_memory(genus_cache)
+    assert genus_cache.check_genus("Nullomyces") is False
+    assert StubIndexFungorum.queries == ["Nullomyces"]
+
+    expires_at = genus_cache._cache_db().execute(
+        "SELECT expires_at FROM genus_cache WHERE genus = ?", ("nullomyces",)
+    ).fetchone()[0]
+    assert expires_at == pytest.approx(time.time() + genus_cache.GENUS_NEGATIVE_TTL, abs=60)
+
+
+def test_server_failure_is_not_persisted(genus_cache):
+    StubIndexFungorum.failing = True
+    assert genus_cache.check_genus("Stubomyces") is False
+    assert genus_cache._cache_get("stubomyces") is None
+
+    # Dentro de GENUS_ERROR_TTL o mesmo processo não consulta de novo
+    assert genus_cache.check_genus("Stubomyces") is False
+    assert StubIndexFungorum.queries == ["Stubomyces"]
+
+    # Servidor de volta: o gênero é encontrado assim que a memória expira
+    StubIndexFungorum.failing = False
+    forget_memory(genus_cache)
+    assert genus_cache.check_genus("Stubomyces") is True
+    assert StubIndexFungorum.queries == ["Stubomyces", "Stubomyces"]
+
+
+def test_connection_error_is_not_persisted(genus_cache, monkeypatch):
+    monkeypatch.setattr(genus_cache, "INDEXFUNGORUM_URL", "http://127.0.0.1:9/Names/Names.asp")
+    assert genus_cache.check_genus("Stubomyces") is False
+    assert genus_cache._cache_get("stubomyces") is None
+
+
+def test_memory_cache_is_bounded(genus_cache, monkeypatch):
+    monkeypatch.setattr(genus_cache, "GENUS_MEMORY_MAX", 2)
+    for genus in ("Nullomyces", "Stubomyces", "Voidomyces"):
+        genus_cache.check_genus(genus)
+    assert list(genus_cache._memory_cache) == ["stubomyces", "voidomyces"]
+
+    # O que saiu da memória ainda vem do cache persistente, sem nova consulta
+    assert genus_cache.check_genus("Nullomyces") is False
+    assert StubIndexFungorum.queries == ["Nullomyces", "Stubomyces", "Voidomyces"]
+    assert list(genus_cache._memory_cache) == ["voidomyces", "nullomyces"]
@@ -0,0 +1,96 @@
+"""Colapso de sequências idênticas e reinserção na árvore (duplicates.py)."""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from duplicates import collapse_duplicates, expand_duplicates  # noqa: E402
+from fasta_io import read_fasta  # noqa: E402
+from newick import read_tree  # noqa: E402
+
+
+def write_alignment(path, records):
+    path.write_text("".join(f">{name}\n{sequence}\n" for name, sequence in records))
+    return path
+
+
+def collapse(tmp_path, records):
+    aligned = write_alignment(tmp_path / "aligned.fasta", records)
+    collapsed = tmp_path / "collapsed.fasta"
+    mapping_file = tmp_path / "duplicates.json"
+    return collapse_duplicates(aligned, collapsed, mapping_file), collapsed, mapping_file
+
+
+def expand(tmp_path, newick, mapping):
+    tree_file = tmp_path / "tree.tre"
+    tree_file.write_text(newick)
+    expanded = expand_duplicates(tree_file, mapping)
+    return expanded, read_tree(tree_file)
+
+
+def sisters(tree, name):
+    """Nomes das tips irmãs de ``name`` (incluindo ela) e o ramo do pai."""
+    node = tree.names.index(name)
+    up = int(tree.parent[node])
+    return {tree.names[child] for child in tree.children(up)}, tree.branch[up]
+
+
+def test_round_trip(tmp_path):
+    mapping, collapsed, mapping_file = collapse(tmp_path, [
+        ("A", "ACGTACGT"), ("B", "ACGTACGT"), ("C", "ACGAACGT"), ("D", "TCGAACGA"), ("E", "ACGTACGT"),
+    ])
+    assert mapping == {"A": ["B", "E"]}
+    assert json.loads(mapping_file.read_text()) == mapping
+    assert [record.name for record in read_fasta(collapsed)] == ["A", "C", "D"]
+
+    expanded, tree = expand(tmp_path, "((A:0.1,C:0.2)90:0.05,D:0.3);", mapping)
+    assert expanded == 1
+    assert sorted(tree.tip_labels()) == ["A", "B", "C", "D", "E"]
+    members, branch = sisters(tree, "B")
+    assert members == {"A", "B", "E"}
+    assert branch == 0.1
+    assert all(tree.branch[tree.names.index(name)] == 0 for name in members)
+
+
+def test_representative_renamed_by_iqtree(tmp_path):
+    mapping = {"Fomitiporia sp#1 MUCL": ["Fomitiporia sp#2 MUCL"]}
+    expanded, tree = expand(tmp_path, "(Fomitiporia_sp_1_MUCL:0.1,C:0.2,D:0.3);", mapping)
+    assert expanded == 1
+    assert sisters(tree, "Fomitiporia_sp_2_MUCL")[0] == {"Fomitiporia_sp_1_MUCL", "Fomitiporia_sp_2_MUCL"}
+
+
+def test_quoted_labels(tmp_path):
+    mapping = {"Phellinus sp. (A)": ["Phellinus sp. 'B'"]}
+    expanded, tree = expand(tmp_path, "('Phellinus sp. (A)':0.1,C:0.2,D:0.3);", mapping)
+    assert expanded == 1
+    assert sisters(tree, "Phellinus sp. 'B'")[0] == {"Phellinus sp. (A)", "Phellinus sp. 'B'"}
+
+
+def test_internal_node_label_is_not_a_tip(tmp_path):
+    # "A" aparece também como rótulo do nó interno, depois de ')'
+    expanded, tree = expand(tmp_path, "((A:0.1,C:0.2)A:0.05,D:0.3);", {"A": ["B"]})
+    assert expanded == 1
+    assert sorted(tree.tip_labels()) == ["A", "B", "C", "D"]
+    assert tree.names.count("A") == 2
+
+
+def test_too_few_sequences_left(tmp_path):
+    # Colapsar deixaria 2 sequências (< MIN_SEQUENCES)
+    mapping, collapsed, mapping_file = collapse(tmp_path, [
+        ("A", "ACGT"), ("B", "ACGT"), ("C", "ACGT"), ("D", "TTTT"),
+    ])
+    assert mapping == {}
+    assert not collapsed.exists()
+    assert not mapping_file.exists()
+
+
+def test_stale_files_are_removed(tmp_path):
+    (tmp_path / "collapsed.fasta").write_text(">old\nACGT\n")
+    (tmp_path / "duplicates.json").write_text(json.dumps({"old": ["older"]}))
+    mapping, collapsed, mapping_file = collapse(tmp_path, [
+        ("A", "ACGT"), ("B", "ACGA"), ("C", "ACTT"),
+    ])
+    assert mapping == {}
+    assert not collapsed.exists()
+    assert not mapping_file.exists()
@@ -0,0 +1,44 @@
+"""Jobs órfãos no startup (job_store.interrupt_orphans)."""
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import job_store  # noqa: E402
+
+BACKEND = Path(__file__).resolve().parents[1]
+
+
+def test_jobs_of_dead_process_are_interrupted(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    store = job_store.SQLiteJobStore(path)
+
+    # Job iniciado por outro processo, que já terminou
+    subprocess.run([sys.executable, "-c", (
+        f"import sys; sys.path.insert(0, {str(BACKEND)!r}); import job_store; "
+        f"store = job_store.SQLiteJobStore({str(path)!r}); "
+        "store['dead'] = {'status': 'processing'}; store.claim('dead')"
+    )], check=True)
+
+    store["mine"] = {"status": "processing"}
+    store.claim("mine")
+    # Gravar o status inteiro não perde o dono
+    store["mine"] = {"status": "processing", "progress": 20}
+    store["unclaimed"] = {"status": "queued", "queue_position": 1}
+    store["done"] = {"status": "completed"}
+    store["uploaded"] = {"status": "uploaded"}
+
+    assert sorted(store.interrupt_orphans("interrompida")) == ["dead", "unclaimed"]
+    assert store["dead"]["status"] == "error"
+    assert store["dead"]["message"] == "interrompida"
+    assert "queue_position" not in store["unclaimed"]
+    assert [store[job]["status"] for job in ("mine", "done", "uploaded")] == ["processing", "completed", "uploaded"]
+
+
+def test_reused_pid_is_not_the_owner():
+    token = job_store.process_token(job_store.os.getpid())
+    pid, started = token.split(":")
+    assert job_store._owner_alive(token)
+    assert not job_store._owner_alive(f"{pid}:{int(started) - 1}")
+    assert not job_store._owner_alive(None)
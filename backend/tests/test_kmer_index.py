@@ -0,0 +1,43 @@
+"""Índice de k-mers da referência (kmer_index.py)."""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fasta_io import FastaRecord, write_fasta  # noqa: E402
+from kmer_index import KmerIndex, build_index, check_kmer_size, reverse_complement  # noqa: E402
+
+
+def random_sequence(rng, length=600):
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+@pytest.fixture
+def index(tmp_path):
+    rng = random.Random(1)
+    reference = tmp_path / "reference.fasta"
+    write_fasta([FastaRecord(f"taxon_{i}", random_sequence(rng)) for i in range(5)], reference)
+    return KmerIndex.for_reference(reference, tmp_path / "index", k=8)
+
+
+def test_kmer_size_limits(tmp_path):
+    assert check_kmer_size(12) == 12
+    for k in (0, 13, 16):
+        with pytest.raises(ValueError):
+            check_kmer_size(k)
+    with pytest.raises(ValueError):
+        build_index(tmp_path / "reference.fasta", tmp_path / "index", k=13)
+    assert not (tmp_path / "index").exists()
+
+
+def test_orientation(index):
+    rng = random.Random(1)
+    first = random_sequence(rng)
+    assert index.screen(FastaRecord("forward", first))["orientation"] == "forward"
+    assert index.screen(FastaRecord("reverse", reverse_complement(first)))["orientation"] == "reverse"
+    # Sem k-mers em comum com a referência: o MAFFT decide (--adjustdirection)
+    unrelated = index.screen(FastaRecord("unrelated", random_sequence(random.Random(99), 200)))
+    assert unrelated["orientation"] == "unknown"
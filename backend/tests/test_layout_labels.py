@@ -0,0 +1,63 @@
+"""Nomes formatados guardados no layout do job (tree_set_cli.get_layout)."""
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tree_set_svg_edit"))
+
+import check_genus  # noqa: E402
+import tree_set_cli  # noqa: E402
+from tree_layout import LAYOUT_FILE, TreeLayout  # noqa: E402
+
+TREE = "((Stubomyces_robustus_MUCL1:0.1,Fomitiporia_sp_X1:0.2)90:0.1,Coltricia_uncisetus_A1:0.3);"
+
+
+@pytest.fixture
+def genus_lookup(tmp_path, monkeypatch):
+    """IndexFungorum simulado: answer[0] é a resposta (None = falha de rede)."""
+    answer = [None]
+    monkeypatch.setattr(check_genus, "GENUS_CACHE_PATH", tmp_path / "genus_cache.sqlite3")
+    monkeypatch.setattr(check_genus, "_db_local", threading.local())
+    monkeypatch.setattr(check_genus, "_memory_cache", {})
+    monkeypatch.setattr(check_genus, "query_indexfungorum", lambda genus: answer[0])
+    monkeypatch.setattr(tree_set_cli, "_layout_cache", type(tree_set_cli._layout_cache)())
+    return answer
+
+
+def genus_style(layout):
+    tip = layout.names.index("Stubomyces_robustus_MUCL1")
+    return tuple(layout.labels[tip][1][0])
+
+
+def test_failed_lookup_is_not_frozen_into_layout(tmp_path, genus_lookup):
+    tree_file = tmp_path / "tree.tre"
+    tree_file.write_text(TREE)
+
+    layout = tree_set_cli.get_layout(str(tree_file), str(tmp_path))
+    assert genus_style(layout) == ("Stubomyces ", None)
+    assert layout.meta["genus_lookup_failed"] is True
+
+    # IndexFungorum de volta depois do GENUS_ERROR_TTL
+    genus_lookup[0] = True
+    check_genus._memory_cache.clear()
+    layout = tree_set_cli.get_layout(str(tree_file), str(tmp_path))
+    assert genus_style(layout) == ("Stubomyces ", "font-style:italic")
+    assert layout.meta["genus_lookup_failed"] is False
+
+    saved = TreeLayout.load(tmp_path / LAYOUT_FILE)
+    assert genus_style(saved) == ("Stubomyces ", "font-style:italic")
+    assert saved.meta["genus_lookup_failed"] is False
+
+
+def test_complete_labels_are_reused(tmp_path, genus_lookup, monkeypatch):
+    genus_lookup[0] = True
+    tree_file = tmp_path / "tree.tre"
+    tree_file.write_text(TREE)
+    tree_set_cli.get_layout(str(tree_file), str(tmp_path))
+
+    monkeypatch.setattr(tree_set_cli, "format_labels", lambda *args: pytest.fail("nomes refeitos"))
+    tree_set_cli._layout_cache.clear()
+    layout = tree_set_cli.get_layout(str(tree_file), str(tmp_path))
+    assert genus_style(layout) == ("Stubomyces ", "font-style:italic")
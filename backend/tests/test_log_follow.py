@@ -0,0 +1,87 @@
+"""Progresso do IQ-TREE e leitura incremental do log (log_follow.py)."""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from log_follow import BackgroundPublisher, IqtreeProgress, LogFollower  # noqa: E402
+
+
+def feed(tracker, lines):
+    for line in lines:
+        tracker.feed(line)
+    return tracker
+
+
+def test_ufboot_convergence_in_detail():
+    tracker = feed(IqtreeProgress(), [
+        "Generating 1000 samples for ultrafast bootstrap (seed: 1)...",
+        "Iteration 100 / LogL: -1234.567 / Time: 0h:0m:10s (0h:0m:20s left)",
+    ])
+    assert tracker.detail == "Busca da árvore: iteração 100, UFBoot 1000 réplicas"
+    assert tracker.eta_seconds() is not None
+
+    tracker.feed("NOTE: UFBoot does not converge, continue at least 100 more iterations")
+    assert tracker.detail == "Busca da árvore: iteração 100, UFBoot não convergiu, mais 100 iterações"
+    # O tempo restante informado antes deixa de valer
+    assert tracker._reported_remaining is None
+
+    feed(tracker, [
+        "Iteration 110 / LogL: -1234.567 / Time: 0h:0m:12s",
+        "UFBoot trees and support values converged at iteration 199",
+    ])
+    assert tracker.detail == "Busca da árvore: iteração 110, UFBoot convergiu"
+
+
+def test_follow_reads_only_appended_lines(tmp_path):
+    log = tmp_path / "iqtree.log"
+    lines = []
+    follower = LogFollower(log, lines.append)
+
+    async def run():
+        task = asyncio.create_task(follower.follow(interval=0.01))
+        log.write_text("Iteration 1 / LogL: -1 / Time: 0h:0m:1s\n")
+        await asyncio.sleep(0.1)
+        with open(log, "a") as f:
+            f.write("Iteration 2 / LogL: -1 / Time: 0h:0m:2s\nparcial")
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.to_thread(follower.close)
+
+    asyncio.run(run())
+    assert lines == [
+        "Iteration 1 / LogL: -1 / Time: 0h:0m:1s",
+        "Iteration 2 / LogL: -1 / Time: 0h:0m:2s",
+        "parcial",
+    ]
+
+
+def test_background_publisher_writes_off_the_loop():
+    writes = []
+
+    def slow_publish(fields):
+        time.sleep(0.05)
+        writes.append((threading.get_ident(), fields["progress"]))
+
+    async def run():
+        loop_thread = threading.get_ident()
+        async with BackgroundPublisher(slow_publish) as publish:
+            start = time.monotonic()
+            for progress in range(1, 11):
+                publish({"progress": progress})
+                await asyncio.sleep(0.01)
+            # O callback não espera a gravação
+            assert time.monotonic() - start < 0.4
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert all(thread != loop_thread for thread, _ in writes)
+    progress = [value for _, value in writes]
+    # Em ordem, resumindo o que chegou durante uma gravação, e o último
+    # estado gravado antes da saída do "async with"
+    assert progress == sorted(progress)
+    assert progress[-1] == 10
+    assert len(progress) < 10
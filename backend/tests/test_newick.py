@@ -0,0 +1,110 @@
+"""Leitor Newick/NEXUS, enraizamento e ladderização em arrays (newick.py)."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from newick import NewickError, ladderize, parse_newick, read_tree, reroot, root_on_outgroup  # noqa: E402
+
+
+def clade(tree, node):
+    """Nomes das tips no clado de ``node``."""
+    end = tree.clade_ends()[node]
+    return frozenset(tree.names[i] for i in range(node, end) if tree.is_tip[i])
+
+
+def node_of(tree, tips):
+    """Nó interno cujo clado é exatamente ``tips``."""
+    tips = frozenset(tips)
+    return next(node for node in range(tree.n_nodes) if clade(tree, node) == tips)
+
+
+def root_clades(tree):
+    return {clade(tree, int(child)) for child in tree.children(0)}
+
+
+def test_iqtree_support_keeps_last_value():
+    tree = parse_newick("((A:1,B:1)80.5/95:0.5,C:1,D:1);")
+    node = node_of(tree, "AB")
+    assert tree.support[node] == 95
+    assert tree.names[node] == ""
+    assert tree.branch[node] == 0.5
+    assert np.isnan(tree.support[0])
+
+
+def test_nexus_translate_with_quotes_and_comments(tmp_path):
+    path = tmp_path / "tree.nex"
+    path.write_text(
+        "#NEXUS\n"
+        "begin trees;\n"
+        "  translate\n"
+        "    1 'Fomitiporia sp. X1' [do usuário],\n"
+        "    2 'O''Brien_A',\n"
+        "    3 Phellinus_b\n"
+        "  ;\n"
+        "  tree tree1 = [&U] ((1:0.1,2:0.2)[&label=x]90:0.05,3:0.3);\n"
+        "end;\n"
+    )
+    tree = read_tree(path)
+    assert sorted(tree.tip_labels()) == ["Fomitiporia sp. X1", "O'Brien_A", "Phellinus_b"]
+    node = node_of(tree, ["Fomitiporia sp. X1", "O'Brien_A"])
+    assert tree.support[node] == 90
+    assert tree.branch[node] == 0.05
+
+
+def test_outgroup_spread_across_trifurcating_root():
+    # Sem âncora no ingroup, o MRCA das duas tips do outgroup seria a raiz
+    tree = parse_newick("(og_a:1,(A:1,B:1)90:1,og_b:1);")
+    rooted, found = root_on_outgroup(tree, "OG_")
+    assert found == 2
+    assert root_clades(rooted) == {frozenset({"og_a", "og_b"}), frozenset({"A", "B"})}
+    assert rooted.n_tips == 4
+
+
+def test_reroot_moves_length_and_support_with_edge():
+    tree = parse_newick("(A:1,B:2,(C:3,(D:4,E:5)60:6)80:7);")
+    rerooted = reroot(tree, node_of(tree, "D"))
+
+    assert root_clades(rerooted) == {frozenset("D"), frozenset("ABCE")}
+    d = node_of(rerooted, "D")
+    assert rerooted.branch[d] == 2.0
+    # Ramo {D,E}|{A,B,C}: agora acima do clado {A,B,C}
+    abc = node_of(rerooted, "ABC")
+    assert (rerooted.branch[abc], rerooted.support[abc]) == (6.0, 60.0)
+    # Ramo {C,D,E}|{A,B}: agora acima da raiz antiga, que contém A e B
+    ab = node_of(rerooted, "AB")
+    assert (rerooted.branch[ab], rerooted.support[ab]) == (7.0, 80.0)
+    # Ramos terminais não mudam
+    assert rerooted.branch[node_of(rerooted, "E")] == 5.0
+    assert rerooted.branch[node_of(rerooted, "A")] == 1.0
+
+
+def test_reroot_splices_single_child_old_root():
+    tree = parse_newick("((A:1,B:2)70:3,(C:4,D:5)80:6);")
+    rerooted = reroot(tree, node_of(tree, "A"))
+
+    assert rerooted.n_nodes == tree.n_nodes
+    children = rerooted.children_lists()
+    assert all(len(kids) != 1 for kids in children)
+    # Os dois ramos da raiz antiga viram um só: {C,D}|{A,B} com 3 + 6
+    cd = node_of(rerooted, "CD")
+    assert rerooted.branch[cd] == 9.0
+    assert rerooted.support[cd] == 70.0
+    assert rerooted.parent[cd] == node_of(rerooted, "BCD")
+
+
+def test_ladderize_puts_smaller_clades_first():
+    tree = ladderize(parse_newick("(((B,C)x,A)y,D);"))
+    assert tree.tip_labels() == ["D", "A", "B", "C"]
+    # Empate (mesmo número de tips): ordem original
+    tree = ladderize(parse_newick("((A,B),(C,D));"))
+    assert tree.tip_labels() == ["A", "B", "C", "D"]
+
+
+@pytest.mark.parametrize("text", ["((A,B),C;", "(A,B));", "A,B;", "((A:x,B),C);"])
+def test_malformed_input_raises(text):
+    with pytest.raises(NewickError):
+        parse_newick(text)
@@ -0,0 +1,79 @@
+"""Reaproveitamento de estágios entre execuções do job (pipeline_stages.py)."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pipeline_stages import STAGES_FILE, StageLedger  # noqa: E402
+
+
+@pytest.fixture
+def job(tmp_path):
+    """Job com align (entrada -> aligned.fasta) e infer (aligned.fasta -> tree.tre) concluídos."""
+    source = tmp_path / "raw_matrix.fasta"
+    aligned = tmp_path / "aligned.fasta"
+    tree = tmp_path / "tree.tre"
+    source.write_text(">a\nACGT\n>b\nACGA\n")
+    aligned.write_text(">a\nACGT\n>b\nACGA\n")
+    tree.write_text("(a:0.1,b:0.2);")
+
+    ledger = StageLedger(tmp_path)
+    ledger.record("align", ledger.fingerprint("align", [source], {"mode": "auto"}), [aligned])
+    ledger.record("infer", ledger.fingerprint("infer", [aligned], {"tool": "fasttree"}), [tree])
+    return tmp_path, source, aligned, tree
+
+
+def current(job_dir, stage, inputs, params, outputs):
+    """Abre o ledger do disco (como numa nova análise) e tenta reaproveitar o estágio."""
+    ledger = StageLedger(job_dir)
+    return ledger.reuse(stage, ledger.fingerprint(stage, inputs, params), outputs)
+
+
+def test_matching_fingerprint_is_reused(job):
+    job_dir, source, aligned, tree = job
+    ledger = StageLedger(job_dir)
+    assert ledger.reuse("align", ledger.fingerprint("align", [source], {"mode": "auto"}), [aligned])
+    assert ledger.reuse("infer", ledger.fingerprint("infer", [aligned], {"tool": "fasttree"}), [tree])
+    assert ledger.reused == ["align", "infer"]
+
+
+def test_changed_params_or_input_invalidate(job):
+    job_dir, source, aligned, tree = job
+    assert not current(job_dir, "infer", [aligned], {"tool": "iqtree"}, [tree])
+    source.write_text(">a\nACGT\n>b\nACGA\n>c\nTCGA\n")
+    assert not current(job_dir, "align", [source], {"mode": "auto"}, [aligned])
+
+
+def test_edited_or_missing_output_invalidates(job):
+    job_dir, source, aligned, tree = job
+    tree.write_text("(b:0.1,a:0.25);")
+    assert not current(job_dir, "infer", [aligned], {"tool": "fasttree"}, [tree])
+    tree.unlink()
+    assert not current(job_dir, "infer", [aligned], {"tool": "fasttree"}, [tree])
+
+
+def test_rerun_with_identical_output_keeps_later_stages(job):
+    job_dir, source, aligned, tree = job
+    # align refeito com outro parâmetro, gerando exatamente o mesmo arquivo
+    ledger = StageLedger(job_dir)
+    fingerprint = ledger.fingerprint("align", [source], {"mode": "linsi"})
+    assert not ledger.reuse("align", fingerprint, [aligned])
+    aligned.unlink()
+    aligned.write_text(">a\nACGT\n>b\nACGA\n")
+    ledger.record("align", fingerprint, [aligned])
+
+    assert current(job_dir, "infer", [aligned], {"tool": "fasttree"}, [tree])
+
+
+@pytest.mark.parametrize("content", ["{not json", "[]", ""])
+def test_corrupt_stages_file_is_empty(job, content):
+    job_dir, source, aligned, tree = job
+    (job_dir / STAGES_FILE).write_text(content)
+    assert not current(job_dir, "align", [source], {"mode": "auto"}, [aligned])
+
+    # E volta a ser gravado normalmente
+    ledger = StageLedger(job_dir)
+    ledger.record("align", ledger.fingerprint("align", [source], {"mode": "auto"}), [aligned])
+    assert current(job_dir, "align", [source], {"mode": "auto"}, [aligned])
@@ -0,0 +1,86 @@
+"""Posições do MAFFT --add --keeplength reaproveitadas entre jobs (placement_cache.py)."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fasta_io import FastaRecord, read_fasta, write_fasta  # noqa: E402
+from placement_cache import (REVERSED_PREFIX, PlacementCache, assemble_alignment,  # noqa: E402
+                             placement_context, read_added_placements, sequence_digest,
+                             uncached_records)
+
+REFERENCE = [FastaRecord("ref_a", "ACGT-ACGT"), FastaRecord("ref_b", "ACGTTACG-")]
+
+
+def aligned_row(record):
+    """Linha que o MAFFT daria para a sequência (determinística, comprimento da referência)."""
+    reversed_ = record.sequence.startswith("T")
+    return REVERSED_PREFIX + record.name if reversed_ else record.name, record.sequence[:9].ljust(9, "-")
+
+
+def fake_mafft_output(path, added):
+    """Saída do MAFFT --add sem --reorder: referência e depois as novas, na ordem."""
+    write_fasta(REFERENCE + [FastaRecord(*aligned_row(record)) for record in added], path)
+    return path
+
+
+@pytest.fixture
+def reference(tmp_path):
+    path = tmp_path / "existing_alignment.fasta"
+    write_fasta(REFERENCE, path)
+    return path
+
+
+def test_read_added_placements(tmp_path):
+    added = [FastaRecord("new_1", "ACGAACG"), FastaRecord("new_2", "TTGACCA"), FastaRecord("new_3", "ACCT")]
+    placements = read_added_placements(fake_mafft_output(tmp_path / "out.fasta", added), added)
+
+    assert list(placements) == [sequence_digest(record.sequence) for record in added]
+    assert placements[sequence_digest("ACGAACG")] == ("ACGAACG--", False)
+    # _R_: usada invertida, mas o nome original continua reconhecido
+    assert placements[sequence_digest("TTGACCA")] == ("TTGACCA--", True)
+
+
+def test_read_added_placements_rejects_other_order(tmp_path):
+    added = [FastaRecord("new_1", "ACGAACG"), FastaRecord("new_2", "ACCT")]
+    output = fake_mafft_output(tmp_path / "out.fasta", list(reversed(added)))
+    with pytest.raises(ValueError, match="fora de ordem"):
+        read_added_placements(output, added)
+
+    output = tmp_path / "short.fasta"
+    write_fasta(REFERENCE[:1], output)
+    with pytest.raises(ValueError, match="menos sequências"):
+        read_added_placements(output, added)
+
+
+def test_assembled_alignment_is_same_with_cache_hits(tmp_path, reference):
+    records = [
+        FastaRecord("sample_1", "ACGAACG"),
+        FastaRecord("sample_2", "TTGACCA"),
+        FastaRecord("sample_3", "ACCT"),
+        FastaRecord("sample_1_bis", "ACGAACG"),     # mesmo conteúdo de sample_1
+    ]
+    context = placement_context("referência", {"keeplength": True, "threads": 8})
+
+    # Sem cache: todas as sequências (uma por conteúdo) vão para o MAFFT
+    batch = uncached_records(records, {})
+    assert [record.name for record in batch] == ["sample_1", "sample_2", "sample_3"]
+    placements = read_added_placements(fake_mafft_output(tmp_path / "full.fasta", batch), batch)
+    assemble_alignment(reference, records, placements, tmp_path / "without_cache.fasta")
+
+    # Um job anterior já alinhou sample_2; só o resto vai para o MAFFT
+    cache = PlacementCache(tmp_path / "placements.sqlite3")
+    cache.put_many(context, {sequence_digest("TTGACCA"): placements[sequence_digest("TTGACCA")]})
+    cached = cache.get_many(context, [sequence_digest(record.sequence) for record in records])
+    assert list(cached) == [sequence_digest("TTGACCA")]
+    batch = uncached_records(records, cached)
+    assert [record.name for record in batch] == ["sample_1", "sample_3"]
+    partial = read_added_placements(fake_mafft_output(tmp_path / "partial.fasta", batch), batch)
+    assemble_alignment(reference, records, {**cached, **partial}, tmp_path / "with_cache.fasta")
+
+    assert (tmp_path / "with_cache.fasta").read_bytes() == (tmp_path / "without_cache.fasta").read_bytes()
+    assert [record.name for record in read_fasta(tmp_path / "with_cache.fasta")] == [
+        "ref_a", "ref_b", "sample_1", "_R_sample_2", "sample_3", "sample_1_bis",
+    ]
@@ -0,0 +1,78 @@
+"""SVG da árvore completa escrito a partir do layout (tree_lod.render_full)."""
+import re
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tree_set_svg_edit"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import check_genus  # noqa: E402
+import tree_lod  # noqa: E402
+from newick import ladderize, parse_newick, root_on_outgroup  # noqa: E402
+from tree_layout import TreeLayout  # noqa: E402
+
+TREE = ("((Fomitiporia_sp_A1:0.01,Fomitiporia_sp_A2:0.02)95:0.01,"
+        "((Phellinus_sp_B1:0.03,Phellinus_sp_B2:0.01)49.9:0.02,Phellinus_sp_B3:0.04)50:0.01,"
+        "Coltricia_sp_C1:0.05);")
+
+
+@pytest.fixture(autouse=True)
+def genus_lookup(tmp_path, monkeypatch):
+    """Sem consultas ao IndexFungorum: todo gênero é válido."""
+    monkeypatch.setattr(check_genus, "GENUS_CACHE_PATH", tmp_path / "genus_cache.sqlite3")
+    monkeypatch.setattr(check_genus, "_db_local", threading.local())
+    monkeypatch.setattr(check_genus, "_memory_cache", {})
+    monkeypatch.setattr(check_genus, "query_indexfungorum", lambda genus: True)
+
+
+def layout_of(newick):
+    tree, _ = root_on_outgroup(parse_newick(newick), "Coltricia")
+    return TreeLayout.from_tree(ladderize(tree))
+
+
+def node_labels(svg):
+    """Rótulos de suporte: entre o grupo toytree-NodeLabels e o dos nomes."""
+    group = svg[svg.index('class="toytree-NodeLabels"'):svg.index('class="toytree-TipLabels"')]
+    return [int(value) for value in re.findall(r"<text[^>]*>(\d+)</text>", group)]
+
+
+def test_support_labels_only_from_50():
+    svg = tree_lod.render_full(layout_of(TREE))
+    assert sorted(node_labels(svg)) == [50, 95]
+    assert svg.count('class="toytree-TipLabel"') == 6
+
+
+def test_fractional_supports_are_scaled():
+    svg = tree_lod.render_full(layout_of(TREE.replace("95:", "0.95:").replace("49.9:", "0.3:").replace("50:", "0.5:")))
+    assert sorted(node_labels(svg)) == [50, 95]
+
+
+def test_scale_bar():
+    layout = layout_of(TREE)
+    svg = tree_lod.render_full(layout)
+    value, text = tree_lod._scale_bar(layout.depth)
+    assert 0.08 * layout.depth <= value <= 0.30 * layout.depth
+    assert re.search(rf'<g class="toyplot-Datum"[^>]*><text x="0" y="5.11">{re.escape(text)}</text></g></svg>$', svg)
+
+
+def test_toytree_draws_no_node_markers_with_baseline_options(tmp_path):
+    """O desenho original (node_markers="s", node_sizes=None) não tinha quadrados nos nós."""
+    toytree = pytest.importorskip("toytree")
+    toyplot_svg = pytest.importorskip("toyplot.svg")
+    tree = toytree.tree("((A:0.1,B:0.2)95:0.1,(C:0.1,D:0.2)40:0.1,E:0.3);")
+    labels = [""] * tree.nnodes
+    markers = [""] * tree.nnodes
+    for node in tree.treenode.traverse():
+        if not node.is_leaf() and node.support is not None and node.support >= 50:
+            labels[node.idx] = str(int(node.support))
+            markers[node.idx] = "s"
+    canvas, axes, _ = tree.draw(width=400, height=300, scale_bar=False, node_labels=labels,
+                                node_sizes=None, node_markers=markers, node_colors=["black"] * tree.nnodes)
+    axes.show = False
+    toyplot_svg.render(canvas, str(tmp_path / "tree.svg"))
+    svg = (tmp_path / "tree.svg").read_text()
+    assert re.search(r'<g class="toytree-Nodes"[^>]*/>', svg)
+    assert ">95</text>" in svg
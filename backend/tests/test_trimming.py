@@ -0,0 +1,105 @@
+"""
+Curadoria embutida (trimming.py): matrizes pequenas calculadas à mão e, com o
+pytrimal instalado, comparação com o código do trimAl em matrizes aleatórias.
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from alignment import Alignment  # noqa: E402
+from fasta_io import read_fasta  # noqa: E402
+from trimming import gap_cut_point, recover_columns, trim_alignment, trim_fasta  # noqa: E402
+
+
+def alignment_from(tmp_path, rows):
+    path = tmp_path / "input.fasta"
+    path.write_text("".join(f">s{i}\n{row}\n" for i, row in enumerate(rows)))
+    return Alignment.from_fasta(path)
+
+
+def test_gap_threshold_alone():
+    # 5 sequências, -gt 0.2: até 5 * 0.8 = 4 gaps por coluna
+    gaps = np.array([0, 1, 4, 5, 5])
+    assert gap_cut_point(gaps, 5, 0.2, 0) == pytest.approx(4)
+    assert gap_cut_point(gaps, 5, 0.2, 60) == pytest.approx(4)
+
+
+def test_gap_threshold_in_float32():
+    # Como no trimAl, 1 - 0.8 em float32 fica abaixo de 0.2: com 5 sequências
+    # o corte é 0.99999994 e colunas com 1 gap saem; 1 - 0.9 fica acima de 0.1
+    assert gap_cut_point(np.arange(5), 5, 0.8, 0) < 1
+    assert gap_cut_point(np.arange(11), 10, 0.9, 0) > 1
+
+
+def test_conservation_relaxes_gap_threshold():
+    # -cons 60 exige 6 das 10 colunas, e a 6ª menos gapada tem 2 gaps
+    gaps = np.array([0, 0, 1, 1, 2, 2, 3, 3, 4, 5])
+    assert gap_cut_point(gaps, 5, 0.8, 60) == 2
+    # -cons 50 pede 5 colunas: o corte fica entre 1 e 2 gaps (2 - 1/2)
+    assert gap_cut_point(gaps, 5, 0.8, 50) == 1.5
+
+
+def test_tied_columns_are_recovered_from_the_middle():
+    # Das duas colunas com 2 gaps só falta uma para 50%; volta a do meio (5),
+    # que fica ao lado do bloco já mantido
+    gaps = np.array([0, 0, 1, 1, 2, 2, 3, 3, 4, 5])
+    columns = gaps <= gap_cut_point(gaps, 5, 0.8, 50)
+    recover_columns(columns, gaps, 50)
+    assert columns.tolist() == [True, True, True, True, False, True, False, False, False, False]
+
+
+def test_trim_alignment_columns(tmp_path):
+    alignment = alignment_from(tmp_path, [
+        "ACGT-",
+        "ACG--",
+        "AC---",
+        "A----",
+    ])
+    # gaps por coluna: 0 1 2 3 4; -gt 0.2 aceita até 4 * 0.8 = 3.2, e a
+    # coluna só com gaps sai de qualquer forma
+    result = trim_alignment(alignment, 0.2, 60)
+    assert result.columns.tolist() == [True, True, True, True, False]
+    assert result.gap_cut == 3
+    # -gt 0.8 aceita 0 gaps; -cons 60 pede 3 colunas -> até 2 gaps
+    result = trim_alignment(alignment, 0.8, 60)
+    assert result.columns.tolist() == [True, True, True, False, False]
+    assert result.rows.all()
+
+
+def test_all_gap_sequence_is_removed(tmp_path):
+    alignment_from(tmp_path, ["ACGTAC", "ACGTAC", "ACGTAC", "----AC", "------"])
+    trimmed = tmp_path / "trimmed.fasta"
+    # gaps por coluna: 2 2 2 2 1 1; -gt 0.8 não aceita gaps; -cons 30 pede 2 colunas
+    result = trim_fasta(tmp_path / "input.fasta", trimmed, 0.8, 30)
+    assert result.columns.tolist() == [False, False, False, False, True, True]
+    assert result.removed_sequences == ["s4"]
+    assert [(r.name, r.sequence) for r in read_fasta(trimmed)] == [
+        ("s0", "AC"), ("s1", "AC"), ("s2", "AC"), ("s3", "AC"),
+    ]
+
+
+@pytest.mark.filterwarnings("ignore:Alignment residues")
+def test_same_columns_as_trimal():
+    pytrimal = pytest.importorskip("pytrimal")
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        n_sequences, length = int(rng.integers(3, 30)), int(rng.integers(10, 400))
+        gap_chance = rng.beta(0.6, 1.2, size=length)
+        bases = np.frombuffer(b"ACGT", dtype=np.uint8)[rng.integers(0, 4, size=(n_sequences, length))]
+        matrix = np.where(rng.random((n_sequences, length)) < gap_chance, ord("-"), bases).astype(np.uint8)
+        gap_threshold = float(rng.choice([0.05, 0.2, 0.5, 0.8, 0.9]))
+        conserved = float(rng.choice([0, 30, 45.5, 60, 90]))
+
+        names = [f"s{i}".encode() for i in range(n_sequences)]
+        sequences = [row.tobytes().decode() for row in matrix]
+        expected = pytrimal.ManualTrimmer(gap_threshold=gap_threshold, conservation_percentage=conserved).trim(
+            pytrimal.Alignment(names, sequences))
+
+        alignment = Alignment(names=[name.decode() for name in names], matrix=matrix)
+        result = trim_alignment(alignment, gap_threshold, conserved)
+        assert result.columns.tolist() == list(expected.residues_mask)
+        assert result.rows.tolist() == list(expected.sequences_mask)
@@ -0,0 +1,44 @@
+"""Uploads FASTA compactados com gzip (upload_ingest.py)."""
+import asyncio
+import gzip
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import UploadFile
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from upload_ingest import UPLOAD_CHUNK_SIZE, UploadError, _Decoder, ingest_fasta  # noqa: E402
+
+MAX_BYTES = 2 * 1024 * 1024
+
+
+def ingest(data: bytes, path: Path):
+    upload = UploadFile(io.BytesIO(data), filename="sequencias.fasta.gz")
+    return asyncio.run(ingest_fasta(upload, path, max_bytes=MAX_BYTES))
+
+
+def test_gzip_fasta_is_normalized(tmp_path):
+    result = ingest(gzip.compress(b">seq1\nACGT\nACGT\n>seq2\nTTTT\n"), tmp_path / "out.fasta")
+    assert result.sequences == 2
+    assert (tmp_path / "out.fasta").read_text() == ">seq1\nACGTACGT\n>seq2\nTTTT\n"
+
+
+def test_gzip_bomb_is_rejected(tmp_path):
+    # ~64 MB descompactados em poucos KB, tudo no primeiro bloco lido
+    bomb = gzip.compress(b">bomba\n" + b"A" * (64 * 1024 * 1024))
+    assert len(bomb) < UPLOAD_CHUNK_SIZE
+    with pytest.raises(UploadError) as error:
+        ingest(bomb, tmp_path / "out.fasta")
+    assert error.value.status_code == 413
+    assert not (tmp_path / "out.fasta").exists()
+
+
+def test_decoder_stops_at_limit():
+    decoder = _Decoder("sequencias.fasta.gz", MAX_BYTES)
+    with pytest.raises(UploadError):
+        decoder.decode(gzip.compress(b"A" * (64 * 1024 * 1024)))
+    # Descompactou no máximo uma parte além do limite
+    assert decoder.inflated <= MAX_BYTES + UPLOAD_CHUNK_SIZE
@@ -0,0 +1,188 @@
+"""
+Execução assíncrona das ferramentas externas do pipeline (MAFFT, trimAl,
+FastTree, IQ-TREE e scripts de SVG).
+
+Os processos são criados com asyncio.create_subprocess_exec, então uma
+execução longa não bloqueia o event loop: /status, /upload e os downloads
+continuam respondendo enquanto os jobs rodam em background.
+"""
+import asyncio
+import os
+import signal
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+# Timeouts padrão (segundos), configuráveis via .env
+ALIGNMENT_TIMEOUT = int(os.getenv("ALIGNMENT_TIMEOUT", "3600"))
+TREE_TIMEOUT = int(os.getenv("TREE_TIMEOUT", "7200"))
+
+# Tamanho dos blocos lidos dos pipes
+READ_CHUNK_SIZE = 64 * 1024
+
+# Linhas finais de stderr guardadas para mensagens de erro
+STDERR_TAIL_LINES = 200
+
+# Tempo de espera entre SIGTERM e SIGKILL ao encerrar um processo
+TERMINATE_GRACE_SECONDS = 5
+
+
+class ToolError(Exception):
+    """Erro ao executar uma ferramenta externa."""
+
+
+class ToolTimeoutError(ToolError):
+    """A ferramenta excedeu o tempo limite e foi encerrada."""
+
+
+@dataclass
+class ToolResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class LineSplitter:
+    """Divide blocos de texto em linhas, aceitando '\\n' e '\\r' como separadores.
+
+    O MAFFT atualiza o progresso com '\\r', então tratar os dois separadores
+    permite acompanhar o andamento em tempo real.
+    """
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+        self.buffer = ""
+
+    def feed(self, text: str) -> None:
+        self.buffer += text.replace("\r\n", "\n").replace("\r", "\n")
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            self.callback(line)
+
+    def close(self) -> None:
+        if self.buffer:
+            self.callback(self.buffer)
+            self.buffer = ""
+
+
+async def _pump(stream: asyncio.StreamReader, on_chunk: Callable[[bytes], None]) -> None:
+    """Lê um pipe em blocos até EOF, repassando cada bloco para on_chunk."""
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        on_chunk(chunk)
+
+
+async def _terminate(process: asyncio.subprocess.Process) -> None:
+    """Encerra o processo e todo o seu grupo (o MAFFT, por exemplo, é um script
+    shell que dispara vários binários filhos)."""
+    if process.returncode is not None:
+        return
+
+    def send(sig):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    send(signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        send(signal.SIGKILL)
+        await process.wait()
+
+
+async def run_tool(cmd: Sequence[str],
+                   stdout_file: Optional[Path] = None,
+                   on_stdout_line: Optional[Callable[[str], None]] = None,
+                   on_stderr_line: Optional[Callable[[str], None]] = None,
+                   timeout: Optional[float] = None,
+                   cwd: Optional[Path] = None,
+                   env: Optional[dict] = None) -> ToolResult:
+    """
+    Executa uma ferramenta externa sem bloquear o event loop.
+
+    Args:
+        cmd: Comando e argumentos
+        stdout_file: Se informado, o stdout é gravado nesse arquivo em blocos
+        on_stdout_line: Callback chamado para cada linha de stdout
+        on_stderr_line: Callback chamado para cada linha de stderr
+        timeout: Tempo limite em segundos (None = sem limite)
+        cwd: Diretório de trabalho do processo
+        env: Variáveis de ambiente adicionais
+
+    Returns:
+        ToolResult com código de saída, stdout (vazio se gravado em arquivo)
+        e as últimas linhas de stderr
+
+    Raises:
+        ToolTimeoutError: se o tempo limite for excedido
+        asyncio.CancelledError: se a task for cancelada (o processo é encerrado antes)
+    """
+    process_env = None
+    if env:
+        process_env = {**os.environ, **env}
+
+    process = await asyncio.create_subprocess_exec(
+        *[str(arg) for arg in cmd],
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=str(cwd) if cwd else None,
+        env=process_env,
+        start_new_session=True,
+    )
+
+    stdout_parts = []
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    def handle_stderr_line(line: str) -> None:
+        stderr_tail.append(line)
+        if on_stderr_line:
+            on_stderr_line(line)
+
+    stderr_splitter = LineSplitter(handle_stderr_line)
+    stdout_splitter = LineSplitter(on_stdout_line) if on_stdout_line else None
+    out = open(stdout_file, "wb") if stdout_file else None
+
+    def handle_stdout_chunk(chunk: bytes) -> None:
+        if out:
+            out.write(chunk)
+        else:
+            stdout_parts.append(chunk)
+        if stdout_splitter:
+            stdout_splitter.feed(chunk.decode("utf-8", errors="replace"))
+
+    def handle_stderr_chunk(chunk: bytes) -> None:
+        stderr_splitter.feed(chunk.decode("utf-8", errors="replace"))
+
+    async def communicate() -> int:
+        await asyncio.gather(
+            _pump(process.stdout, handle_stdout_chunk),
+            _pump(process.stderr, handle_stderr_chunk),
+        )
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        await _terminate(process)
+        raise ToolTimeoutError(f"{Path(str(cmd[0])).name} excedeu o tempo limite de {timeout}s")
+    except asyncio.CancelledError:
+        await _terminate(process)
+        raise
+    finally:
+        if out:
+            out.close()
+
+    stderr_splitter.close()
+    if stdout_splitter:
+        stdout_splitter.close()
+
+    return ToolResult(
+        returncode=returncode,
+        stdout=b"".join(stdout_parts).decode("utf-8", errors="replace"),
+        stderr="\n".join(stderr_tail),
+    )
@@ -1,6 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
 import requests
 
-def check_genus(genus_name):
+# ---------- Configuração ----------
+INDEXFUNGORUM_URL = os.getenv("INDEXFUNGORUM_URL", "https://www.indexfungorum.org/Names/Names.asp")
+GENUS_CHECK_TIMEOUT = float(os.getenv("GENUS_CHECK_TIMEOUT", "5"))
+
+# Cache persistente compartilhado entre jobs e processos (workers de renderização)
+GENUS_CACHE_PATH = Path(os.getenv(
+    "GENUS_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / "results" / "genus_cache.sqlite3")
+))
+GENUS_CACHE_TTL = float(os.getenv("GENUS_CACHE_TTL_DAYS", "180")) * 86400
+GENUS_NEGATIVE_TTL = float(os.getenv("GENUS_NEGATIVE_TTL_DAYS", "7")) * 86400
+# Falhas de rede/servidor não vão para o cache persistente (uma queda do
+# IndexFungorum não pode marcar gêneros reais como inválidos): ficam só na
+# memória do processo, por pouco tempo, para um servidor fora do ar não travar
+# todas as renderizações seguintes
+GENUS_ERROR_TTL = float(os.getenv("GENUS_ERROR_TTL_SECONDS", "60"))
+# Respostas do cache persistente ficam na memória do processo por este tempo,
+# até GENUS_MEMORY_MAX gêneros (os mais antigos saem primeiro)
+GENUS_MEMORY_TTL = 600
+GENUS_MEMORY_MAX = 10000
+
+# Lista local de gêneros (dispensa a consulta remota no caso comum)
+LOCAL_GENERA_FILE = Path(__file__).resolve().parent / "genera.txt"
+
+_local_genera = None
+_memory_cache = {}
+_db_local = threading.local()
+
+
+def load_local_genera() -> frozenset:
+    """Carrega (uma vez por processo) a lista de gêneros empacotada."""
+    global _local_genera
+    if _local_genera is None:
+        genera = set()
+        if LOCAL_GENERA_FILE.exists():
+            with open(LOCAL_GENERA_FILE, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        genera.add(line.lower())
+        _local_genera = frozenset(genera)
+    return _local_genera
+
+
+def _cache_db():
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        GENUS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(GENUS_CACHE_PATH), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS genus_cache ("
+            " genus TEXT PRIMARY KEY,"
+            " valid INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        _db_local.conn = conn
+    return conn
+
+
+def _cache_get(genus_key):
+    """Retorna True/False do cache persistente, ou None se ausente/expirado."""
+    try:
+        row = _cache_db().execute(
+            "SELECT valid, expires_at FROM genus_cache WHERE genus = ?", (genus_key,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Aviso: cache de gêneros indisponível: {e}")
+        return None
+    if row is None or row[1] < time.time():
+        return None
+    return bool(row[0])
+
+
+def _cache_put(genus_key, valid, ttl):
+    try:
+        _cache_db().execute(
+            "INSERT OR REPLACE INTO genus_cache (genus, valid, expires_at) VALUES (?, ?, ?)",
+            (genus_key, int(valid), time.time() + ttl),
+        )
+    except sqlite3.Error as e:
+        print(f"Aviso: falha ao gravar cache de gêneros: {e}")
+
+
+def query_indexfungorum(genus_name):
+    """
+    Consulta o IndexFungorum.
+
+    Returns:
+        True/False conforme o gênero foi encontrado, ou None se a consulta falhou
+    """
     # ---------- Requisição inicial para buscar os registros ----------
     cookies = {
         'ASPSESSIONIDAACQAQQQ': 'FMKNJDICKFEMBLBFIAEGOILH',
@@ -32,14 +128,55 @@ def check_genus(genus_name):
         'submit': 'Search',
     }
 
-    response = requests.post('https://www.indexfungorum.org/Names/Names.asp', cookies=cookies, headers=headers, data=data)
-
     try:
+        response = requests.post(INDEXFUNGORUM_URL, cookies=cookies, headers=headers, data=data,
+                                 timeout=GENUS_CHECK_TIMEOUT)
         if response.status_code == 200:
             return genus_name.lower() in response.text.lower()
         else:
             print(f"Error accessing IndexFungorum: Status {response.status_code}")
-            return False
+            return None
     except Exception as e:
         print(f"Exception occurred: {e}")
-        return False
\ No newline at end of file
+        return None
+
+
+def genus_status(genus_name):
+    """
+    Situação de genus_name: True/False se é ou não um gênero de fungo válido,
+    ou None se a consulta ao IndexFungorum falhou (resposta provisória, que
+    não deve ser guardada junto com o resultado).
+
+    Ordem de consulta: lista local empacotada -> memória do processo ->
+    cache persistente (SQLite, com TTL e cache negativo) -> IndexFungorum.
+    """
+    genus_key = genus_name.lower()
+
+    if genus_key in load_local_genera():
+        return True
+
+    cached = _memory_cache.get(genus_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
+    status = _cache_get(genus_key)
+    memory_ttl = GENUS_MEMORY_TTL
+    if status is None:
+        status = query_indexfungorum(genus_name)
+        if status is None:
+            # Consulta falhou: só na memória, por pouco tempo, sem persistir
+            memory_ttl = GENUS_ERROR_TTL
+        else:
+            _cache_put(genus_key, status, GENUS_CACHE_TTL if status else GENUS_NEGATIVE_TTL)
+
+    # Memória do processo: evita ir ao SQLite a cada rótulo (revalida depois)
+    _memory_cache.pop(genus_key, None)
+    _memory_cache[genus_key] = (status, time.time() + memory_ttl)
+    while len(_memory_cache) > GENUS_MEMORY_MAX:
+        del _memory_cache[next(iter(_memory_cache))]
+    return status
+
+
+def check_genus(genus_name):
+    """Verifica se genus_name é um gênero de fungo válido (falha na consulta = não)."""
+    return genus_status(genus_name) is True
@@ -0,0 +1,135 @@
+"""
+Formatação dos nomes das tips (regras do svg_edit).
+
+Cada nome vira (estilo do <text>, [(texto, estilo)]): gênero e epíteto em
+itálico (gênero só se reconhecido por check_genus), palavras "type" em
+negrito e sequências novas (prefixo neew_) em vermelho e negrito, sem o
+prefixo. O renderizador (tree_lod) calcula isso uma vez por tip e escreve
+os <tspan> direto no SVG; svg_edit_cli usa as mesmas regras para formatar
+um SVG já existente.
+"""
+import re
+
+# Import local check_genus module
+try:
+    from check_genus import genus_status
+    HAS_GENUS_CHECK = True
+except ImportError:
+    print("⚠️ Módulo check_genus não encontrado. Verificação de gênero desativada.")
+    HAS_GENUS_CHECK = False
+    def genus_status(genus):
+        return True  # Assume todos são válidos se módulo não disponível
+
+# Estilo para novas sequências (marcadas com neew)
+NEW_SEQUENCE_STYLE = 'font-weight:bold;fill:#CC0000'  # Vermelho e negrito
+
+# Pattern para detectar marcador neew
+new_marker_pattern = re.compile(r'^neew_')
+
+# Patterns to detect genus/species and 'type' words
+genus_pattern = re.compile(
+    r'(?P<genus>\b[A-Z][a-z]{3,})\s+'
+    r'(?:(?P<qualifier>sp|cf|aff)\.?)?\s*'
+    r'(?P<species>(?![A-Z]{2}\d)[a-zA-Z-]+)?\s*'
+    r'(?P<voucher>[A-Z]+\d+[A-Za-z0-9_-]*)?(?P<tail>.*)?'
+)
+type_pattern = re.compile(r'(\s*)(\b(?:holo|exholo|topo|iso|ex|para|lecto|neo|epi|syn)?type\b)', re.IGNORECASE)
+
+def type_word_spans(text):
+    """Splits text into (text, style) spans, bolding 'type' words like 'holotype', 'isotype', etc."""
+    spans = []
+    last_index = 0
+
+    for match in type_pattern.finditer(text):
+        if match.start() > last_index:
+            spans.append((text[last_index:match.start()], None))
+
+        space = match.group(1)
+        word = match.group(2)
+        spans.append((space + word, 'font-weight:bold'))
+
+        last_index = match.end()
+
+    if last_index < len(text):
+        spans.append((text[last_index:], None))
+    return spans
+
+def label_spans(text, genus_cache):
+    """
+    Splits a label into (text, style) spans: italics for genus/species and bold for 'type' words.
+
+    genus_cache guarda o genus_status de cada gênero (None = consulta falhou,
+    sem itálico por enquanto; ver lookup_failed).
+    """
+    spans = []
+    last_index = 0
+
+    for match in genus_pattern.finditer(text):
+        genus, qualifier, species, voucher = (
+            match.group('genus'), match.group('qualifier'),
+            match.group('species'), match.group('voucher')
+        )
+
+        if genus not in genus_cache:
+            genus_cache[genus] = genus_status(genus) if HAS_GENUS_CHECK else True
+
+        # Add plain text before the match
+        if match.start() > last_index:
+            spans.extend(type_word_spans(text[last_index:match.start()]))
+
+        # Italicize genus if valid
+        spans.append((genus + ' ', 'font-style:italic' if genus_cache[genus] else None))
+
+        # Add qualifier if present
+        if qualifier:
+            spans.append((f"{qualifier}." + ' ', None))
+
+        # Italicize species based on qualifier type:
+        # - sp. → species NOT italicized (it's just additional info, not a real epithet)
+        # - cf. or aff. → species IS italicized (it's a real epithet with uncertainty)
+        # - no qualifier → species IS italicized
+        if species:
+            if qualifier and qualifier.lower() == 'sp':
+                # With "sp." qualifier - do NOT italicize what follows (not a real epithet)
+                spans.append((species + ' ', None))
+            else:
+                # No qualifier OR cf./aff. qualifier - italicize species
+                spans.append((species + ' ', 'font-style:italic'))
+
+        # Add voucher (if present)
+        if voucher:
+            spans.append((voucher, None))
+
+        last_index = match.end()
+
+        # Adiciona o restante da linha após o voucher
+        tail = match.group('tail')
+        if tail:
+            spans.extend(type_word_spans(tail))
+
+    # Process remaining text
+    if last_index < len(text):
+        spans.extend(type_word_spans(text[last_index:]))
+    return spans
+
+def format_label(text, genus_cache):
+    """
+    Formatting of one label: (style of the <text> element, list of (text, style) tspans).
+    New sequences (neew_ marker) get NEW_SEQUENCE_STYLE and lose the marker;
+    underscores become spaces.
+    """
+    text = text.strip()
+
+    # Verificar se é uma nova sequência (marcada com neew)
+    is_new_sequence = bool(new_marker_pattern.match(text))
+
+    # Remover o marcador neew do texto
+    if is_new_sequence:
+        text = new_marker_pattern.sub('', text)
+
+    adjusted_text = text.replace('_', ' ')
+    return (NEW_SEQUENCE_STYLE if is_new_sequence else None), label_spans(adjusted_text, genus_cache)
+
+def lookup_failed(genus_cache):
+    """True se algum gênero de genus_cache ficou sem resposta do IndexFungorum."""
+    return any(status is None for status in genus_cache.values())
@@ -0,0 +1,178 @@
+"""
+Layout da árvore em arrays NumPy (um elemento por nó, em pré-ordem).
+
+A árvore já enraizada e ladderizada é reduzida a vetores: pai, comprimento de
+ramo, suporte, nome, distância até a raiz (x) e linha na figura (y). Em
+pré-ordem cada clado ocupa um intervalo contíguo de nós (``i .. i+size-1``)
+e de linhas (``tip_lo .. tip_hi``), então recortar um subclado ou uma janela
+de linhas é só fatiar os arrays.
+
+O layout é salvo por job em ``layout.npz`` na primeira renderização, junto
+com a formatação já calculada dos nomes das tips, e reaproveitado por
+re-renderizações e pelas visualizações por nível de detalhe (tree_lod.py).
+"""
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+# newick fica no backend (diretório pai); necessário também quando os
+# scripts são executados diretamente pela linha de comando
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from newick import ArrayTree
+
+LAYOUT_FILE = "layout.npz"
+# Incrementar quando o formato do arquivo mudar (layouts antigos são refeitos)
+LAYOUT_VERSION = 2
+
+# Prefixo das sequências novas (upload_ingest.NEW_LABEL_PREFIX)
+NEW_LABEL_PREFIX = "neew_"
+
+# Primeira palavra do nome, se tiver cara de gênero (mesma regra do svg_edit)
+_GENUS = re.compile(r"^[A-Z][a-z]{3,}$")
+_NAME_SEPARATOR = re.compile(r"[_\s]+")
+
+
+def tree_digest(tree_file: Path) -> str:
+    """Hash do arquivo de árvore (invalida o layout salvo quando a árvore muda)."""
+    return hashlib.sha256(Path(tree_file).read_bytes()).hexdigest()
+
+
+def genus_of(name: str) -> str:
+    """Gênero de um nome de tip ('' se a primeira palavra não parece um gênero)."""
+    if name.startswith(NEW_LABEL_PREFIX):
+        name = name[len(NEW_LABEL_PREFIX):]
+    first = _NAME_SEPARATOR.split(name, 1)[0]
+    return first if _GENUS.match(first) else ""
+
+
+class TreeLayout(ArrayTree):
+    """
+    Árvore enraizada em pré-ordem (ArrayTree) com coordenadas de desenho.
+
+    Args:
+        names: Nome de cada nó ('' para nós internos sem nome)
+        parent: Índice do pai (-1 na raiz); o pai sempre vem antes do filho
+        branch: Comprimento do ramo até o pai
+        support: Valor de suporte (NaN se ausente)
+        meta: Informações extras salvas junto (outgroup, hash da árvore...)
+        labels: Formatação de cada tip, (estilo do <text>, [(texto, estilo)]);
+            None nos nós internos ou se ainda não foi calculada
+    """
+
+    def __init__(self, names: List[str], parent: np.ndarray, branch: np.ndarray,
+                 support: np.ndarray, meta: Optional[dict] = None, labels: Optional[list] = None):
+        super().__init__(names, parent, branch, support)
+        self.meta = dict(meta or {})
+        self.labels = labels
+        # Índice do primeiro nó na árvore completa (subtree)
+        self.offset = 0
+        self._compute()
+
+    # ------------------------------------------------------------------
+    # Construção
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_tree(cls, tree: ArrayTree, meta: Optional[dict] = None) -> "TreeLayout":
+        """Layout de uma ArrayTree (já enraizada/ladderizada), na mesma ordem."""
+        return cls(tree.names, tree.parent, tree.branch, tree.support, meta)
+
+    def _compute(self) -> None:
+        n = len(self.names)
+        is_tip = self.is_tip
+
+        # Distância até a raiz e fim de cada clado em NumPy (saltos de
+        # ponteiro), sem percorrer a árvore nó a nó
+        self.x = self.root_distances()
+        end = self.clade_ends()
+        self.size = (end - np.arange(n)).astype(np.int32)
+
+        # Linhas: tips na ordem da pré-ordem, de baixo para cima como no
+        # toytree (a primeira tip fica na última linha). As tips de um clado
+        # são contíguas, então o intervalo de linhas sai da contagem acumulada
+        n_tips = int(is_tip.sum())
+        tips_before = np.concatenate(([0], np.cumsum(is_tip)))
+        self.tip_lo = (n_tips - tips_before[end]).astype(np.int32)
+        self.tip_hi = (n_tips - 1 - tips_before[:-1]).astype(np.int32)
+
+        # y dos nós internos: média dos filhos, em pós-ordem (ordem inversa).
+        # Depende dos filhos já calculados, então fica num laço, mas sobre
+        # listas Python
+        y = np.where(is_tip, self.tip_hi, 0).astype(np.float64).tolist()
+        parent = self.parent.tolist()
+        tips = is_tip.tolist()
+        y_sum = [0.0] * n
+        children = [0] * n
+        for node in range(n - 1, 0, -1):
+            if not tips[node]:
+                y[node] = y_sum[node] / children[node]
+            up = parent[node]
+            y_sum[up] += y[node]
+            children[up] += 1
+        if n and not tips[0]:
+            y[0] = y_sum[0] / children[0]
+        self.y = np.array(y)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    @property
+    def depth(self) -> float:
+        """Maior distância raiz-tip."""
+        return float(self.x.max()) if self.n_nodes else 0.0
+
+    def clade(self, node: int) -> slice:
+        """Nós do clado de ``node`` (intervalo contíguo na pré-ordem)."""
+        return slice(node, node + int(self.size[node]))
+
+    def tip_names(self, node: int = 0) -> List[str]:
+        clade = self.clade(node)
+        return [self.names[i] for i in np.flatnonzero(self.is_tip[clade]) + clade.start]
+
+    def subtree(self, node: int) -> "TreeLayout":
+        """Layout só do clado de ``node``, com ele como raiz."""
+        if not 0 <= node < self.n_nodes:
+            raise ValueError(f"Nó {node} não existe (a árvore tem {self.n_nodes} nós)")
+        clade = self.clade(node)
+        parent = self.parent[clade] - node
+        parent[0] = -1
+        branch = self.branch[clade].copy()
+        branch[0] = 0.0
+        labels = self.labels[clade] if self.labels is not None else None
+        sub = TreeLayout(self.names[clade], parent, branch, self.support[clade], self.meta, labels)
+        sub.offset = self.offset + node
+        return sub
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+    def save(self, path: Path) -> None:
+        """Grava o layout (arrays + meta) em um .npz compactado."""
+        meta = dict(self.meta, version=LAYOUT_VERSION)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                names=np.array(self.names, dtype=str),
+                parent=self.parent,
+                branch=self.branch,
+                support=self.support,
+                meta=np.array(json.dumps(meta)),
+                labels=np.array(json.dumps(self.labels)),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["TreeLayout"]:
+        """Carrega um layout salvo (None se não existe ou é de outra versão)."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != LAYOUT_VERSION:
+                    return None
+                labels = json.loads(str(data["labels"]))
+                return cls(data["names"].tolist(), data["parent"], data["branch"], data["support"], meta, labels)
+        except (OSError, KeyError, ValueError):
+            return None
@@ -0,0 +1,382 @@
+"""
+Renderização por nível de detalhe (LOD) para árvores grandes.
+
+Com 23 px por sequência, uma árvore de 5000 tips vira um SVG de 115 000 px,
+lento de gerar, transferir e exibir. Aqui o SVG é escrito direto a partir do
+layout salvo (tree_layout.py), só com o que vai aparecer na tela:
+
+- visão geral: clados colapsados em triângulos, por gênero (clados
+  monofiléticos de um só gênero) ou por suporte/profundidade;
+- janela: faixa de linhas [start, end) da árvore completa, na mesma escala;
+- subárvore: um clado inteiro, com o próprio nó como raiz.
+
+O estilo segue o SVG do toytree (fontes, rótulos de suporte >= 50, barra de
+escala estilo FigTree), e os nomes saem formatados direto na escrita
+(label_format: itálico, negrito, sequências novas em vermelho), com a
+formatação calculada uma vez por tip e guardada no layout. A árvore
+completa (render_full) também é escrita daqui, então re-renderizar com
+outro tamanho só reescala o layout.
+"""
+import html
+from typing import List, Optional
+
+import numpy as np
+
+import label_format
+from tree_layout import TreeLayout, genus_of, NEW_LABEL_PREFIX
+
+# Mesma altura por sequência de tree_set_cli (HEIGHT_PER_SEQUENCE)
+ROW_HEIGHT = 23
+DEFAULT_WIDTH = 1700
+MARGIN = 35
+
+# Linhas ocupadas por um clado colapsado
+TRIANGLE_ROWS = 2
+# Maior janela aceita (em linhas)
+MAX_WINDOW_ROWS = 2000
+
+# Suporte mínimo para exibir o rótulo do nó
+MIN_SUPPORT_LABEL = 50
+
+FONT_FAMILY = "Helvetica, Arial, sans-serif"
+TIP_FONT_SIZE = 20
+NODE_FONT_SIZE = 15
+# Largura média de um caractere dos nomes (para reservar espaço aos rótulos)
+CHAR_WIDTH = 0.55 * TIP_FONT_SIZE
+LABEL_OFFSET = 15
+TEXT_COLOR = "rgb(14.9%,14.9%,14.9%)"
+
+SCALE_OPTIONS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+COLLAPSE_MODES = ("genus", "support")
+
+_EDGE = '<path d="M %.1f %.1f L %.1f %.1f L %.1f %.1f" />'
+_NODE_LABEL = '<g class="toytree-NodeLabel" transform="translate(%.1f,%.1f)"><text x="0" y="3.83">%d</text></g>'
+
+
+# ----------------------------------------------------------------------
+# Colapso de clados
+# ----------------------------------------------------------------------
+def collapse_mask(layout: TreeLayout, by: str = "genus", min_support: float = 70,
+                  depth: float = 0.5) -> np.ndarray:
+    """
+    Nós internos a desenhar como triângulo (só os mais externos de cada ramo).
+
+    Args:
+        by: "genus" colapsa clados em que todas as tips são do mesmo gênero;
+            "support" colapsa clados com suporte >= min_support cujo nó está
+            a pelo menos ``depth`` (fração) da profundidade total da árvore
+        min_support: Suporte mínimo (escala 0-100; suportes 0-1 são convertidos)
+        depth: Fração da profundidade a partir da qual clados são colapsados
+    """
+    if by not in COLLAPSE_MODES:
+        raise ValueError(f"Modo de colapso inválido: {by} (use {', '.join(COLLAPSE_MODES)})")
+    n = layout.n_nodes
+    parent = layout.parent
+    internal = ~layout.is_tip
+    internal[0] = False
+
+    if by == "genus":
+        # Código do gênero por nó: >= 0 se todas as tips do clado têm o mesmo
+        # gênero, -1 se misturado ou sem gênero
+        genera = {}
+        code = np.full(n, -1, dtype=np.int64)
+        for node in np.flatnonzero(layout.is_tip):
+            genus = genus_of(layout.names[node])
+            if genus:
+                code[node] = genera.setdefault(genus, len(genera))
+        pending = np.full(n, -2, dtype=np.int64)    # -2: ainda sem filhos vistos
+        for node in range(n - 1, 0, -1):
+            if not layout.is_tip[node]:
+                code[node] = pending[node]
+            up = parent[node]
+            if pending[up] == -2:
+                pending[up] = code[node]
+            elif pending[up] != code[node]:
+                pending[up] = -1
+        code[0] = pending[0]
+        candidate = internal & (code >= 0)
+        # Só o clado mais externo de cada gênero (o pai já é misturado)
+        candidate[1:] &= (parent[1:] == 0) | (code[parent[1:]] != code[1:])
+        return candidate
+
+    support = layout.support
+    if np.nanmax(support, initial=0) <= 1:
+        support = support * 100
+    candidate = internal & (np.nan_to_num(support) >= min_support) & (layout.x >= depth * layout.depth)
+    # Mantém só os candidatos sem ancestral colapsado (pré-ordem: pai antes)
+    hidden = np.zeros(n, dtype=bool)
+    for node in range(1, n):
+        up = parent[node]
+        hidden[node] = hidden[up] or candidate[up]
+    return candidate & ~hidden
+
+
+def _collapsed_view(layout: TreeLayout, collapsed: np.ndarray):
+    """
+    Nós visíveis e novas linhas quando ``collapsed`` vira triângulo.
+
+    Returns:
+        (visível, y por nó, número de linhas)
+    """
+    n = layout.n_nodes
+    parent = layout.parent
+    hidden = np.zeros(n, dtype=bool)
+    for node in range(1, n):
+        up = parent[node]
+        hidden[node] = hidden[up] or collapsed[up]
+    visible = ~hidden
+
+    # Folhas da visão (tips visíveis e triângulos), de cima para baixo
+    leaves = np.flatnonzero(visible & (layout.is_tip | collapsed))
+    leaves = leaves[np.argsort(layout.tip_lo[leaves], kind="stable")]
+    y = np.zeros(n)
+    row = 0
+    for node in leaves:
+        height = min(TRIANGLE_ROWS, layout.tip_hi[node] - layout.tip_lo[node] + 1) if collapsed[node] else 1
+        y[node] = row + (height - 1) / 2
+        row += height
+
+    # Nós internos visíveis: média dos filhos visíveis
+    y_sum = np.zeros(n)
+    children = np.zeros(n, dtype=np.int32)
+    for node in range(n - 1, -1, -1):
+        if not visible[node]:
+            continue
+        if children[node]:
+            y[node] = y_sum[node] / children[node]
+        up = parent[node]
+        if up >= 0:
+            y_sum[up] += y[node]
+            children[up] += 1
+    return visible, y, row
+
+
+def clade_label(layout: TreeLayout, node: int) -> str:
+    """Rótulo de um triângulo: gênero(s) e número de tips (prefixo neew_ se houver novas)."""
+    tips = layout.tip_names(node)
+    new = sum(1 for name in tips if name.startswith(NEW_LABEL_PREFIX))
+    genera = list(dict.fromkeys(genus for genus in map(genus_of, tips) if genus))
+    if len(genera) == 1:
+        title = genera[0]
+    elif 1 < len(genera) <= 3:
+        title = ", ".join(genera)
+    else:
+        title = f"{len(genera) or 'sem'} gêneros"
+    count = f"{len(tips)}, {new} novas" if new else str(len(tips))
+    label = f"{title} ({count})"
+    return NEW_LABEL_PREFIX + label if new else label
+
+
+# ----------------------------------------------------------------------
+# Escrita do SVG
+# ----------------------------------------------------------------------
+def _scale_bar(depth: float):
+    """Valor e texto da barra de escala (mesma regra de tree_set_cli)."""
+    tree_range = depth if depth > 0 else 0.1
+    value = SCALE_OPTIONS[0]
+    for option in SCALE_OPTIONS:
+        if tree_range * 0.08 <= option <= tree_range * 0.30:
+            value = option
+            break
+    if value >= 0.1:
+        text = f"{value:.1f}"
+    elif value >= 0.01:
+        text = f"{value:.2f}"
+    else:
+        text = f"{value:.3f}"
+    return value, text.rstrip('0').rstrip('.')
+
+
+def _write_svg(layout: TreeLayout, y: np.ndarray, visible: np.ndarray, collapsed: np.ndarray,
+               row_lo: int, row_hi: int, width: int, scale_bar: bool,
+               row_height: float = ROW_HEIGHT) -> str:
+    """
+    Escreve o SVG dos nós visíveis que caem nas linhas [row_lo, row_hi), com
+    os nomes já formatados (itálico, negrito, neew_ em vermelho).
+    """
+    parent = layout.parent
+    is_tip = layout.is_tip
+    rows = row_hi - row_lo
+    height = rows * row_height + 2 * MARGIN + (3 * row_height if scale_bar else 0)
+
+    # Nós que aparecem na faixa: o próprio ponto ou a ligação vertical com o pai
+    up = np.where(parent >= 0, parent, 0)
+    top = np.minimum(y, y[up])
+    bottom = np.maximum(y, y[up])
+    shown = visible & (bottom >= row_lo - 1) & (top <= row_hi)
+    in_rows = shown & (y >= row_lo - 0.5) & (y < row_hi - 0.5 + 1e-9)
+
+    labels = {}
+    for node in np.flatnonzero(in_rows & (is_tip | collapsed)):
+        labels[node] = clade_label(layout, node) if collapsed[node] else layout.names[node]
+    longest = max((len(label) for label in labels.values()), default=0)
+    label_width = min(longest * CHAR_WIDTH + LABEL_OFFSET, width / 2)
+    depth = layout.depth or 1.0
+    tree_width = max(width - 2 * MARGIN - label_width, 1)
+
+    # Extensão de cada triângulo: até a tip mais distante do clado
+    far = {}
+    for node in np.flatnonzero(shown & collapsed):
+        far[node] = float(layout.x[layout.clade(node)].max())
+
+    def px(value):
+        return MARGIN + value / depth * tree_width
+
+    def py(value):
+        return MARGIN + (value - row_lo + 0.5) * row_height
+
+    # Coordenadas em pixels de todos os nós de uma vez; a escrita só formata
+    x_px = px(layout.x)
+    y_px = py(y)
+
+    out: List[str] = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}px" height="{height:.1f}px" '
+        f'viewBox="0 0 {width} {height:.1f}" preserveAspectRatio="xMidYMid meet" '
+        f'style="font-family:Helvetica;font-size:12px">'
+    ]
+
+    out.append('<g class="toytree-Edges" style="stroke:rgb(0.0%,0.0%,0.0%);stroke-opacity:1.0;'
+               'stroke-linecap:round;stroke-width:1;fill:none">')
+    edges = np.flatnonzero(shown & (parent >= 0))
+    x0, y0 = x_px[parent[edges]].tolist(), y_px[parent[edges]].tolist()
+    x1, y1 = x_px[edges].tolist(), y_px[edges].tolist()
+    out.extend(_EDGE % coords for coords in zip(x0, y0, x0, y1, x1, y1))
+    out.append('</g>')
+
+    out.append('<g class="tree-Clades" style="fill:rgb(90%,90%,90%);stroke:rgb(0.0%,0.0%,0.0%);stroke-width:1">')
+    for node, x_far in far.items():
+        x0, x1 = x_px[node], px(x_far)
+        y0 = y_px[node]
+        half = (min(TRIANGLE_ROWS, layout.tip_hi[node] - layout.tip_lo[node] + 1) * row_height) / 2 - 2
+        out.append(f'<polygon class="clade" data-node="{node + layout.offset}" '
+                   f'points="{x0:.1f},{y0:.1f} {x1:.1f},{y0 - half:.1f} {x1:.1f},{y0 + half:.1f}" />')
+    out.append('</g>')
+
+    # Só o número do suporte, sem marcador no nó: o tree_set_cli original
+    # passava node_markers="s" ao toytree, mas com node_sizes=None o toytree
+    # não desenha nenhum nó (o grupo toytree-Nodes sai vazio)
+    out.append(f'<g class="toytree-NodeLabels" style="fill:{TEXT_COLOR};font-family:{FONT_FAMILY};'
+               f'font-size:{NODE_FONT_SIZE}px;font-weight:300;text-anchor:middle;white-space:pre;stroke:none">')
+    support = layout.support
+    if np.nanmax(support, initial=0) <= 1:
+        support = support * 100
+    with np.errstate(invalid="ignore"):
+        labelled = np.flatnonzero(in_rows & ~is_tip & ~collapsed & (support >= MIN_SUPPORT_LABEL))
+    values = support[labelled].astype(np.int64).tolist()
+    out.extend(_NODE_LABEL % label for label in zip(x_px[labelled].tolist(), y_px[labelled].tolist(), values))
+    out.append('</g>')
+
+    out.append(f'<g class="toytree-TipLabels" style="fill:{TEXT_COLOR};font-family:{FONT_FAMILY};'
+               f'font-size:{TIP_FONT_SIZE}px;font-weight:300;white-space:pre;stroke:none">')
+    for node, label in labels.items():
+        x_label = px(far[node]) if collapsed[node] else x_px[node]
+        attributes = f' data-node="{node + layout.offset}"' if collapsed[node] else ""
+        out.append(f'<g class="toytree-TipLabel"{attributes} transform="translate({x_label:.1f},{y_px[node]:.1f})">'
+                   f'{_text_markup(layout, node, label)}</g>')
+    out.append('</g>')
+
+    if scale_bar:
+        value, text = _scale_bar(layout.depth)
+        bar_y = py(row_hi + 1)
+        x0, x1 = px(0), px(value)
+        out.append(f'<path d="M {x0:.1f} {bar_y:.1f} L {x1:.1f} {bar_y:.1f}" '
+                   f'style="stroke:rgb(0%,0%,0%);stroke-opacity:1.0;stroke-width:1.0" />')
+        out.append(f'<g class="toyplot-Datum" transform="translate({(x0 + x1) / 2:.1f},{bar_y + row_height:.1f})" '
+                   f'style="fill:{TEXT_COLOR};font-family:{FONT_FAMILY};font-size:{TIP_FONT_SIZE}px;'
+                   f'font-weight:500;text-anchor:middle;stroke:none"><text x="0" y="5.11">{text}</text></g>')
+
+    out.append('</svg>')
+    return "".join(out)
+
+
+def _text_markup(layout: TreeLayout, node: int, label: str) -> str:
+    """<text> de um nome: spans guardados no layout ou formatados na hora (triângulos)."""
+    cached = layout.labels[node] if layout.labels is not None and layout.is_tip[node] else None
+    element_style, spans = cached if cached is not None else format_label(label)
+    style = f' style="{element_style}"' if element_style else ""
+    tspans = "".join(
+        f'<tspan style="{span_style}">{html.escape(text)}</tspan>' if span_style else f'<tspan>{html.escape(text)}</tspan>'
+        for text, span_style in spans
+    )
+    return f'<text x="{LABEL_OFFSET}" y="5.11"{style}>{tspans}</text>'
+
+
+def format_label(label: str):
+    """
+    Formatação de um nome: (estilo do <text>, [(texto, estilo)]).
+
+    Os gêneros ficam no cache limitado de check_genus; o dicionário passado
+    aqui só vale para esta chamada.
+    """
+    return label_format.format_label(label, {})
+
+
+# ----------------------------------------------------------------------
+# Visualizações
+# ----------------------------------------------------------------------
+def render_full(layout: TreeLayout, width: int = DEFAULT_WIDTH, height: Optional[float] = None) -> str:
+    """
+    Árvore inteira, como o SVG do toytree: ``height`` (px) é dividido entre
+    as linhas das tips e a barra de escala (None = ROW_HEIGHT por tip).
+    """
+    n_tips = layout.n_tips
+    row_height = ROW_HEIGHT if height is None else max(height - 2 * MARGIN, 1) / (n_tips + 3)
+    nothing = np.zeros(layout.n_nodes, dtype=bool)
+    visible = np.ones(layout.n_nodes, dtype=bool)
+    return _write_svg(layout, layout.y, visible, nothing, 0, n_tips, width, scale_bar=True,
+                      row_height=row_height)
+
+
+def render_overview(layout: TreeLayout, width: int = DEFAULT_WIDTH, by: str = "genus",
+                    min_support: float = 70, depth: float = 0.5) -> str:
+    """Árvore inteira com clados colapsados em triângulos (data-node = id do clado)."""
+    collapsed = collapse_mask(layout, by, min_support, depth)
+    visible, y, rows = _collapsed_view(layout, collapsed)
+    return _write_svg(layout, y, visible, collapsed, 0, rows, width, scale_bar=True)
+
+
+def render_window(layout: TreeLayout, start: int, end: int, width: int = DEFAULT_WIDTH) -> str:
+    """
+    Linhas [start, end) da árvore completa, na mesma escala horizontal.
+
+    Raises:
+        ValueError: janela vazia, fora da árvore ou maior que MAX_WINDOW_ROWS
+    """
+    n_tips = layout.n_tips
+    end = min(end, n_tips)
+    if start < 0 or start >= end:
+        raise ValueError(f"Janela inválida: a árvore tem {n_tips} linhas (0 a {n_tips - 1})")
+    if end - start > MAX_WINDOW_ROWS:
+        raise ValueError(f"Janela maior que {MAX_WINDOW_ROWS} linhas")
+    nothing = np.zeros(layout.n_nodes, dtype=bool)
+    visible = np.ones(layout.n_nodes, dtype=bool)
+    return _write_svg(layout, layout.y, visible, nothing, start, end, width, scale_bar=end == n_tips)
+
+
+def render_subtree(layout: TreeLayout, node: int, width: int = DEFAULT_WIDTH,
+                   max_rows: Optional[int] = MAX_WINDOW_ROWS) -> str:
+    """
+    Clado de ``node`` como árvore própria (colapsa por gênero se passar de max_rows).
+
+    Raises:
+        ValueError: nó inexistente
+    """
+    sub = layout.subtree(node)
+    if max_rows is not None and sub.n_tips > max_rows:
+        return render_overview(sub, width)
+    nothing = np.zeros(sub.n_nodes, dtype=bool)
+    visible = np.ones(sub.n_nodes, dtype=bool)
+    return _write_svg(sub, sub.y, visible, nothing, 0, sub.n_tips, width, scale_bar=True)
+
+
+def summary(layout: TreeLayout) -> dict:
+    """Números do layout usados pelo frontend para escolher a visualização."""
+    return {
+        "tips": layout.n_tips,
+        "nodes": layout.n_nodes,
+        "row_height": ROW_HEIGHT,
+        "depth": round(layout.depth, 6),
+        "max_window_rows": MAX_WINDOW_ROWS,
+        "full_height": layout.n_tips * ROW_HEIGHT + 2 * MARGIN,
+    }
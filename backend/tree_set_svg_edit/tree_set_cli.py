@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 ## Tree visualization with support values - CLI version
 ##
-import html
-import toytree
-import re
-import toyplot.svg
-import toyplot.locator
+import os
 import sys
+from collections import OrderedDict
 from pathlib import Path
-from ete3 import Tree
+
+# fasta_io fica no backend (diretório pai); necessário também quando o
+# script é executado diretamente pela linha de comando
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from fasta_io import count_sequences
+from newick import ArrayTree, read_tree, root_on_outgroup, ladderize
+from tree_layout import TreeLayout, LAYOUT_FILE, tree_digest
+from tree_lod import render_full
+from label_format import format_label, lookup_failed
 
 # Default outgroup para enraizamento da árvore
 DEFAULT_OUTGROUP = "uncisetus"
@@ -20,21 +25,23 @@ DEFAULT_HEIGHT = 4000
 # Altura base por sequência (multiplicador)
 HEIGHT_PER_SEQUENCE = 23
 
+# Layouts mantidos em memória por processo (re-renderizações seguidas)
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "8"))
+_layout_cache: "OrderedDict[str, TreeLayout]" = OrderedDict()
+
 def count_sequences_in_alignment(alignment_file: str) -> int:
     """
     Conta o número de sequências em um arquivo FASTA de alinhamento.
-    Cada sequência começa com '>'.
+    Cada sequência começa com uma linha de header '>' (leitura em streaming).
     
     Args:
         alignment_file: Caminho para o arquivo de alinhamento FASTA
     
     Returns:
-        Número de sequências (contagem de '>')
+        Número de sequências (linhas de header)
     """
     try:
-        with open(alignment_file, 'r') as f:
-            content = f.read()
-            return content.count('>')
+        return count_sequences(alignment_file)
     except Exception as e:
         print(f"Erro ao ler arquivo de alinhamento: {e}")
         return 0
@@ -60,60 +67,96 @@ def calculate_tree_height(alignment_file: str = None) -> int:
     print(f"Usando altura padrão: {DEFAULT_HEIGHT}px")
     return DEFAULT_HEIGHT
 
-def generate_tree_svg(tree_file: str, output_dir: str, outgroup: str = DEFAULT_OUTGROUP, 
-                      alignment_file: str = None, width: int = None, height: int = None):
+def load_rooted_tree(tree_file: str, outgroup: str = DEFAULT_OUTGROUP) -> ArrayTree:
     """
-    Gera SVG da árvore filogenética com valores de suporte
+    Carrega a árvore (Newick ou NEXUS), enraíza pelo outgroup (MRCA das tips
+    que contêm o texto) e ladderiza.
     
-    Args:
-        tree_file: Caminho para arquivo .tre (Newick)
-        output_dir: Diretório onde salvar o SVG
-        outgroup: String para buscar nas tips e usar como outgroup para enraizamento
-        alignment_file: Arquivo FASTA para calcular altura automática
-        width: Largura do SVG em pixels (default: 1700)
-        height: Altura do SVG em pixels (se None, calcula baseado no alinhamento)
+    Returns:
+        ArrayTree enraizada e ladderizada
     """
-    t = Tree(tree_file, format=0)
-    t.write(outfile=output_dir + "/temp.tre", format=0)
-    # Load the tree
-    tree = toytree.tree(output_dir + "/temp.tre")
-    
-    # Find tips that match outgroup for rooting
-    matching_tips = [name for name in tree.get_tip_labels() if outgroup.lower() in name.lower()]
+    tree = read_tree(tree_file)
     
     # Root the tree using the MRCA of the matched tips (se encontrado)
-    if matching_tips:
-        mrca = tree.get_mrca_node(*matching_tips)
-        rooted_tree = tree.root(mrca)
-        print(f"Árvore enraizada usando outgroup '{outgroup}' ({len(matching_tips)} tips encontradas)")
+    rooted_tree, matched = root_on_outgroup(tree, outgroup)
+    if matched:
+        print(f"Árvore enraizada usando outgroup '{outgroup}' ({matched} tips encontradas)")
     else:
-        rooted_tree = tree
         print(f"Aviso: Outgroup '{outgroup}' não encontrado, árvore não enraizada")
     
     # Ladderize the tree
-    ladderized_tree = rooted_tree.ladderize()
-    
-    # Create node label list for all nodes (internal and terminal)
-    node_labels = ['' for _ in range(ladderized_tree.nnodes)]
-    
-    # Create node size list
-    node_sizes = [0 for _ in range(ladderized_tree.nnodes)]
-    
-    # Create node marker list
-    node_markers = ['' for _ in range(ladderized_tree.nnodes)]
+    return ladderize(rooted_tree)
+
+def format_labels(layout: TreeLayout, output_dir: str) -> TreeLayout:
+    """
+    Calcula a formatação dos nomes das tips (itálico/negrito/neew_, com a
+    verificação de gêneros) e salva o layout em output_dir/layout.npz.
+
+    Se alguma consulta ao IndexFungorum falhou, o layout fica marcado
+    (meta "genus_lookup_failed") e os nomes são formatados de novo no próximo
+    uso, em vez de ficarem sem itálico enquanto o job existir.
+    """
+    genus_cache = {}
+    layout.labels = [
+        format_label(name, genus_cache) if is_tip else None
+        for name, is_tip in zip(layout.names, layout.is_tip)
+    ]
+    layout.meta["genus_lookup_failed"] = lookup_failed(genus_cache)
+    layout.save(Path(output_dir) / LAYOUT_FILE)
+    return layout
+
+def save_layout(tree: ArrayTree, tree_file: str, output_dir: str, outgroup: str) -> TreeLayout:
+    """Converte a árvore enraizada em layout, formata os nomes e salva em output_dir/layout.npz"""
+    layout = TreeLayout.from_tree(tree, meta={"outgroup": outgroup, "tree_digest": tree_digest(tree_file)})
+    return format_labels(layout, output_dir)
+
+def get_layout(tree_file: str, output_dir: str, outgroup: str = DEFAULT_OUTGROUP) -> TreeLayout:
+    """
+    Layout do job: da memória (LRU), de output_dir/layout.npz ou, se não
+    existe, se a árvore mudou ou se o outgroup é outro, refeito a partir do
+    arquivo de árvore. Nomes formatados com falha na consulta de gêneros são
+    refeitos (só os nomes, a geometria é reaproveitada).
+    """
+    key = str(Path(output_dir).resolve())
+    digest = tree_digest(tree_file)
+
+    def valid(layout):
+        return (layout is not None and layout.labels is not None
+                and layout.meta.get("outgroup") == outgroup and layout.meta.get("tree_digest") == digest)
+
+    layout = _layout_cache.get(key)
+    if not valid(layout):
+        layout = TreeLayout.load(Path(output_dir) / LAYOUT_FILE)
+        if not valid(layout):
+            tree = load_rooted_tree(tree_file, outgroup)
+            layout = save_layout(tree, tree_file, output_dir, outgroup)
+    if layout.meta.get("genus_lookup_failed"):
+        layout = format_labels(layout, output_dir)
+    _layout_cache[key] = layout
+    _layout_cache.move_to_end(key)
+    while len(_layout_cache) > LAYOUT_CACHE_SIZE:
+        _layout_cache.popitem(last=False)
+    return layout
+
+def generate_tree_svg(tree_file: str, output_dir: str, outgroup: str = DEFAULT_OUTGROUP, 
+                      alignment_file: str = None, width: int = None, height: int = None):
+    """
+    Gera o SVG final da árvore filogenética (supportvalue_output.svg), com
+    valores de suporte e os nomes já formatados (itálico/negrito/neew_)
     
-    # Create node color list
-    node_colors = ['black' for _ in range(ladderized_tree.nnodes)]
+    A árvore é enraizada/ladderizada uma vez e o layout fica salvo no
+    diretório de saída; chamadas seguintes (ex.: re-renderizar com outras
+    dimensões) só reescalam as coordenadas e reescrevem o SVG.
     
-    # Traverse all internal nodes and add support labels where support >= 50
-    for node in ladderized_tree.treenode.traverse():
-        if node.is_leaf():
-            continue
-        support_value = node.support
-        if support_value is not None and support_value >= 50:
-            node_labels[node.idx] = str(int(support_value))
-            node_sizes[node.idx] = 15
-            node_markers[node.idx] = "s"
+    Args:
+        tree_file: Caminho para arquivo .tre (Newick ou NEXUS)
+        output_dir: Diretório onde salvar o SVG
+        outgroup: String para buscar nas tips e usar como outgroup para enraizamento
+        alignment_file: Arquivo FASTA para calcular altura automática
+        width: Largura do SVG em pixels (default: 1700)
+        height: Altura do SVG em pixels (se None, calcula baseado no alinhamento)
+    """
+    layout = get_layout(tree_file, output_dir, outgroup)
     
     # Calcular altura baseada no alinhamento (se height não foi especificado)
     if height is None:
@@ -126,111 +169,13 @@ def generate_tree_svg(tree_file: str, output_dir: str, outgroup: str = DEFAULT_O
     tree_width = width if width is not None else DEFAULT_WIDTH
     print(f"Dimensões do SVG: {tree_width}px x {tree_height}px")
     
-    # Draw the tree SEM scale_bar (vamos criar uma customizada estilo FigTree)
-    canvas, axes, mark = ladderized_tree.draw(
-        width=tree_width,
-        height=tree_height,
-        scale_bar=False,
-        tip_labels_align=False,
-        tip_labels_style={
-            "fill": "#262626",
-            "font-size": "20px",
-            "font-family": "Helvetica, Arial, sans-serif",
-            "-toyplot-anchor-shift": "15px",
-        },
-        node_labels=node_labels,
-        node_labels_style={
-            "fill": "#262626",
-            "font-size": "15px",
-            "font-family": "Helvetica, Arial, sans-serif",
-        },
-        node_sizes=None,
-        node_markers=node_markers,
-        node_colors=node_colors,
-        edge_style={
-            "stroke": "black", 
-            "stroke-width": 1,
-        },
-    )
-    
-    # Esconder todos os eixos
-    axes.show = False
-    
-    # ========================================
-    # SCALE BAR ESTILO FIGTREE (proporcional)
-    # ========================================
-    # Obter range real da árvore calculando a distância máxima da raiz até um tip
-    # Função para calcular a distância de um nó até a raiz
-    def get_distance_to_root(node):
-        dist = 0
-        current = node
-        while current.up is not None:
-            dist += current.dist if current.dist else 0
-            current = current.up
-        return dist
-    
-    # Encontrar a maior distância entre todos os tips
-    max_dist = 0
-    for leaf in ladderized_tree.treenode.get_leaves():
-        d = get_distance_to_root(leaf)
-        if d > max_dist:
-            max_dist = d
-    
-    tree_range = max_dist if max_dist > 0 else 0.1
-    
-    # Escolher um valor "bonito" para a scale bar proporcional ao range
-    scale_options = [0.001, 0.002, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.2, 0.5, 1.0]
-    scale_value = scale_options[0]
-    for opt in scale_options:
-        # Escolher um valor que seja ~10-25% do range total
-        if opt >= tree_range * 0.08 and opt <= tree_range * 0.30:
-            scale_value = opt
-            break
-    
-    # Número de tips para calcular posição Y
-    ntips = ladderized_tree.ntips
-    
-    # Posição da scale bar: canto inferior esquerdo
-    bar_y = -1.5  # abaixo do último tip
-    bar_x_start = 0  # começar na raiz (esquerda)
-    bar_x_end = scale_value  # terminar em scale_value
-    
-    # Desenhar a linha horizontal da scale bar
-    axes.plot(
-        [bar_x_start, bar_x_end], 
-        [bar_y, bar_y],
-        color="black",
-        stroke_width=1
-    )
-    
-    # Formatar o número (remover zeros desnecessários)
-    if scale_value >= 0.1:
-        scale_text = f"{scale_value:.1f}".rstrip('0').rstrip('.')
-    elif scale_value >= 0.01:
-        scale_text = f"{scale_value:.2f}".rstrip('0').rstrip('.')
-    else:
-        scale_text = f"{scale_value:.3f}".rstrip('0').rstrip('.')
-    
-    # Adicionar o texto centralizado abaixo da barra
-    bar_center = (bar_x_start + bar_x_end) / 2
-    axes.text(
-        bar_center, 
-        bar_y - 1.0,
-        scale_text,
-        style={
-            "font-size": "20px",
-            "font-family": "Helvetica, Arial, sans-serif",
-            "font-weight": "500",
-            "fill": "#262626",
-            "text-anchor": "middle",
-            "-toyplot-anchor-shift": "0"
-        }
-    )
+    # Desenho direto do layout: rótulos de suporte >= 50 e scale bar estilo FigTree
+    svg = render_full(layout, tree_width, tree_height)
     
     # Save to output directory
-    output_path = Path(output_dir) / "supportvalue.svg"
+    output_path = Path(output_dir) / "supportvalue_output.svg"
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    toyplot.svg.render(canvas, str(output_path))
+    output_path.write_text(svg, encoding="utf-8")
     
     return str(output_path)
 
@@ -0,0 +1,176 @@
+"""
+Curadoria (trimming) de alinhamentos sem processo externo.
+
+Implementa sobre a matriz NumPy de alignment.py a mesma regra usada no modo 3
+com o trimAl (``-gt 0.2 -cons 60``), seguindo Gaps::calcCutPoint e
+Cleaner::cleanByCutValueOverpass do trimAl 2.0:
+
+- gap threshold (-gt): mantém as colunas com no máximo ``n * (1 - gt)`` gaps;
+- conservação mínima (-cons): se o limiar de gaps deixar menos de ``cons``%
+  das colunas, o corte sobe até o número de gaps que completa essa
+  porcentagem. Quando há empate no corte, o trimAl não fica com todas as
+  colunas empatadas: recupera só as que faltam, a partir do meio do
+  alinhamento e em blocos vizinhos às colunas já mantidas;
+- colunas só com gaps nunca são mantidas.
+
+Os parâmetros são tratados em float32, como no trimAl; isso decide o corte
+quando ``n * (1 - gt)`` cai exatamente num inteiro (ex.: 5 sequências com
+-gt 0.8 aceitam 0 gaps, não 1). O trimAl conta como gap só o '-', e o
+alinhamento do MAFFT não tem outro caractere de gap.
+
+Como no trimAl, sequências que ficam só com gaps após o corte são removidas.
+O resultado é uma máscara de colunas: a matriz não é copiada, e o arquivo de
+saída é escrito linha a linha só com as colunas selecionadas.
+
+A ferramenta usada é escolhida por TRIMMER: trimal (padrão, binário externo)
+ou builtin. As colunas mantidas pelo builtin foram iguais às do pytrimal 0.8.5
+(que compila o código do trimAl 2.0) em 36 mil alinhamentos aleatórios, e
+tests/test_trimming.py repete essa comparação quando o pytrimal está
+instalado. O padrão continua sendo o binário porque a versão do trimAl
+instalada no servidor (a 1.4 ainda é comum) não foi comparada;
+bench/bench_trimming.py compara as saídas quando o trimal está no PATH.
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from alignment import Alignment
+
+TRIMMER = os.getenv("TRIMMER", "trimal").lower()
+
+# Parâmetros equivalentes a "trimal -gt 0.2 -cons 60"
+GAP_THRESHOLD = 0.2
+MIN_CONSERVED_PERCENT = 60
+
+
+@dataclass
+class TrimResult:
+    columns: np.ndarray                     # máscara booleana das colunas mantidas
+    rows: np.ndarray                        # máscara booleana das sequências mantidas
+    gap_cut: int                            # máximo de gaps nas colunas mantidas
+    removed_sequences: List[str] = field(default_factory=list)
+
+    @property
+    def kept_columns(self) -> int:
+        return int(self.columns.sum())
+
+
+def _round_int(value) -> int:
+    """Arredondamento do trimAl (utils::roundInt): meio para cima."""
+    return int(float(value) + 0.5)
+
+
+def gap_cut_point(gaps_per_column: np.ndarray, n_sequences: int,
+                  gap_threshold: float, min_conserved_percent: float) -> float:
+    """
+    Máximo de gaps por coluna aceito, combinando -gt e -cons.
+
+    O corte por -cons é fracionário, como no trimAl: o número de gaps em que
+    a contagem acumulada de colunas atinge cons%, menos a fração das colunas
+    desse número que sobram. Vale o mais permissivo dos dois cortes.
+    """
+    threshold_cut = n_sequences * float(np.float32(1) - np.float32(gap_threshold))
+    length = gaps_per_column.size
+    needed = min(_round_int(float(np.float32(length) * np.float32(min_conserved_percent)) / 100), length)
+    columns_with = np.bincount(gaps_per_column, minlength=n_sequences + 1)
+
+    gaps, accumulated = 0, 0
+    while gaps < n_sequences:
+        accumulated += int(columns_with[gaps])
+        if accumulated >= needed:
+            break
+        gaps += 1
+    if columns_with[gaps]:
+        conserve_cut = float(np.float32(gaps) - np.float32(accumulated - needed) / np.float32(columns_with[gaps]))
+    else:
+        conserve_cut = 0.0
+    return max(conserve_cut, threshold_cut)
+
+
+def recover_columns(columns: np.ndarray, gaps_per_column: np.ndarray, min_conserved_percent: float) -> None:
+    """
+    Completa cons% das colunas quando o corte deixou menos que isso.
+
+    Como no trimAl, o limite de gaps passa a ser o da coluna na posição cons%
+    da ordenação, e as colunas abaixo dele são recuperadas a partir do meio
+    do alinhamento, alternando esquerda e direita e sempre ao lado de um
+    bloco já mantido (primeiro blocos de 0,5% do comprimento, depois menores).
+    A máscara é alterada no lugar.
+    """
+    length = columns.size
+    coverage = np.float32(float(np.float32(min_conserved_percent)) / 100)
+    missing = _round_int((coverage - np.float32(int(columns.sum())) / np.float32(length)) * np.float32(length))
+    if missing <= 0:
+        return
+    max_gaps = np.sort(gaps_per_column)[int(np.float32(length - 1) * coverage)]
+
+    block = _round_int(np.float32(0.005) * np.float32(length))
+    while block >= 0 and missing > 0:
+        left, right = length // 2, length // 2 + 1
+        while (left > 0 or right < length - 1) and missing > 0:
+            # Esquerda: tamanho do bloco mantido e colunas logo antes dele
+            index = left
+            while index >= 0 and columns[index]:
+                index -= 1
+            if left - index >= block:
+                while index >= 0 and missing > 0 and not columns[index] and gaps_per_column[index] <= max_gaps:
+                    columns[index] = True
+                    missing -= 1
+                    index -= 1
+            left = index - 1
+
+            # Direita
+            index = right
+            while index < length and missing > 0 and columns[index]:
+                index += 1
+            if index - right >= block:
+                while index < length and missing > 0 and not columns[index] and gaps_per_column[index] <= max_gaps:
+                    columns[index] = True
+                    missing -= 1
+                    index += 1
+            right = index + 1
+        block -= 1
+
+
+def trim_alignment(alignment: Alignment, gap_threshold: float = GAP_THRESHOLD,
+                   min_conserved_percent: float = MIN_CONSERVED_PERCENT) -> TrimResult:
+    """Calcula as máscaras de colunas e sequências mantidas."""
+    gaps = alignment.gap_mask()
+    gaps_per_column = gaps.sum(axis=0)
+    columns = gaps_per_column <= gap_cut_point(gaps_per_column, alignment.n_sequences,
+                                               gap_threshold, min_conserved_percent)
+    if columns.size:
+        recover_columns(columns, gaps_per_column, min_conserved_percent)
+    columns &= gaps_per_column < alignment.n_sequences
+
+    # Sequências sem nenhum resíduo nas colunas mantidas
+    residues_kept = (~gaps[:, columns]).sum(axis=1) if columns.any() else np.zeros(alignment.n_sequences)
+    rows = residues_kept > 0
+    removed = [alignment.names[row] for row in np.flatnonzero(~rows)]
+    gap_cut = int(gaps_per_column[columns].max()) if columns.any() else 0
+    return TrimResult(columns=columns, rows=rows, gap_cut=gap_cut, removed_sequences=removed)
+
+
+def write_trimmed(alignment: Alignment, result: TrimResult, output: Path) -> None:
+    """Grava o alinhamento curado, copiando só as colunas mantidas de cada linha."""
+    alignment.write_fasta(output, rows=result.rows, columns=result.columns)
+
+
+def trim_fasta(input_fasta: Path, output_fasta: Path, gap_threshold: float = GAP_THRESHOLD,
+               min_conserved_percent: float = MIN_CONSERVED_PERCENT) -> TrimResult:
+    """
+    Lê, cura e grava um alinhamento FASTA.
+
+    Returns:
+        O resultado do corte (colunas/sequências mantidas)
+    """
+    alignment = Alignment.from_fasta(input_fasta)
+    result = trim_alignment(alignment, gap_threshold, min_conserved_percent)
+    for name in result.removed_sequences:
+        print(f"Aviso: sequência '{name}' ficou só com gaps após a curadoria e foi removida")
+    write_trimmed(alignment, result, output_fasta)
+    print(f"Curadoria: {result.kept_columns}/{alignment.length} colunas mantidas (até {result.gap_cut} gaps por coluna)")
+    return result
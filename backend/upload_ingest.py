@@ -0,0 +1,228 @@
+"""
+Recebimento de uploads em streaming.
+
+Os arquivos enviados são lidos em blocos (await upload.read), então o event
+loop não fica bloqueado e a memória não cresce com o tamanho do arquivo. Para
+FASTA (texto ou gzip), uma única passada normaliza os registros, valida o formato, adiciona o
+prefixo neew_ às sequências do usuário, conta as sequências e calcula o hash
+usado pelo cache de análises (mesmo esquema de result_cache.fasta_digest).
+"""
+import asyncio
+import codecs
+import hashlib
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+
+from fasta_io import FastaParser, FastaRecord, FastaFormatError, write_record, GZIP_MAGIC
+from tool_runner import LineSplitter
+
+# Limites configuráveis via .env
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+MAX_SEQUENCES = int(os.getenv("MAX_SEQUENCES", "5000"))
+MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
+
+# Tamanho dos blocos lidos do upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Uma requisição traz no máximo dois FASTA (matriz + sequências do usuário);
+# acima disso é rejeitada pelo Content-Length antes de o corpo ser lido
+MAX_REQUEST_SIZE = 2 * MAX_FILE_SIZE + UPLOAD_CHUNK_SIZE
+
+# Prefixo que identifica as sequências do usuário no SVG
+NEW_LABEL_PREFIX = "neew_"
+
+
+class UploadError(Exception):
+    """Upload rejeitado; status_code é o código HTTP sugerido."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class IngestResult:
+    sequences: int
+    bytes: int
+    digest: Optional[str] = None
+
+
+class FastaNormalizer:
+    """
+    Normaliza um FASTA recebido em pedaços e grava o resultado em out.
+
+    Cada registro sai como header + sequência em uma única linha. Em arquivos
+    o header é mantido inteiro; em texto colado (paste=True) vale a regra do
+    formulário: o primeiro token é o nome, o restante da linha é sequência,
+    espaços são removidos, a sequência vai para maiúsculas e registros vazios
+    são descartados.
+
+    Args:
+        out: Arquivo de saída (modo texto)
+        label_prefix: Prefixo adicionado aos nomes (ex.: "neew_")
+        paste: Aplica as regras de texto colado
+        max_sequences: Limite de sequências (UploadError 413 ao exceder)
+    """
+
+    def __init__(self, out, label_prefix: str = "", paste: bool = False,
+                 max_sequences: int = MAX_SEQUENCES):
+        self.out = out
+        self.label_prefix = label_prefix
+        self.paste = paste
+        self.max_sequences = max_sequences
+        self.sequences = 0
+        self._digest = hashlib.sha256()
+        self._parser = FastaParser(inline_sequence=paste, strict=not paste)
+        self._splitter = LineSplitter(self._line)
+
+    def feed(self, text: str) -> None:
+        self._splitter.feed(text)
+
+    def close(self) -> str:
+        """Finaliza o último registro e devolve o hash do conteúdo normalizado."""
+        self._splitter.close()
+        self._emit(self._parser.close())
+        if self.sequences == 0:
+            raise UploadError("Nenhuma sequência FASTA encontrada no arquivo")
+        return self._digest.hexdigest()
+
+    def _line(self, line: str) -> None:
+        try:
+            record = self._parser.feed(line)
+        except FastaFormatError as e:
+            raise UploadError(f"Arquivo FASTA inválido: {e}")
+        self._emit(record)
+
+    def _emit(self, record: Optional[FastaRecord]) -> None:
+        if record is None:
+            return
+        sequence = record.sequence
+        if self.paste:
+            sequence = sequence.replace(' ', '').replace('\t', '').upper()
+            if not sequence:
+                return
+
+        self.sequences += 1
+        if self.sequences > self.max_sequences:
+            raise UploadError(f"Limite de {self.max_sequences} sequências excedido", 413)
+
+        record = FastaRecord(f"{self.label_prefix}{record.name}", sequence)
+        # Mesmo esquema de result_cache.fasta_digest
+        self._digest.update(f"\n>{record.name}\n".encode())
+        self._digest.update(sequence.encode())
+        write_record(self.out, record)
+
+
+class _Decoder:
+    """Decodifica os blocos do upload, descompactando gzip se o arquivo começar
+    com a assinatura gzip.
+
+    O gzip é descompactado em partes de até UPLOAD_CHUNK_SIZE bytes e o total
+    descompactado é conferido a cada parte: um bloco pequeno que expande para
+    gigabytes (gzip bomb) é recusado sem ser descompactado inteiro na memória.
+    """
+
+    def __init__(self, filename: str, max_bytes: int):
+        self._text = codecs.getincrementaldecoder("utf-8-sig")()
+        self._gzip = None
+        self._started = False
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.inflated = 0
+
+    def _count(self, data: bytes) -> bytes:
+        self.inflated += len(data)
+        if self.inflated > self.max_bytes:
+            raise _size_error(self.filename, self.max_bytes)
+        return data
+
+    def _inflate(self, data: bytes) -> bytes:
+        parts = []
+        while data:
+            parts.append(self._count(self._gzip.decompress(data, UPLOAD_CHUNK_SIZE)))
+            data = self._gzip.unconsumed_tail
+        return b"".join(parts)
+
+    def decode(self, chunk: bytes, final: bool = False) -> str:
+        if not self._started and chunk:
+            self._started = True
+            if chunk.startswith(GZIP_MAGIC):
+                self._gzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._gzip is not None:
+            chunk = self._inflate(chunk)
+            if final:
+                chunk += self._count(self._gzip.flush())
+                if not self._gzip.eof:
+                    raise zlib.error("arquivo gzip truncado")
+        return self._text.decode(chunk, final=final)
+
+
+def _size_error(filename: str, max_bytes: int) -> UploadError:
+    return UploadError(f"Arquivo '{filename}' excede {max_bytes // (1024 * 1024)} MB", 413)
+
+
+def _check_declared_size(upload: UploadFile, max_bytes: int) -> None:
+    # O tamanho já é conhecido quando o multipart foi recebido: rejeita antes de ler
+    if upload.size is not None and upload.size > max_bytes:
+        raise _size_error(upload.filename, max_bytes)
+
+
+async def ingest_fasta(upload: UploadFile, path: Path, label_prefix: str = "", paste: bool = False,
+                       max_bytes: int = MAX_FILE_SIZE) -> IngestResult:
+    """
+    Lê um upload FASTA em blocos e grava a versão normalizada em path.
+
+    Raises:
+        UploadError: arquivo grande demais (413), sequências demais (413),
+            codificação ou formato inválidos (400). O arquivo parcial é removido.
+    """
+    _check_declared_size(upload, max_bytes)
+    decoder = _Decoder(upload.filename, max_bytes)
+    total = 0
+    try:
+        with open(path, "w", encoding="utf-8") as out:
+            normalizer = FastaNormalizer(out, label_prefix, paste)
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                text = decoder.decode(chunk)
+                # Para gzip o limite vale para o conteúdo descompactado
+                total += max(len(chunk), len(text))
+                if total > max_bytes:
+                    raise _size_error(upload.filename, max_bytes)
+                await asyncio.to_thread(normalizer.feed, text)
+            normalizer.feed(decoder.decode(b"", final=True))
+            digest = normalizer.close()
+    except (UnicodeDecodeError, zlib.error):
+        path.unlink(missing_ok=True)
+        raise UploadError(f"Arquivo '{upload.filename}' não é um FASTA em texto (UTF-8/ASCII) ou gzip válido")
+    except UploadError:
+        path.unlink(missing_ok=True)
+        raise
+    return IngestResult(sequences=normalizer.sequences, bytes=total, digest=digest)
+
+
+async def save_upload(upload: UploadFile, path: Path, max_bytes: int = MAX_FILE_SIZE) -> IngestResult:
+    """Copia um upload em blocos (sem interpretar o conteúdo), respeitando max_bytes."""
+    _check_declared_size(upload, max_bytes)
+    total = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise _size_error(upload.filename, max_bytes)
+                await asyncio.to_thread(out.write, chunk)
+    except UploadError:
+        path.unlink(missing_ok=True)
+        raise
+    return IngestResult(sequences=0, bytes=total)
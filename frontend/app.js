@@ -1,7 +1,9 @@
 const API_URL = 'http://localhost:8000';
 let currentJobId = null;
 let currentWorkflowMode = null;
-let pollInterval = null;
+let eventSource = null;
+let pollJobId = null;
+let statusVersion = 0;
 let progressStartTime = null;
 
 // Arquivos para cada modo
@@ -448,14 +450,51 @@ async function startAnalysis(treeTool, bootstrap) {
 
 function startPolling() {
     progressStartTime = Date.now();
-    checkStatus();
-    pollInterval = setInterval(checkStatus, 500);
+    statusVersion = 0;
+    stopPolling();
+    
+    // Servidor envia o progresso por SSE; sem EventSource (ou se o stream
+    // falhar) cai para long-poll em /status?since=N
+    if (window.EventSource) {
+        eventSource = new EventSource(`${API_URL}/events/${currentJobId}`);
+        eventSource.addEventListener('status', (event) => {
+            handleStatus(JSON.parse(event.data));
+        });
+        eventSource.onerror = () => {
+            if (!eventSource) return;
+            eventSource.close();
+            eventSource = null;
+            longPoll(currentJobId);
+        };
+    } else {
+        longPoll(currentJobId);
+    }
 }
 
 function stopPolling() {
-    if (pollInterval) {
-        clearInterval(pollInterval);
-        pollInterval = null;
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+    pollJobId = null;
+}
+
+async function longPoll(jobId) {
+    pollJobId = jobId;
+    while (pollJobId === jobId) {
+        try {
+            const response = await fetch(`${API_URL}/status/${jobId}?since=${statusVersion}&wait=30`);
+            
+            if (!response.ok) {
+                throw new Error('Erro ao verificar status');
+            }
+            
+            if (pollJobId !== jobId) return;
+            handleStatus(await response.json());
+        } catch (error) {
+            stopPolling();
+            showError(`Erro ao verificar status: ${error.message}`);
+        }
     }
 }
 
@@ -471,52 +510,60 @@ function setProgress(value, stepText) {
     }
 }
 
-async function checkStatus() {
-    try {
-        const response = await fetch(`${API_URL}/status/${currentJobId}`);
-        
-        if (!response.ok) {
-            throw new Error('Erro ao verificar status');
+function formatEta(seconds) {
+    if (seconds < 60) return `~${Math.max(1, Math.round(seconds))}s`;
+    const minutes = Math.round(seconds / 60);
+    if (minutes < 60) return `~${minutes} min`;
+    return `~${Math.floor(minutes / 60)}h${String(minutes % 60).padStart(2, '0')}`;
+}
+
+function handleStatus(status) {
+    if (status.version <= statusVersion) return;
+    statusVersion = status.version;
+    
+    const stepNames = {
+        'alignment': 'Alinhando sequências com MAFFT...',
+        'alignment_done': 'Alinhamento concluído!',
+        'merging_files': 'Juntando arquivos...',
+        'trimming': 'Curadoria do alinhamento...',
+        'trimming_done': 'Curadoria concluída!',
+        'skipping_alignment': 'Matriz já alinhada, pulando...',
+        'tree_building': 'Construindo árvore filogenética...',
+        'rendering': 'Gerando SVG da árvore...',
+        'merge_reused': 'Matrizes inalteradas, reaproveitando junção...',
+        'align_reused': 'Entradas inalteradas, reaproveitando alinhamento...',
+        'trim_reused': 'Alinhamento inalterado, reaproveitando curadoria...',
+        'infer_reused': 'Alinhamento e parâmetros inalterados, reaproveitando árvore...',
+        'render_reused': 'Árvore inalterada, reaproveitando SVG...',
+        'waiting_duplicate': 'Análise idêntica em andamento, aguardando resultado...'
+    };
+    let stepText = stepNames[status.step] || status.step || 'Processando...';
+    if (status.status === 'queued') {
+        stepText = `Aguardando na fila (posição ${status.queue_position})...`;
+    } else if (status.detail) {
+        stepText = `${stepText} ${status.detail}`;
+        if (status.eta_seconds != null) {
+            stepText += ` — ${formatEta(status.eta_seconds)} restantes`;
         }
+    }
+    
+    setProgress(status.progress || 0, stepText);
+    
+    if (status.status === 'completed') {
+        const elapsed = Date.now() - (progressStartTime || Date.now());
+        const minDisplay = 1200;
         
-        const status = await response.json();
-        
-        const stepNames = {
-            'alignment': 'Alinhando sequências com MAFFT...',
-            'alignment_done': 'Alinhamento concluído!',
-            'merging_files': 'Juntando arquivos...',
-            'trimming': 'Curadoria do alinhamento com trimAl...',
-            'trimming_done': 'Curadoria concluída!',
-            'skipping_alignment': 'Matriz já alinhada, pulando...',
-            'tree_building': 'Construindo árvore filogenética...'
-        };
-        const stepText = stepNames[status.step] || status.step || 'Processando...';
-        
-        setProgress(status.progress || 0, stepText);
+        stopPolling();
+        setProgress(100, 'Finalizando...');
         
-        if (status.status === 'completed') {
-            const elapsed = Date.now() - (progressStartTime || Date.now());
-            const minDisplay = 1200;
-            
-            setProgress(100, 'Finalizando...');
-            
-            if (elapsed < minDisplay) {
-                setTimeout(() => {
-                    stopPolling();
-                    showResults();
-                }, minDisplay - elapsed);
-            } else {
-                stopPolling();
-                showResults();
-            }
-        } else if (status.status === 'error') {
-            stopPolling();
-            showError(status.message || 'Erro desconhecido na análise');
+        if (elapsed < minDisplay) {
+            setTimeout(showResults, minDisplay - elapsed);
+        } else {
+            showResults();
         }
-        
-    } catch (error) {
+    } else if (status.status === 'error' || status.status === 'cancelled') {
         stopPolling();
-        showError(`Erro ao verificar status: ${error.message}`);
+        showError(status.message || 'Erro desconhecido na análise');
     }
 }
 
@@ -530,6 +577,7 @@ async function showResults() {
     document.getElementById('download-tree').onclick = () => downloadFile('tree');
     document.getElementById('download-alignment').onclick = () => downloadFile('alignment');
     document.getElementById('download-tree-svg').onclick = () => downloadFile('tree_svg');
+    document.getElementById('download-bundle').onclick = () => downloadFile('bundle');
     
     // Configurar botão de re-renderizar
     document.getElementById('rerender-svg').onclick = rerenderSvg;
@@ -572,8 +620,14 @@ async function rerenderSvg() {
         
         const data = await response.json();
         
+        // Buscar o SVG novo (arquivo comprimido, sem envelope JSON)
+        const svgResponse = await fetch(`${API_URL}${data.svg_url}`);
+        if (!svgResponse.ok) {
+            throw new Error('Não foi possível carregar o SVG re-renderizado');
+        }
+        
         // Inserir novo SVG
-        container.innerHTML = data.svg_content;
+        container.innerHTML = await svgResponse.text();
         
         // Ajustar SVG
         const svg = container.querySelector('svg');
@@ -605,17 +659,25 @@ async function visualizeTree() {
         const container = document.getElementById('tree-container');
         container.innerHTML = '<p style="padding: 20px; color: #666;">Carregando visualização da árvore...</p>';
         
-        // Buscar conteúdo SVG do backend
-        const response = await fetch(`${API_URL}/results/${currentJobId}/svg-content`);
+        // Árvores grandes: visão geral com clados colapsados (nível de detalhe)
+        const summaryResponse = await fetch(`${API_URL}/results/${currentJobId}/tree`);
+        if (summaryResponse.ok) {
+            const summary = await summaryResponse.json();
+            if (summary.lod) {
+                await showTreeOverview(summary);
+                return;
+            }
+        }
+        
+        // Buscar o SVG do backend (gzip/brotli; revalidado por ETag no cache do navegador)
+        const response = await fetch(`${API_URL}/results/${currentJobId}/svg`);
         
         if (!response.ok) {
             throw new Error('Não foi possível carregar o SVG da árvore');
         }
         
-        const data = await response.json();
-        
         // Inserir SVG diretamente no container
-        container.innerHTML = data.svg_content;
+        container.innerHTML = await response.text();
         
         // Ajustar SVG para ser responsivo
         const svg = container.querySelector('svg');
@@ -639,6 +701,50 @@ async function visualizeTree() {
     }
 }
 
+async function loadTreeView(path, header) {
+    const container = document.getElementById('tree-container');
+    container.innerHTML = '<p style="padding: 20px; color: #666;">Carregando visualização da árvore...</p>';
+    
+    const response = await fetch(`${API_URL}/results/${currentJobId}/tree/${path}`);
+    if (!response.ok) {
+        throw new Error('Não foi possível carregar a visualização da árvore');
+    }
+    
+    container.innerHTML = header + await response.text();
+    const svg = container.querySelector('svg');
+    if (svg) {
+        svg.style.maxWidth = '100%';
+        svg.style.height = 'auto';
+        svg.style.display = 'block';
+    }
+}
+
+async function showTreeOverview(summary) {
+    const container = document.getElementById('tree-container');
+    await loadTreeView('overview?collapse=genus', `
+        <p style="padding: 10px 20px; color: #666;">
+            Árvore com ${summary.tips} sequências: clados de um mesmo gênero aparecem colapsados.
+            Clique em um triângulo para abrir o clado, ou baixe o SVG completo.
+        </p>`);
+    
+    // Clique em um triângulo (ou no seu rótulo) abre a subárvore
+    container.onclick = async (event) => {
+        const clade = event.target.closest('[data-node]');
+        if (!clade) return;
+        container.onclick = null;
+        try {
+            await loadTreeView(`subtree/${clade.dataset.node}`, `
+                <p style="padding: 10px 20px;">
+                    <button class="btn btn-secondary" id="tree-overview-back">← Visão geral</button>
+                </p>`);
+            document.getElementById('tree-overview-back').onclick = () => showTreeOverview(summary);
+        } catch (error) {
+            console.error('Erro ao abrir clado:', error);
+            await showTreeOverview(summary);
+        }
+    };
+}
+
 // ========================================
 // UTILITÁRIOS
 // ========================================